@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, OtpVerify
+from .models import User, OtpVerify, EmailOutbox, RevokedToken, UserRevocation
 # Register your models here.
 
 
@@ -10,9 +10,28 @@ class UserAdmin(admin.ModelAdmin):
 
 
 class OtpVerifyAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'otp']
-    search_fields = ['user', 'otp']
+    list_display = ['id', 'user', 'expires_at', 'attempts']
+    search_fields = ['user__email']
+
+
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    search_fields = ['subject', 'to']
+    list_filter = ['status']
+
+
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['id', 'jti', 'user', 'revoked_at', 'expires_at']
+    search_fields = ['jti', 'user__email']
+
+
+class UserRevocationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'revoked_before']
+    search_fields = ['user__email']
 
 
 admin.site.register(User, UserAdmin)
 admin.site.register(OtpVerify, OtpVerifyAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
+admin.site.register(RevokedToken, RevokedTokenAdmin)
+admin.site.register(UserRevocation, UserRevocationAdmin)
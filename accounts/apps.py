@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def schedule_periodic_tasks(sender, **kwargs):
+    from .tasks import schedule_periodic_tasks
+    schedule_periodic_tasks()
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        post_migrate.connect(schedule_periodic_tasks, sender=self, dispatch_uid='accounts_schedule_periodic_tasks')
@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from conf.caching import is_process_local
+from .models import User
+from .revocation import get_revocation_list
+
+# Left out of user snapshots: secrets, and columns changed by queryset updates that bypass
+# post_save. They stay deferred and load from the database when a view reads them.
+SNAPSHOT_EXCLUDED_FIELDS = ('password', 'perm_version')
+
+# user_id -> (snapshot, monotonic expiry), shared by the threads of this process.
+_user_map = OrderedDict()
+_user_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_basic_auth_cache():
+    return caches[_setting('BASIC_AUTH_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(user_id):
+    return f"accounts:basic:generation:{user_id}"
+
+
+def _entry_key(user, password, generation):
+    # Keyed with SECRET_KEY and bound to the stored hash, so the key cannot be checked offline
+    # and stops matching as soon as the password hash changes.
+    digest = salted_hmac('accounts.basic_auth', f"{user.pk}\0{password}\0{user.password}").hexdigest()
+    return f"accounts:basic:{user.pk}:{generation}:{digest}"
+
+
+def invalidate_basic_auth(user):
+    """Forget every cached credential check of the user; called wherever a password is set."""
+    cache = get_basic_auth_cache()
+    try:
+        cache.incr(_generation_key(user.pk))
+    except ValueError:
+        cache.add(_generation_key(user.pk), 1, timeout=None)
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that remembers successful password checks for BASIC_AUTH_CACHE_TIMEOUT
+    seconds, so repeated calls with the same credentials cost a user lookup and a cache read
+    instead of a password hash. Only an HMAC of the credentials is stored. A timeout of 0 turns
+    the cache off.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        timeout = _setting('BASIC_AUTH_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return super().authenticate_credentials(userid, password, request)
+
+        cache = get_basic_auth_cache()
+        user = User._default_manager.filter(**{User.USERNAME_FIELD: userid}).first()
+        if user is not None:
+            generation = cache.get(_generation_key(user.pk), 0)
+            if cache.get(_entry_key(user, password, generation)):
+                if not user.is_active:
+                    raise exceptions.AuthenticationFailed('User inactive or deleted.')
+                return user, None
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        # check_password may have upgraded the hash; key the entry on the row as it is now.
+        generation = cache.get(_generation_key(user.pk), 0)
+        cache.set(_entry_key(user, password, generation), True, timeout)
+        return user, auth
+
+
+def get_user_cache():
+    """The shared snapshot tier, or None when JWT_USER_CACHE_ALIAS is local to this process."""
+    cache = caches[_setting('JWT_USER_CACHE_ALIAS', 'default')]
+    # A per-process tier would outlive invalidations made by other workers for its whole timeout.
+    return None if is_process_local(cache) else cache
+
+
+def _user_key(user_id):
+    return f"accounts:jwt_user:{user_id}"
+
+
+def _snapshot_fields():
+    return [field.attname for field in User._meta.concrete_fields if field.attname not in SNAPSHOT_EXCLUDED_FIELDS]
+
+
+def load_snapshot(user_id):
+    """The user's row without SNAPSHOT_EXCLUDED_FIELDS, plus the digest SimpleJWT's revoke claim compares."""
+    row = User.objects.filter(pk=user_id).values_list('password', *_snapshot_fields()).first()
+    if row is None:
+        return None
+    return {'values': row[1:], 'password_digest': get_md5_hash_password(row[0])}
+
+
+def _remember_locally(user_id, snapshot):
+    with _user_lock:
+        _user_map[user_id] = (snapshot, time.monotonic() + _setting('JWT_USER_LOCAL_TTL', 5))
+        _user_map.move_to_end(user_id)
+        while len(_user_map) > _setting('JWT_USER_LOCAL_SIZE', 1024):
+            _user_map.popitem(last=False)
+
+
+def _local_snapshot(user_id):
+    with _user_lock:
+        entry = _user_map.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _user_map[user_id]
+            return None
+        _user_map.move_to_end(user_id)
+        return entry[0]
+
+
+def get_user_snapshot(user_id):
+    """The user's snapshot from this process, then the shared cache, then the database (None when gone)."""
+    snapshot = _local_snapshot(user_id)
+    if snapshot is None:
+        cache = get_user_cache()
+        if cache is not None:
+            snapshot = cache.get(_user_key(user_id))
+        if snapshot is None:
+            snapshot = load_snapshot(user_id)
+            if snapshot is None:
+                return None
+            if cache is not None:
+                cache.set(_user_key(user_id), snapshot, _setting('JWT_USER_CACHE_TIMEOUT', 300))
+        _remember_locally(user_id, snapshot)
+    return snapshot
+
+
+def forget_users(*user_ids):
+    """
+    Drop cached snapshots; the User post_save/post_delete signals call this. Other processes keep
+    theirs for up to JWT_USER_LOCAL_TTL seconds. Queryset updates bypass the signals and must
+    call this themselves.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    with _user_lock:
+        for user_id in user_ids:
+            _user_map.pop(user_id, None)
+    cache = get_user_cache()
+    if cache is not None:
+        cache.delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from a snapshot: a bounded in-process LRU
+    first, then JWT_USER_CACHE_ALIAS when it is shared between processes, and the database only
+    on a miss. The user is rebuilt with User.from_db, so fields outside the snapshot stay
+    deferred: they load on first access and save() leaves them untouched unless the view set
+    them. Revoked tokens are refused.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if get_revocation_list().is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked')
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        snapshot = get_user_snapshot(user_id)
+        if snapshot is None:
+            raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+        user = User.from_db(DEFAULT_DB_ALIAS, _snapshot_fields(), snapshot['values'])
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != snapshot['password_digest']:
+            raise exceptions.AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
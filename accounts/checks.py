@@ -0,0 +1,17 @@
+from django.core.checks import Warning, register
+from conf.caching import is_process_local
+
+
+@register()
+def check_otp_store(app_configs, **kwargs):
+    from .otp import CacheOtpStore, get_otp_store
+
+    store = get_otp_store()
+    if isinstance(store, CacheOtpStore) and is_process_local(store.cache):
+        return [Warning(
+            "OTP_STORE keeps password reset codes in a per-process cache: a code issued by one worker "
+            "cannot be verified by another, and every worker counts its own attempts.",
+            hint="Point OTP_CACHE_ALIAS at a cache shared by all workers, or use accounts.otp.DatabaseOtpStore.",
+            id='accounts.W001',
+        )]
+    return []
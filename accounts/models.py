@@ -48,23 +48,107 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_verified = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    perm_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
+    # Copied into the employee search index; a save that leaves them unchanged skips reindexing.
+    IDENTITY_FIELDS = ('first_name', 'last_name', 'email')
+
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in cls.IDENTITY_FIELDS):
+            instance._loaded_identity = instance.identity()
+        return instance
+
+    def identity(self):
+        return tuple(getattr(self, name) for name in self.IDENTITY_FIELDS)
+
     @property
     def full_name(self):
         return self.first_name + " " + self.last_name
 
 
 class OtpVerify(models.Model):
+    """A password reset code held by accounts.otp.DatabaseOtpStore; `otp` is a keyed digest of the code."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    otp = models.IntegerField()
+    otp = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'otp'], name='otp_user_code_idx'),
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
 
     def __str__(self):
         return str(self.user)
+
+
+class EmailOutbox(models.Model):
+    """An email waiting to be sent; written in the request transaction and drained by accounts.tasks."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class RevokedToken(models.Model):
+    """A revoked JWT, kept until it would have expired anyway; checked through accounts.revocation."""
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='revoked_token_expires_idx'),
+            models.Index(fields=['revoked_at'], name='revoked_token_revoked_idx'),
+        ]
+
+    def __str__(self):
+        return self.jti
+
+
+class UserRevocation(models.Model):
+    """Every token of `user` issued before `revoked_before` is revoked."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    revoked_before = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['revoked_before'], name='user_revocation_before_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} before {self.revoked_before}"
@@ -0,0 +1,101 @@
+import hmac
+import secrets
+from datetime import timedelta
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.module_loading import import_string
+from .models import OtpVerify
+
+OTP_DIGITS = 6
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def generate_code():
+    return f"{secrets.randbelow(10 ** OTP_DIGITS):0{OTP_DIGITS}d}"
+
+
+def _digest(user_id, code):
+    # Only a keyed digest of the code is stored; it is compared with hmac.compare_digest.
+    return salted_hmac('accounts.otp', f"{user_id}:{code}").hexdigest()
+
+
+class CacheOtpStore:
+    """
+    One code per user in OTP_CACHE_ALIAS, expiring after OTP_TTL seconds. The alias must be shared
+    by every worker; check accounts.W001 flags a per-process one. Issuing a code replaces
+    the previous one. Every verification counts against OTP_MAX_ATTEMPTS before the digest is
+    compared, and a code is consumed by the first verification that matches it.
+    """
+
+    @property
+    def cache(self):
+        return caches[_setting('OTP_CACHE_ALIAS', 'default')]
+
+    def _keys(self, user):
+        return f"accounts:otp:{user.pk}", f"accounts:otp:attempts:{user.pk}"
+
+    def issue(self, user):
+        code = generate_code()
+        code_key, attempts_key = self._keys(user)
+        self.cache.set_many({code_key: _digest(user.pk, code), attempts_key: 0}, _setting('OTP_TTL', 600))
+        return code
+
+    def verify(self, user, code):
+        cache = self.cache
+        code_key, attempts_key = self._keys(user)
+        try:
+            attempts = cache.incr(attempts_key)
+        except ValueError:
+            return False
+        if attempts > _setting('OTP_MAX_ATTEMPTS', 5):
+            cache.delete_many([code_key, attempts_key])
+            return False
+        digest = cache.get(code_key)
+        if digest is None or not hmac.compare_digest(digest, _digest(user.pk, code)):
+            return False
+        consumed = cache.delete(code_key)
+        cache.delete(attempts_key)
+        return consumed
+
+
+class DatabaseOtpStore:
+    """
+    OtpVerify rows keyed by (user, digest) with an expiry. Issuing a code deletes the user's
+    previous code together with every expired row, so the table only holds live codes. Attempts
+    are counted with a guarded UPDATE, so concurrent guesses cannot exceed OTP_MAX_ATTEMPTS.
+    """
+
+    def issue(self, user):
+        code = generate_code()
+        now = timezone.now()
+        OtpVerify.objects.filter(Q(user=user) | Q(expires_at__lte=now)).delete()
+        OtpVerify.objects.create(user=user, otp=_digest(user.pk, code),
+                                 expires_at=now + timedelta(seconds=_setting('OTP_TTL', 600)))
+        return code
+
+    def verify(self, user, code):
+        row = OtpVerify.objects.filter(user=user, expires_at__gt=timezone.now()).only('otp').first()
+        if row is None:
+            return False
+        counted = OtpVerify.objects.filter(pk=row.pk, attempts__lt=_setting('OTP_MAX_ATTEMPTS', 5)) \
+            .update(attempts=F('attempts') + 1)
+        if not counted or not hmac.compare_digest(row.otp, _digest(user.pk, code)):
+            return False
+        return OtpVerify.objects.filter(pk=row.pk).delete()[0] == 1
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_otp_store():
+    """The OTP_STORE instance that issues and verifies password reset codes."""
+    return _load_store(_setting('OTP_STORE', 'accounts.otp.DatabaseOtpStore'))
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import EmailOutbox
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, body, to, html_body='', from_email=None):
+    """Queue one email; it is sent once the surrounding transaction commits."""
+    return enqueue_emails([EmailOutbox(subject=subject, body=body, html_body=html_body, to=list(to),
+                                       from_email=from_email or settings.DEFAULT_FROM_EMAIL)])[0]
+
+
+def enqueue_messages(messages):
+    """Queue EmailMessage/EmailMultiAlternatives instances, keeping their HTML alternative."""
+    return enqueue_emails([
+        EmailOutbox(
+            subject=message.subject, body=message.body, to=list(message.to),
+            from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+            html_body=next((content for content, mimetype in getattr(message, 'alternatives', ())
+                            if mimetype == 'text/html'), ''),
+        )
+        for message in messages
+    ])
+
+
+def enqueue_emails(rows):
+    from .tasks import dispatch_email_outbox_task
+
+    now = timezone.now()
+    for row in rows:
+        row.next_attempt_at = now
+    rows = EmailOutbox.objects.bulk_create(rows)
+    if rows:
+        transaction.on_commit(dispatch_email_outbox_task.delay)
+    return rows
+
+
+def _claim(batch_size, now):
+    """
+    Mark up to `batch_size` due rows as sending and return them.
+
+    A claimed row is leased until EMAIL_OUTBOX_LEASE seconds from now; a worker that dies
+    mid-batch leaves its rows to be picked up again once the lease runs out.
+    """
+    lease = timedelta(seconds=_setting('EMAIL_OUTBOX_LEASE', 300))
+    with transaction.atomic():
+        ids = list(EmailOutbox.objects.filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+                   .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+        # The status check makes a row claimed by a concurrent worker drop out here.
+        EmailOutbox.objects.filter(id__in=ids, status__in=('pending', 'sending'), next_attempt_at__lte=now) \
+            .update(status='sending', next_attempt_at=now + lease)
+        return list(EmailOutbox.objects.filter(id__in=ids, status='sending', next_attempt_at=now + lease))
+
+
+def _message(row, connection):
+    message = EmailMultiAlternatives(subject=row.subject, body=row.body, from_email=row.from_email,
+                                     to=row.to, connection=connection)
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    return message
+
+
+def _failed(row, error, now):
+    row.attempts += 1
+    row.last_error = f"{type(error).__name__}: {error}"
+    if row.attempts >= _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 5):
+        row.status = 'failed'
+    else:
+        # Exponential backoff: RETRY_DELAY, then twice that, four times, ...
+        row.status = 'pending'
+        row.next_attempt_at = now + timedelta(
+            seconds=_setting('EMAIL_OUTBOX_RETRY_DELAY', 60) * 2 ** (row.attempts - 1))
+
+
+def dispatch_outbox(batch_size=None):
+    """
+    Send one batch of due outbox rows over a single mail connection.
+
+    Each row's outcome is recorded separately: sent, retried later with backoff, or failed
+    once EMAIL_OUTBOX_MAX_ATTEMPTS is reached. Returns the number of rows processed.
+    """
+    now = timezone.now()
+    rows = _claim(batch_size or _setting('EMAIL_OUTBOX_BATCH_SIZE', 100), now)
+    if not rows:
+        return 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for row in rows:
+            _failed(row, e, now)
+    else:
+        try:
+            for row in rows:
+                try:
+                    connection.send_messages([_message(row, connection)])
+                except Exception as e:
+                    _failed(row, e, now)
+                else:
+                    row.status, row.sent_at, row.attempts = 'sent', timezone.now(), row.attempts + 1
+        finally:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(rows, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+    return len(rows)
+
+
+def next_retry_delay():
+    """Seconds until the earliest row waiting for a retry is due, or None when nothing waits."""
+    due = (EmailOutbox.objects.filter(status='pending').order_by('next_attempt_at')
+           .values_list('next_attempt_at', flat=True).first())
+    if due is None:
+        return None
+    return max((due - timezone.now()).total_seconds(), 0)
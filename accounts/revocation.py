@@ -0,0 +1,155 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .models import RevokedToken, UserRevocation
+
+# Rows are read back from this many seconds before the previous refresh started, so a row
+# committed late, or stamped by a process with a slightly slower clock, is not missed.
+REFRESH_OVERLAP = 5
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BloomFilter:
+    """Set of strings with no false negatives and about `error_rate` false positives up to `capacity` items."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + n * second) % self.size for n in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _token_key(jti):
+    return f"jti:{jti}"
+
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    """
+    Revoked JTIs and users with a "revoked before" timestamp, answered from a Bloom filter.
+
+    The filter is refreshed at most every REVOCATION_REFRESH_INTERVAL seconds with the rows written
+    since the previous refresh, and rebuilt from the live rows once it holds `capacity` keys. A
+    token is only looked up in the database when the filter reports a possible hit, so the
+    common not-revoked case needs no I/O. Revocations made by another process take effect here
+    at the next refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._seen_since = None
+        self._refresh_at = 0.0
+
+    def _rebuild(self, now):
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=now).values_list('jti', flat=True))
+        user_ids = list(UserRevocation.objects.values_list('user_id', flat=True))
+        capacity = max(_setting('REVOCATION_FILTER_CAPACITY', 100000), 2 * (len(jtis) + len(user_ids)))
+        bloom = BloomFilter(capacity, _setting('REVOCATION_FILTER_ERROR_RATE', 0.001))
+        for jti in jtis:
+            bloom.add(_token_key(jti))
+        for user_id in user_ids:
+            bloom.add(_user_key(user_id))
+        self._filter = bloom
+
+    def _catch_up(self, since):
+        for jti in RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True):
+            self._filter.add(_token_key(jti))
+        for user_id in UserRevocation.objects.filter(revoked_before__gte=since).values_list('user_id', flat=True):
+            self._filter.add(_user_key(user_id))
+
+    def refresh(self, force=False):
+        if not force and self._filter is not None and time.monotonic() < self._refresh_at:
+            return
+        with self._lock:
+            if not force and self._filter is not None and time.monotonic() < self._refresh_at:
+                return
+            now = timezone.now()
+            if force or self._filter is None or self._filter.count >= self._filter.capacity:
+                self._rebuild(now)
+            else:
+                self._catch_up(self._seen_since - timedelta(seconds=REFRESH_OVERLAP))
+            self._seen_since = now
+            self._refresh_at = time.monotonic() + _setting('REVOCATION_REFRESH_INTERVAL', 30)
+
+    def is_revoked(self, token):
+        self.refresh()
+        jti = token.get(jwt_settings.JTI_CLAIM)
+        if jti is not None and _token_key(jti) in self._filter \
+                and RevokedToken.objects.filter(jti=jti).exists():
+            return True
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is not None and _user_key(user_id) in self._filter:
+            revocations = UserRevocation.objects.filter(user_id=user_id)
+            issued_at = token.get('iat')
+            if issued_at is not None:
+                revocations = revocations.filter(revoked_before__gt=datetime_from_epoch(issued_at))
+            return revocations.exists()
+        return False
+
+    def revoke_token(self, token):
+        jti = token[jwt_settings.JTI_CLAIM]
+        RevokedToken.objects.get_or_create(jti=jti, defaults={
+            'user_id': token.get(jwt_settings.USER_ID_CLAIM),
+            'expires_at': datetime_from_epoch(token['exp']),
+        })
+        self.refresh()
+        with self._lock:
+            self._filter.add(_token_key(jti))
+
+    def revoke_user(self, user_id):
+        """
+        Revoke every token issued to the user until now. `iat` has whole seconds, so the cut-off is
+        rounded up: a token issued earlier in the same second is revoked too, and so is a login
+        later in that second.
+        """
+        now = timezone.now()
+        revoked_before = now.replace(microsecond=0) + timedelta(seconds=1 if now.microsecond else 0)
+        UserRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_before': revoked_before})
+        self.refresh()
+        with self._lock:
+            self._filter.add(_user_key(user_id))
+        return revoked_before
+
+
+def purge_revocations(now=None):
+    """Delete rows no live token can match any more; returns (tokens, users) deleted."""
+    now = now or timezone.now()
+    tokens, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+    longest = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+    users, _ = UserRevocation.objects.filter(revoked_before__lte=now - longest).delete()
+    return tokens, users
+
+
+revocation_list = RevocationList()
+
+
+def get_revocation_list():
+    return revocation_list
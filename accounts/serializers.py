@@ -1,18 +1,13 @@
 from rest_framework import serializers, status
-from .models import User, OtpVerify
-from rest_framework_simplejwt.tokens import RefreshToken
-from datetime import datetime
-from django.utils import timezone
-from django.core.mail import send_mail
+from .models import User
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from django.conf import settings
-import pyotp
-import base64
-
-
-class generatKey:
-    @staticmethod
-    def returnValue(userObj):
-        return str(timezone.now()) + str(datetime.date(datetime.now())) + str(userObj.id)
+from employees.permission_cache import add_permission_claims
+from .authentication import invalidate_basic_auth
+from .otp import get_otp_store
+from .revocation import get_revocation_list
+from .outbox import enqueue_email
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,6 +17,7 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'first_name', 'last_name', 'full_name', 'profile_pic', 'email', 'phone', 'role', 'is_approved', 'is_superuser', 'is_verified', 'is_staff', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ('created_at', 'updated_at')
+        column_dependencies = {'full_name': ['first_name', 'last_name']}
 
     def get_full_name(self, obj):
         return obj.full_name
@@ -106,12 +102,15 @@ class LoginSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({"error": "provide credential are not valid/password"}, code=status.HTTP_401_UNAUTHORIZED)
 
         token = RefreshToken.for_user(user)
+        access_token = token.access_token
+        if settings.PERMISSION_CLAIMS_IN_TOKEN:
+            add_permission_claims(access_token, user)
         attrs = {}
         attrs['id'] = str(user.id)
         attrs['first_name'] = str(user.first_name)
         attrs['last_name'] = str(user.last_name)
         attrs['email'] = str(user.email)
-        attrs['access_token'] = str(token.access_token)
+        attrs['access_token'] = str(access_token)
         attrs['refresh_token'] = str(token)
         return attrs
 
@@ -179,6 +178,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
             instance.set_password(password)
 
         instance.save()
+        if password and password.strip():
+            invalidate_basic_auth(instance)
         return instance
 
 
@@ -207,63 +208,73 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['user']
         user.set_password(validated_data.get("new_password"))
         user.save()
+        invalidate_basic_auth(user)
         return validated_data
 
 
+def _user_for_email(email):
+    # The exact lookup is served by the unique index on email; iexact only runs when it misses.
+    email = User.objects.normalize_email(email)
+    return User.objects.filter(email=email).first() or User.objects.filter(email__iexact=email).first()
+
+
 class ForgetPasswordSerializer(serializers.Serializer):
     email = serializers.EmailField(max_length=255)
 
     def validate(self, attrs):
-        email = attrs.get("email", None)
-        if email is not None:
-            try:
-                userObj = User.objects.get(email__iexact=email)
-                key = base64.b32encode(generatKey.returnValue(userObj).encode())
-                otp_key = pyotp.TOTP(key)
-                otp = otp_key.at(6)
-                otp_obj = OtpVerify()
-                otp_obj.user = userObj
-                otp_obj.otp = otp
-                otp_obj.save()
-                # Send email with OTP
-                subject = 'Password Reset OTP'
-                message = f'Your OTP for password reset is: {otp}'
-                from_email = settings.DEFAULT_FROM_EMAIL
-                recipient_list = [email]
-
-                send_mail(
-                    subject,
-                    message,
-                    from_email,
-                    recipient_list,
-                    fail_silently=False,
-                )
-            except Exception as e:
-                print("Exception", e)
-                raise serializers.ValidationError({"email":"Valid email is Required."})
-        else:
-            raise serializers.ValidationError({"email":"Email is Required."}) 
+        user = _user_for_email(attrs['email'])
+        if user is None:
+            raise serializers.ValidationError({"email": "Valid email is Required."})
+        attrs['user'] = user
         return attrs
 
+    def create(self, validated_data):
+        otp = get_otp_store().issue(validated_data['user'])
+        # Queue email with OTP; the outbox dispatcher sends it after commit
+        enqueue_email('Password Reset OTP', f'Your OTP for password reset is: {otp}', [validated_data['email']])
+        return validated_data
+
 
 class ResetPasswordSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=255)
     otp = serializers.CharField(required=True)
     password = serializers.CharField(required=True, write_only=True)
 
     def validate(self, attrs):
-        otp = attrs.get("otp", None)
-        password = attrs.get("password", None)
-        if otp:
+        user = _user_for_email(attrs['email'])
+        if user is None or not get_otp_store().verify(user, attrs['otp']):
+            raise serializers.ValidationError({"error": "Valid OTP is Required"})
+        attrs['user'] = user
+        return attrs
+
+    def create(self, validated_data):
+        user = validated_data['user']
+        user.set_password(validated_data['password'])
+        user.save()
+        invalidate_basic_auth(user)
+        return validated_data
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        request = self.context['request']
+        if not isinstance(request.auth, AccessToken):
+            raise serializers.ValidationError({"error": "Logout needs a JWT access token."})
+        tokens = [request.auth]
+        if attrs.get('refresh_token'):
             try:
-                otpobj = OtpVerify.objects.filter(otp=otp).first()
-                if otpobj:
-                    otpobj.user.set_password(password)
-                    otpobj.delete()
-                    otpobj.user.save()
-                else:
-                    raise OtpVerify.DoesNotExist
-            except OtpVerify.DoesNotExist:
-                raise serializers.ValidationError({"error": "Valid OTP is Required"})
-        else:
-            raise serializers.ValidationError({"error":"Email is Required."})
+                refresh = RefreshToken(attrs['refresh_token'])
+            except TokenError:
+                raise serializers.ValidationError({"refresh_token": "Valid refresh token is Required."})
+            if refresh.get('user_id') != request.user.pk:
+                raise serializers.ValidationError({"refresh_token": "Valid refresh token is Required."})
+            tokens.append(refresh)
+        attrs['tokens'] = tokens
         return attrs
+
+    def create(self, validated_data):
+        for token in validated_data['tokens']:
+            get_revocation_list().revoke_token(token)
+        return validated_data
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from .authentication import forget_users
+from .models import User
+
+
+def user_changed(sender, instance, **kwargs):
+    # Covers deactivation and password changes made through save(); the next request reloads the row.
+    forget_users(instance.pk)
+
+
+post_save.connect(user_changed, sender=User, dispatch_uid='jwt_user_cache_post_save')
+post_delete.connect(user_changed, sender=User, dispatch_uid='jwt_user_cache_post_delete')
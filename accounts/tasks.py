@@ -0,0 +1,70 @@
+import time
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import caches
+from .outbox import dispatch_outbox, next_retry_delay
+from .revocation import purge_revocations
+
+RETRY_SCHEDULED_KEY = 'accounts:outbox:retry_scheduled'
+REVOCATION_PURGE_TASK_NAME = 'Purge expired token revocations'
+
+
+@shared_task(bind=True)
+def dispatch_email_outbox_task(self, max_batches=50):
+    """Drain due outbox rows batch by batch, then come back when the next retry is due."""
+    sent = 0
+    for _ in range(max_batches):
+        processed = dispatch_outbox()
+        if not processed:
+            break
+        sent += processed
+    else:
+        self.apply_async((max_batches,))
+        return sent
+
+    # An eagerly run task cannot wait for a countdown; the next enqueue picks retries up.
+    delay = next_retry_delay()
+    if delay is not None and not self.request.is_eager and claim_retry(delay):
+        self.apply_async((max_batches,), countdown=delay)
+    return sent
+
+
+def get_outbox_cache():
+    return caches[getattr(settings, 'EMAIL_OUTBOX_CACHE_ALIAS', 'default')]
+
+
+def claim_retry(delay):
+    """
+    Record a retry run due in `delay` seconds unless one is already scheduled no later, so
+    concurrent runs do not each schedule their own while an earlier retry still gets through.
+    Runs only see each other's claims through a shared EMAIL_OUTBOX_CACHE_ALIAS.
+    """
+    cache = get_outbox_cache()
+    due = time.time() + delay
+    if cache.add(RETRY_SCHEDULED_KEY, due, delay + 1):
+        return True
+    scheduled = cache.get(RETRY_SCHEDULED_KEY)
+    if scheduled is not None and scheduled <= due:
+        return False
+    cache.set(RETRY_SCHEDULED_KEY, due, delay + 1)
+    return True
+
+
+@shared_task
+def purge_revocations_task():
+    """Delete revocation rows that no unexpired token can match any more."""
+    tokens, users = purge_revocations()
+    return {'tokens': tokens, 'users': users}
+
+
+def schedule_periodic_tasks():
+    """Create or update the entries read by django_celery_beat's DatabaseScheduler."""
+    from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+    interval, _ = IntervalSchedule.objects.get_or_create(
+        every=getattr(settings, 'REVOCATION_PURGE_INTERVAL', 60), period=IntervalSchedule.MINUTES,
+    )
+    # `enabled` is left alone so the task can be switched off from the admin.
+    PeriodicTask.objects.update_or_create(
+        name=REVOCATION_PURGE_TASK_NAME, defaults={'task': purge_revocations_task.name, 'interval': interval},
+    )
@@ -1,3 +1,493 @@
-from django.test import TestCase
+import tempfile
+import time
+from base64 import b64encode
+from datetime import timedelta
+from itertools import count
+from smtplib import SMTPRecipientsRefused
+from unittest.mock import patch
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from conf.testing import QueryBudgetMixin
+from .models import User, OtpVerify, EmailOutbox, RevokedToken, UserRevocation
+from .authentication import _user_key, _user_map, load_snapshot
+from .checks import check_otp_store
+from .otp import CacheOtpStore, DatabaseOtpStore, get_otp_store
+from .revocation import BloomFilter, RevocationList, get_revocation_list, purge_revocations
+from .outbox import dispatch_outbox, enqueue_email
+from .tasks import RETRY_SCHEDULED_KEY, claim_retry, get_outbox_cache
 
-# Create your tests here.
+
+def make_user(email, password='password'):
+    user = User.objects.create_user(email, password)
+    user.first_name, user.last_name = 'Test', 'User'
+    user.save()
+    return user
+
+
+class CountingEmailBackend(EmailBackend):
+    """locmem backend that counts connections and refuses recipients at example.invalid."""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@example.invalid') for address in message.to):
+                raise SMTPRecipientsRefused({address: (550, b'no such user') for address in message.to})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='accounts.tests.CountingEmailBackend', EMAIL_OUTBOX_BATCH_SIZE=50,
+                   EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    def test_batches_share_one_connection(self):
+        for n in range(120):
+            enqueue_email('Hello', f'Message {n}', [f'user{n}@example.com'], html_body=f'<p>{n}</p>')
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual([dispatch_outbox() for _ in range(4)], [50, 50, 20, 0])
+        self.assertEqual(CountingEmailBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 120)
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>0</p>')
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+
+    def test_failures_back_off_then_give_up(self):
+        enqueue_email('Hello', 'Body', ['ok@example.com'])
+        refused = enqueue_email('Hello', 'Body', ['gone@example.invalid'])
+
+        self.assertEqual(dispatch_outbox(), 2)
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('pending', 1))
+        self.assertIn('SMTPRecipientsRefused', refused.last_error)
+        self.assertGreater(refused.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(dispatch_outbox(), 0)
+
+        EmailOutbox.objects.filter(pk=refused.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_outbox(), 1)
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('failed', 2))
+        self.assertEqual([message.to for message in mail.outbox], [['ok@example.com']])
+
+    def test_expired_lease_is_reclaimed(self):
+        row = enqueue_email('Hello', 'Body', ['lease@example.com'])
+        EmailOutbox.objects.filter(pk=row.pk).update(status='sending', next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_outbox(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_an_earlier_retry_replaces_a_later_one(self):
+        get_outbox_cache().delete(RETRY_SCHEDULED_KEY)
+        self.assertTrue(claim_retry(300))
+        self.assertFalse(claim_retry(600))
+        self.assertTrue(claim_retry(60))
+        self.assertFalse(claim_retry(120))
+
+    def test_retry_claims_go_to_the_outbox_cache(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+                CACHES={**settings.CACHES, 'shared': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}},
+                EMAIL_OUTBOX_CACHE_ALIAS='shared'):
+            self.assertTrue(claim_retry(300))
+            self.assertIsNotNone(caches['shared'].get(RETRY_SCHEDULED_KEY))
+            self.assertFalse(claim_retry(600))
+
+    def test_forget_password_only_queues_the_email(self):
+        user = make_user('forgetful@example.com')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = APIClient().post('/accounts/forget/password/', {'email': user.email}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.subject, queued.to), ('Password Reset OTP', [user.email]))
+        self.assertEqual(len(callbacks), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccountQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every accounts route keeps a fixed number of queries as the user table grows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('budget-user@example.com')
+        for n in range(3):
+            make_user(f'existing{n}@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sequence = count()
+        self.grown = count()
+
+    def grow(self):
+        batch = next(self.grown)
+        for n in range(5):
+            user = make_user(f'grown{batch}-{n}@example.com')
+            DatabaseOtpStore().issue(user)
+
+    def test_signup(self):
+        self.assertQueryBudget(4, lambda: self.client.post('/accounts/signup/', {
+            'first_name': 'New', 'last_name': 'User', 'email': f'signup{next(self.sequence)}@example.com',
+            'password': 'password', 'role': 'EMPLOYEE', 'phone': '5550100',
+        }), expected_status=201)
+
+    def test_login(self):
+        self.assertQueryBudget(1, lambda: self.client.post('/accounts/login/', {
+            'email': self.user.email, 'password': 'password',
+        }, format='json'))
+
+    def test_change_password(self):
+        self.client.force_authenticate(self.user)
+        passwords = iter(['password', 'changed-once', 'changed-twice'])
+        current = next(passwords)
+
+        def change():
+            nonlocal current
+            new_password = next(passwords)
+            response = self.client.post('/accounts/changepassword/', {
+                'old_password': current, 'new_password': new_password,
+            }, format='json')
+            current = new_password
+            return response
+        self.assertQueryBudget(2, change)
+
+    @override_settings(OTP_STORE='accounts.otp.CacheOtpStore')
+    def test_forget_and_reset_password_with_cache_store(self):
+        self.assertQueryBudget(2, lambda: self.client.post('/accounts/forget/password/', {
+            'email': self.user.email,
+        }, format='json'))
+
+        # Issuing into the cache store costs no queries; capture() clears the caches first.
+        self.assertQueryBudget(2, lambda: self.client.post('/accounts/reset/password/', {
+            'email': self.user.email, 'otp': get_otp_store().issue(self.user), 'password': 'new-password',
+        }, format='json'))
+
+    @override_settings(OTP_STORE='accounts.otp.DatabaseOtpStore')
+    def test_forget_and_reset_password_with_database_store(self):
+        self.assertQueryBudget(4, lambda: self.client.post('/accounts/forget/password/', {
+            'email': self.user.email,
+        }, format='json'))
+
+        users = iter([make_user(f'reset{n}@example.com') for n in range(2)])
+        codes = iter([(user.email, DatabaseOtpStore().issue(user)) for user in users])
+
+        def reset():
+            email, otp = next(codes)
+            return self.client.post('/accounts/reset/password/', {
+                'email': email, 'otp': otp, 'password': 'new-password',
+            }, format='json')
+        self.assertQueryBudget(5, reset)
+
+    def test_profile(self):
+        self.client.force_authenticate(self.user)
+        self.assertQueryBudget(0, lambda: self.client.get('/accounts/profile/'))
+        self.assertQueryBudget(1, lambda: self.client.patch('/accounts/profile/', {
+            'phone': '5550199',
+        }, format='multipart'))
+
+    def test_user_list(self):
+        self.client.force_authenticate(self.user)
+        self.assertQueryBudget(1, lambda: self.client.get('/accounts/users/'))
+        self.assertQueryBudget(1, lambda: self.client.get(f'/accounts/users/?id={self.user.id}'))
+        self.assertQueryBudget(1, lambda: self.client.get('/accounts/users/?pagination=cursor'))
+
+    @override_settings(REVOCATION_REFRESH_INTERVAL=3600)
+    def test_logout(self):
+        # Steady state: the revocation list is fresh. One user per run, so neither finds the
+        # other's snapshot in this process.
+        get_revocation_list().refresh(force=True)
+        sessions = iter([RefreshToken.for_user(make_user(f'logout{n}@example.com')) for n in range(2)])
+
+        def logout():
+            refresh = next(sessions)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+            return self.client.post('/accounts/logout/', {'refresh_token': str(refresh)}, format='json')
+        self.assertQueryBudget(9, logout)
+
+    @override_settings(REVOCATION_REFRESH_INTERVAL=3600)
+    def test_revoke_sessions(self):
+        get_revocation_list().refresh(force=True)
+        admin = make_user('budget-admin@example.com')
+        admin.is_staff = True
+        admin.save()
+        self.client.force_authenticate(admin)
+        users = iter([make_user(f'revoked{n}@example.com') for n in range(2)])
+        self.assertQueryBudget(7, lambda: self.client.post(f'/accounts/users/{next(users).pk}/revoke-sessions/'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], OTP_MAX_ATTEMPTS=3)
+class OtpStoreTests(TestCase):
+    stores = (CacheOtpStore, DatabaseOtpStore)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('otp-user@example.com')
+        cls.other = make_user('otp-other@example.com')
+
+    def test_codes_are_single_use_and_per_user(self):
+        for store_class in self.stores:
+            with self.subTest(store=store_class.__name__):
+                store = store_class()
+                code = store.issue(self.user)
+                self.assertRegex(code, r'^\d{6}$')
+                self.assertFalse(store.verify(self.other, code))
+                self.assertTrue(store.verify(self.user, code))
+                self.assertFalse(store.verify(self.user, code))
+
+    def test_issuing_replaces_the_previous_code(self):
+        for store_class in self.stores:
+            with self.subTest(store=store_class.__name__):
+                store = store_class()
+                first = store.issue(self.user)
+                second = store.issue(self.user)
+                if first != second:
+                    self.assertFalse(store.verify(self.user, first))
+                self.assertTrue(store.verify(self.user, second))
+
+    def test_attempts_are_bounded(self):
+        for store_class in self.stores:
+            with self.subTest(store=store_class.__name__):
+                store = store_class()
+                code = store.issue(self.user)
+                wrong = f"{(int(code) + 1) % 1000000:06d}"
+                for _ in range(3):
+                    self.assertFalse(store.verify(self.user, wrong))
+                self.assertFalse(store.verify(self.user, code))
+
+    def test_database_store_expires_and_cleans_up_codes(self):
+        store = DatabaseOtpStore()
+        code = store.issue(self.user)
+        self.assertNotEqual(OtpVerify.objects.get(user=self.user).otp, code)
+        OtpVerify.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(store.verify(self.user, code))
+
+        store.issue(self.other)
+        self.assertEqual(list(OtpVerify.objects.values_list('user', flat=True)), [self.other.pk])
+
+    def test_process_local_cache_store_is_flagged(self):
+        with override_settings(OTP_STORE='accounts.otp.CacheOtpStore'):
+            self.assertEqual([warning.id for warning in check_otp_store(None)], ['accounts.W001'])
+        self.assertEqual(check_otp_store(None), [])
+
+    def test_reset_password_with_an_issued_code(self):
+        client = APIClient()
+        response = client.post('/accounts/forget/password/', {'email': self.user.email.upper()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        otp = EmailOutbox.objects.get().body.rsplit(' ', 1)[-1]
+
+        response = client.post('/accounts/reset/password/', {
+            'email': self.other.email, 'otp': otp, 'password': 'new-password',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/accounts/reset/password/', {
+            'email': self.user.email, 'otp': otp, 'password': 'new-password',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], BASIC_AUTH_CACHE_TIMEOUT=60)
+class BasicAuthCacheTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = make_user('basic@example.com')
+        self.client = APIClient()
+
+    def get_profile(self, password):
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + b64encode(f'{self.user.email}:{password}'.encode()).decode())
+        return self.client.get('/accounts/profile/')
+
+    def test_repeated_requests_skip_the_password_hash(self):
+        with patch.object(MD5PasswordHasher, 'verify', autospec=True, side_effect=MD5PasswordHasher.verify) as verify:
+            self.assertEqual(self.get_profile('password').status_code, 200)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.get_profile('password').status_code, 200)
+            self.assertEqual(self.get_profile('wrong').status_code, 401)
+        self.assertEqual(verify.call_count, 2)
+        self.assertFalse(any('password' in key for key in caches['default']._cache))
+
+    def test_password_change_drops_cached_credentials(self):
+        self.assertEqual(self.get_profile('password').status_code, 200)
+        response = self.client.post('/accounts/changepassword/', {
+            'old_password': 'password', 'new_password': 'changed-password',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile('password').status_code, 401)
+        self.assertEqual(self.get_profile('changed-password').status_code, 200)
+
+    def test_inactive_user_is_refused_on_a_cache_hit(self):
+        self.assertEqual(self.get_profile('password').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get_profile('password').status_code, 401)
+
+    @override_settings(BASIC_AUTH_CACHE_TIMEOUT=0)
+    def test_disabled_by_default(self):
+        with patch.object(MD5PasswordHasher, 'verify', autospec=True, side_effect=MD5PasswordHasher.verify) as verify:
+            for _ in range(2):
+                self.assertEqual(self.get_profile('password').status_code, 200)
+        self.assertEqual(verify.call_count, 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JWTUserCacheTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        _user_map.clear()
+        get_revocation_list().refresh(force=True)
+        self.user = make_user('jwt@example.com')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_steady_state_reads_need_no_auth_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+
+    def test_shared_tier_serves_local_misses(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+                CACHES={**settings.CACHES, 'shared': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}},
+                JWT_USER_CACHE_ALIAS='shared'):
+            self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+            _user_map.clear()
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+
+    def test_process_local_tier_is_skipped(self):
+        # Another worker deactivates the user; this process never sees the signal and its own
+        # 'default' cache still holds the active snapshot.
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+        active = load_snapshot(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        caches['default'].set(_user_key(self.user.pk), active)
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)
+
+        later = time.monotonic() + settings.JWT_USER_LOCAL_TTL + 1
+        with patch('accounts.authentication.time.monotonic', return_value=later):
+            self.assertEqual(self.client.get('/accounts/profile/').status_code, 401)
+
+    def test_saving_the_user_drops_the_snapshot(self):
+        self.client.get('/accounts/profile/')
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.client.get('/accounts/profile/').data['first_name'], 'Renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 401)
+
+        self.user.delete()
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 401)
+
+    def test_updating_the_cached_user_keeps_fields_outside_the_snapshot(self):
+        self.client.get('/accounts/profile/')
+        response = self.client.patch('/accounts/profile/', {'phone': '5550123'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.phone, '5550123')
+        self.assertTrue(self.user.check_password('password'))
+
+    @override_settings(JWT_USER_LOCAL_SIZE=2)
+    def test_local_tier_is_bounded(self):
+        for n in range(3):
+            user = make_user(f'jwt{n}@example.com')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+            self.assertEqual(client.get('/accounts/profile/').status_code, 200)
+        self.assertEqual(len(_user_map), 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RevocationTests(TestCase):
+
+    def setUp(self):
+        get_revocation_list().refresh(force=True)
+        self.user = make_user('revoked@example.com')
+        self.client = APIClient()
+
+    def login(self):
+        response = APIClient().post('/accounts/login/', {'email': self.user.email, 'password': 'password'}, format='json')
+        return response.data['access_token'], response.data['refresh_token']
+
+    def profile(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/accounts/profile/')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.001)
+        for n in range(1000):
+            bloom.add(f'jti:{n}')
+        self.assertTrue(all(f'jti:{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'other:{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 100)
+
+    def test_logout_revokes_the_access_and_refresh_tokens(self):
+        access, refresh = self.login()
+        other_access, _ = self.login()
+        self.assertEqual(self.profile(access).status_code, 200)
+        response = self.client.post('/accounts/logout/', {'refresh_token': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        self.assertEqual(self.profile(access).status_code, 401)
+        self.assertEqual(self.profile(other_access).status_code, 200)
+
+    def test_logout_needs_a_jwt(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post('/accounts/logout/', {}, format='json').status_code, 400)
+
+    def test_unrevoked_tokens_need_no_query(self):
+        access, _ = self.login()
+        revocations = get_revocation_list()
+        revocations.revoke_token(AccessToken(self.login()[0]))
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked(AccessToken(access)))
+
+    def test_admin_revokes_all_sessions(self):
+        access, _ = self.login()
+        admin = make_user('revoking-admin@example.com')
+        admin.is_staff = True
+        admin.save()
+        url = f'/accounts/users/{self.user.pk}/revoke-sessions/'
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.client.force_authenticate(None)
+
+        # Issued before the revocation, possibly in the same second.
+        self.assertEqual(self.profile(access).status_code, 401)
+        # A login in a later second.
+        UserRevocation.objects.update(revoked_before=timezone.now().replace(microsecond=0))
+        self.assertEqual(self.profile(self.login()[0]).status_code, 200)
+
+    def test_revocations_from_other_processes_arrive_on_refresh(self):
+        revocations = RevocationList()
+        token = AccessToken.for_user(self.user)
+        revocations.refresh()
+        RevokedToken.objects.create(jti=token['jti'], user=self.user, expires_at=timezone.now() + timedelta(days=1))
+        self.assertFalse(revocations.is_revoked(token))
+        later = time.monotonic() + 60
+        with patch('accounts.revocation.time.monotonic', return_value=later):
+            self.assertTrue(revocations.is_revoked(token))
+
+    def test_purge_keeps_rows_live_tokens_can_match(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(seconds=1))
+        RevokedToken.objects.create(jti='live', expires_at=now + timedelta(days=1))
+        UserRevocation.objects.create(user=self.user, revoked_before=now - timedelta(days=60))
+        self.assertEqual(purge_revocations(now), (1, 1))
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
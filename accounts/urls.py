@@ -9,6 +9,8 @@ urlpatterns = [
     path('forget/password/',            ForgetPasswordView.as_view(),    name='forget-password'),
     path('reset/password/',             ResetPasswordView.as_view(),     name='reset-password'),
     path('profile/',                    UserProfileView.as_view(),       name='user-profile'),
+    path('logout/',                     LogoutView.as_view(),            name='logout'),
     path('users/',                      UserListView.as_view(),          name='user-list'),
+    path('users/<int:pk>/revoke-sessions/', RevokeSessionsView.as_view(), name='revoke-sessions'),
 
 ]
@@ -3,7 +3,9 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import permissions
 from rest_framework import generics
+from django.shortcuts import get_object_or_404
 from .models import User
+from .revocation import get_revocation_list
 from .serializers import *
 
 # Create your views here.
@@ -65,6 +67,7 @@ class ForgetPasswordView(generics.GenericAPIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
+            serializer.save()
             return Response({'opt': 'successfully send OTP '}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -76,10 +79,33 @@ class ResetPasswordView(generics.GenericAPIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
+            serializer.save()
             return Response({'password': 'successfully set New Password'}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class LogoutView(generics.GenericAPIView):
+    serializer_class = LogoutSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            serializer.save()
+            return Response({'logout': 'Successfully logged out'}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RevokeSessionsView(generics.GenericAPIView):
+    """Revoke every token issued to the user so far; they have to log in again."""
+    permission_classes = [permissions.IsAdminUser]
+    queryset = User.objects.all()
+
+    def post(self, request, pk):
+        user = get_object_or_404(self.get_queryset(), pk=pk)
+        revoked_before = get_revocation_list().revoke_user(user.pk)
+        return Response({'revoked_before': revoked_before}, status=status.HTTP_200_OK)
+
+
 class UserListView(generics.ListAPIView):
     serializer_class = UserSerializer
     queryset = User.objects.all().order_by('-id')
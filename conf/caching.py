@@ -0,0 +1,7 @@
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(cache):
+    """True for cache backends whose entries other worker processes never see."""
+    return isinstance(cache, (LocMemCache, DummyCache))
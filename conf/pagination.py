@@ -0,0 +1,106 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed sort key. Each page is a single range scan from the
+    previous position, so deep pages cost the same as the first and no COUNT(*) is issued.
+    Views may allow other keys through `cursor_ordering_fields`; `id` breaks ties.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering')
+        if not ordering:
+            return (self.ordering,)
+
+        field = ordering.lstrip('-')
+        if field not in getattr(view, 'cursor_ordering_fields', ('id',)):
+            raise ValidationError({'ordering': f"Cursor pagination cannot order by '{field}'."})
+        if field == 'id':
+            return (ordering,)
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
+
+class LegacyOffsetPagination(LimitOffsetPagination):
+    """
+    limit/offset pagination for older clients. The total is only computed on request:
+    `count=exact` runs COUNT(*), `count=approx` counts at most `approximate_count_cap` rows.
+    """
+    default_limit = 50
+    max_limit = 1000
+    count_query_param = 'count'
+    approximate_count_cap = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.count, self.count_is_exact = self.get_count(queryset, request.query_params.get(self.count_query_param))
+        return rows[:self.limit]
+
+    def get_count(self, queryset, mode=None):
+        if mode == 'exact':
+            return queryset.count(), True
+        if mode == 'approx':
+            count = queryset.order_by()[:self.approximate_count_cap].count()
+            return count, count < self.approximate_count_cap
+        return None, False
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, 'count_is_exact': self.count_is_exact, **payload}
+        return Response(payload)
+
+
+class OptInPagination(BasePagination):
+    """
+    List endpoints stay unpaginated unless the client picks a mode:
+
+        ?pagination=cursor[&page_size=50][&ordering=-id]     keyset pages, follow `next`
+        ?pagination=offset[&limit=50][&offset=0][&count=exact|approx]
+    """
+    mode_query_param = 'pagination'
+    paginator_classes = {
+        'cursor': KeysetPagination,
+        'offset': LegacyOffsetPagination,
+    }
+
+    def __init__(self):
+        self.paginator = None
+
+    def get_mode(self, request):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode is None and 'cursor' in request.query_params:
+            return 'cursor'
+        return mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = self.get_mode(request)
+        if mode is None:
+            return None
+        if mode not in self.paginator_classes:
+            raise ValidationError({self.mode_query_param: f"Expected one of: {', '.join(self.paginator_classes)}."})
+
+        self.paginator = self.paginator_classes[mode]()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -13,6 +13,7 @@ from django.utils.timezone import timedelta
 from decouple import config
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -66,10 +67,12 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES':(
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'accounts.authentication.CachedBasicAuthentication',
     ),
+    # Lists are unpaginated unless the client asks for ?pagination=cursor or ?pagination=offset
+    'DEFAULT_PAGINATION_CLASS': 'conf.pagination.OptInPagination',
 
     # 'DEFAULT_FILTER_BACKENDS': (
     #     'django_filters.rest_framework.DjangoFilterBackend',
@@ -103,6 +106,61 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared by every worker on the host like "responses" below, so a revoked permission is
+    # forgotten by all of them at once; employees.W001 flags a per-process backend.
+    "permissions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config('PERMISSION_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'hrm_permissions')),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Shared by every worker on the host, so an invalidation in one is seen by all; point
+    # RESPONSE_CACHE_LOCATION somewhere all workers can write, or swap in Redis/Memcached.
+    "responses": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config('RESPONSE_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'hrm_responses')),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+# Per-user permission codes resolved by employees.decorator.permission_required; cleared on migrate.
+PERMISSION_CACHE_ALIAS = "permissions"
+PERMISSION_CACHE_TIMEOUT = 300
+
+# Embed permission codes in access tokens issued at login; a token is only trusted
+# while its perm_version matches the user's, re-read at most every PERMISSION_VERSION_TTL seconds.
+PERMISSION_CLAIMS_IN_TOKEN = config('PERMISSION_CLAIMS_IN_TOKEN', default=False, cast=bool)
+PERMISSION_VERSION_TTL = 5
+
+# Rendered Department/Position list responses, invalidated by employees.signals through a
+# generation counter kept in RESPONSE_CACHE_ALIAS. Workers only see each other's invalidations
+# (and hit/miss stats) when that cache is shared; with a per-process backend such as LocMemCache
+# other workers serve stale lists for up to RESPONSE_CACHE_TIMEOUT seconds.
+RESPONSE_CACHE_ALIAS = config('RESPONSE_CACHE_ALIAS', default='responses')
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Serve the invitation status summary from per-organization counters maintained on every
+# status transition. Run `manage.py rebuild_invitation_counters` after turning this on.
+INVITATION_STATUS_COUNTERS = config('INVITATION_STATUS_COUNTERS', default=False, cast=bool)
+
+# employees.tasks.expire_invitations_task, registered with the beat DatabaseScheduler on migrate:
+# every INVITATION_SWEEP_INTERVAL minutes it marks overdue pending invitations as expired and deletes
+# declined/expired ones that expired over INVITATION_RETENTION_DAYS ago (0 keeps them).
+INVITATION_SWEEP_INTERVAL = 15
+INVITATION_SWEEP_BATCH_SIZE = 500
+INVITATION_RETENTION_DAYS = config('INVITATION_RETENTION_DAYS', default=180, cast=int)
+
+# Full-text index behind the employee list's ?q= search. The SQLite FTS5 backend falls back to
+# employees.search.DatabaseSearchBackend (LIKE scans) on databases without FTS5.
+# migrate fills the index when it is empty while employees exist. Run `manage.py rebuild_search_index`
+# after switching backends or loading data without signals.
+EMPLOYEE_SEARCH_BACKEND = config('EMPLOYEE_SEARCH_BACKEND', default='employees.search.SQLiteFTSBackend')
+
 ROOT_URLCONF = "conf.urls"
 
 TEMPLATES = [
@@ -198,6 +256,48 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER')
 
+# accounts.outbox: rows sent per connection, attempts before giving up, first retry delay
+# in seconds (doubled on every further attempt) and how long a claimed batch stays leased.
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+EMAIL_OUTBOX_LEASE = 300
+# Where a scheduled retry is recorded so concurrent runs do not queue one each. The default cache
+# is per process, so each worker may still schedule its own retry (a spare run only finds nothing
+# due); point this at a cache shared by all workers to keep it to one.
+EMAIL_OUTBOX_CACHE_ALIAS = config('EMAIL_OUTBOX_CACHE_ALIAS', default='default')
+
+# Password reset codes (accounts.otp): valid for OTP_TTL seconds and OTP_MAX_ATTEMPTS guesses.
+# accounts.otp.CacheOtpStore avoids the table but needs OTP_CACHE_ALIAS to be shared by every
+# web process; with a per-process cache (LocMemCache) the system check warns (accounts.W001).
+OTP_STORE = config('OTP_STORE', default='accounts.otp.DatabaseOtpStore')
+OTP_CACHE_ALIAS = config('OTP_CACHE_ALIAS', default='default')
+OTP_TTL = 600
+OTP_MAX_ATTEMPTS = 5
+
+# Basic auth: remember successful password checks for BASIC_AUTH_CACHE_TIMEOUT seconds (0 turns
+# it off). Entries are HMACs bound to the password hash and dropped on every password change.
+BASIC_AUTH_CACHE_ALIAS = config('BASIC_AUTH_CACHE_ALIAS', default='default')
+BASIC_AUTH_CACHE_TIMEOUT = config('BASIC_AUTH_CACHE_TIMEOUT', default=0, cast=int)
+
+# Users behind JWT requests come from a snapshot: an in-process LRU of JWT_USER_LOCAL_SIZE entries
+# kept JWT_USER_LOCAL_TTL seconds, then JWT_USER_CACHE_ALIAS if it is shared between processes
+# (a LocMemCache alias is skipped, so a local miss reads the database). User saves and deletes drop
+# both tiers; other processes see the change within JWT_USER_LOCAL_TTL seconds.
+JWT_USER_CACHE_ALIAS = config('JWT_USER_CACHE_ALIAS', default='default')
+JWT_USER_CACHE_TIMEOUT = 300
+JWT_USER_LOCAL_TTL = 5
+JWT_USER_LOCAL_SIZE = 1024
+
+# accounts.revocation: logout and "revoke all sessions" are checked against a Bloom filter sized
+# for REVOCATION_FILTER_CAPACITY keys and refreshed every REVOCATION_REFRESH_INTERVAL seconds; the
+# database is only read on a possible hit. Rows past every token lifetime are purged every
+# REVOCATION_PURGE_INTERVAL minutes by accounts.tasks.purge_revocations_task.
+REVOCATION_REFRESH_INTERVAL = 30
+REVOCATION_FILTER_CAPACITY = 100000
+REVOCATION_FILTER_ERROR_RATE = 0.001
+REVOCATION_PURGE_INTERVAL = 60
+
 APPEND_SLASH = True
 
 FRONTEND_URL = config('FRONTEND_URL')
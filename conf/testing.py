@@ -0,0 +1,51 @@
+import re
+from collections import Counter
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \((?:\?, )*\?\)")
+
+
+def sql_shape(sql):
+    """Strip literals from a statement so repeats of the same query collapse to one shape."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryBudgetMixin:
+    """
+    Query budgets that must not grow with the data.
+
+    `assertQueryBudget` calls the endpoint, lets the test case add more rows through `grow()`,
+    then calls it again. Both runs must issue the same number of queries and stay within the
+    budget; on failure the repeated statement shapes are printed, which is where an N+1 shows.
+    """
+
+    def grow(self):
+        raise NotImplementedError
+
+    def capture(self, call, expected_status):
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+        self.assertEqual(response.status_code, expected_status, getattr(response, 'data', response))
+        return context.captured_queries
+
+    def assertQueryBudget(self, budget, call, expected_status=200):
+        before = self.capture(call, expected_status)
+        self.grow()
+        after = self.capture(call, expected_status)
+        if len(after) <= budget and len(after) == len(before):
+            return
+
+        shapes = Counter(sql_shape(query['sql']) for query in after)
+        repeated = '\n'.join(f"  {count}x  {shape}" for shape, count in shapes.most_common() if count > 1)
+        self.fail(
+            f"{len(before)} queries before growing the data, {len(after)} after; budget is {budget}.\n"
+            f"Repeated statements:\n{repeated or '  (none)'}"
+        )
@@ -3,20 +3,27 @@ from .models import (Department, Position, Employee,
                      DepartmentPermission, PositionPermission,
                      EmployeePermission, DepartmentRole,
                      PositionRole, EmployeeRole, Organization,
-                     OrganizationPermission, OrganizationRole, EmployeeInvitation)
+                     OrganizationPermission, OrganizationRole, EmployeeInvitation,
+                     InvitationStatusCounter, UserPermissionIndex)
+from .search import get_search_backend
 
 # Register your models here.
 
 
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'position', 'status', 'added_by', 'created_at', 'updated_at']
-    search_fields = ['user', 'position', 'department_name', 'status', 'added_by']
+    search_fields = ['user__first_name', 'user__last_name', 'user__email', 'position__title', 'position__department__name']
     list_filter = ['status', 'is_active', 'is_on_leave']
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return get_search_backend().search(queryset, search_term), False
+
 
 class OrganizationAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'admin', 'get_employees', 'created_at', 'updated_at']
-    search_fields = ['name', 'admin']
+    search_fields = ['name', 'admin__email']
 
     @admin.display(description='Employees')
     def get_employees(self, obj):
@@ -25,10 +32,20 @@ class OrganizationAdmin(admin.ModelAdmin):
 
 class EmployeeInvitationAdmin(admin.ModelAdmin):
     list_display = ['id', 'email', 'status', 'token', 'organization', 'position', 'invited_by', 'is_accepted', 'created_at', 'expires_at', 'last_sent_at']
-    search_fields = ['email', 'organization', 'position', 'invited_by']
+    search_fields = ['email', 'organization__name', 'position__title', 'invited_by__email']
     list_filter = ['status', 'is_accepted']
 
 
+class InvitationStatusCounterAdmin(admin.ModelAdmin):
+    list_display = ['id', 'organization', 'status', 'count']
+    list_filter = ['status']
+
+
+class UserPermissionIndexAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'code']
+    search_fields = ['user__email', 'code']
+
+
 admin.site.register(Department)
 admin.site.register(DepartmentPermission)
 admin.site.register(DepartmentRole)
@@ -42,3 +59,5 @@ admin.site.register(Organization, OrganizationAdmin)
 admin.site.register(OrganizationPermission)
 admin.site.register(OrganizationRole)
 admin.site.register(EmployeeInvitation, EmployeeInvitationAdmin)
+admin.site.register(InvitationStatusCounter, InvitationStatusCounterAdmin)
+admin.site.register(UserPermissionIndex, UserPermissionIndexAdmin)
@@ -1,6 +1,43 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_permissions(sender, using, **kwargs):
+    from .models import setup_permissions
+    setup_permissions(using=using)
+
+
+def clear_permission_cache(sender, **kwargs):
+    # The cache outlives the process; codes cached against the old schema or data must not survive migrate.
+    from .permission_cache import get_permission_cache
+    get_permission_cache().clear()
+
+
+def backfill_permission_index(sender, **kwargs):
+    from .permission_cache import backfill_permission_index
+    backfill_permission_index()
+
+
+def schedule_periodic_tasks(sender, **kwargs):
+    from .tasks import schedule_periodic_tasks
+    schedule_periodic_tasks()
+
+
+def install_search_index(sender, **kwargs):
+    from .search import get_search_backend
+    backend = get_search_backend()
+    backend.install()
+    backend.backfill()
 
 
 class EmployeesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "employees"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        post_migrate.connect(sync_permissions, sender=self, dispatch_uid='employees_sync_permissions')
+        post_migrate.connect(clear_permission_cache, sender=self, dispatch_uid='employees_clear_permission_cache')
+        post_migrate.connect(backfill_permission_index, sender=self, dispatch_uid='employees_backfill_permission_index')
+        post_migrate.connect(install_search_index, sender=self, dispatch_uid='employees_install_search_index')
+        post_migrate.connect(schedule_periodic_tasks, sender=self, dispatch_uid='employees_schedule_periodic_tasks')
@@ -0,0 +1,19 @@
+from django.core.cache.backends.dummy import DummyCache
+from django.core.checks import Warning, register
+from conf.caching import is_process_local
+
+
+@register()
+def check_permission_cache(app_configs, **kwargs):
+    from .permission_cache import get_permission_cache
+
+    cache = get_permission_cache()
+    # A DummyCache stores nothing, so every check reads the index and nothing can go stale.
+    if is_process_local(cache) and not isinstance(cache, DummyCache):
+        return [Warning(
+            "PERMISSION_CACHE_ALIAS is a per-process cache: a revoked permission is only forgotten by "
+            "the worker that revoked it, and stays granted on the others for PERMISSION_CACHE_TIMEOUT seconds.",
+            hint="Point PERMISSION_CACHE_ALIAS at a cache shared by all workers.",
+            id='employees.W001',
+        )]
+    return []
@@ -1,22 +1,52 @@
 from functools import wraps
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework.response import Response
 from rest_framework import status
-from .models import DepartmentRole, PositionRole, EmployeeRole, OrganizationRole
+from .permission_cache import get_user_permission_codes, get_token_permission_codes
 
 
 def permission_required(codes):
+    codes = frozenset(codes)
+
     def decorator(func):
         @wraps(func)
         def wrapper(self, request, *args, **kwargs):
-            user = request.user
-            has_perm = (
-                DepartmentRole.objects.filter(user=user, permission__code__in=codes).exists() or
-                PositionRole.objects.filter(user=user, permission__code__in=codes).exists() or
-                EmployeeRole.objects.filter(user=user, permission__code__in=codes).exists() or
-                OrganizationRole.objects.filter(user=user, permission__code__in=codes).exists()
-            )
+            granted = get_token_permission_codes(request)
+            if granted is None:
+                granted = get_user_permission_codes(request.user)
+            has_perm = not codes.isdisjoint(granted)
             if not has_perm:
                 return Response({"detail": "You don't have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
             return func(self, request, *args, **kwargs)
         return wrapper
     return decorator
+
+
+def conditional(func):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 and failed If-Match / If-Unmodified-Since
+    with 412, before the handler runs. The view supplies `get_validators()`
+    (see mixins.ConditionalRequestMixin). Place it below `permission_required`.
+    """
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return set_validators(response, etag, last_modified) if response.status_code == 304 else response
+
+        response = func(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            if request.method not in ('GET', 'HEAD'):
+                # The write changed the validators; the updated instance is still cached on the view.
+                etag, last_modified = self.get_validators()
+            set_validators(response, etag, last_modified)
+        return response
+    return wrapper
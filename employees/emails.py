@@ -0,0 +1,83 @@
+from functools import lru_cache
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+from django.utils.html import escape
+
+INVITATION_TEMPLATES = {
+    False: ('Invitation to join {organization}', 'emails/invitation.html'),
+    True: ('Join {organization} - Invitation Reminder', 'emails/resendinvite.html'),
+}
+PLAIN_TEXT_BODY = 'This is an HTML email. Please use an HTML-compatible mail client.'
+
+# Stands in for acceptance_url while the shared part of a batch is rendered. Autoescaping leaves
+# it untouched, so every occurrence in the output marks where a recipient's URL goes.
+_MARKER = '\x00acceptance_url\x00'
+
+
+@lru_cache(maxsize=None)
+def compiled_template(name):
+    return get_template(name)
+
+
+def acceptance_url(invitation):
+    return f"{settings.FRONTEND_URL}/accept-invitation?token={invitation.token}"
+
+
+def invitation_context(invitation):
+    return {
+        'organization': invitation.organization.name,
+        'position': invitation.position.title if invitation.position else 'N/A',
+        'invited_by': invitation.invited_by.full_name,
+        'acceptance_url': acceptance_url(invitation),
+        'expires_at': invitation.expires_at.strftime("%B %d, %Y"),
+    }
+
+
+class InvitationEmailRenderer:
+    """
+    Render invitation emails for a batch.
+
+    Invitations that share organization, position, inviter and expiry date are rendered once with
+    a marker in place of acceptance_url. Each recipient then gets a copy with the marker replaced
+    by their escaped URL. The first copy in every group is checked against a full render. If they
+    differ, for example because a filter changed the URL, the whole group is rendered one by one.
+    """
+
+    def __init__(self, is_resend=False):
+        self.subject, template_name = INVITATION_TEMPLATES[is_resend]
+        self.template = compiled_template(template_name)
+
+    def render(self, invitation):
+        return self.template.render(invitation_context(invitation))
+
+    def render_batch(self, invitations):
+        """Return [(invitation, subject, html)] in the order given."""
+        invitations = list(invitations)
+        groups = {}
+        for index, invitation in enumerate(invitations):
+            context = invitation_context(invitation)
+            del context['acceptance_url']
+            groups.setdefault(tuple(context.items()), []).append(index)
+
+        rendered = [None] * len(invitations)
+        for key, indexes in groups.items():
+            context = dict(key)
+            subject = self.subject.format(**context)
+            parts = self.template.render({**context, 'acceptance_url': _MARKER}).split(_MARKER)
+            splice = (lambda invitation: escape(acceptance_url(invitation)).join(parts)) if len(parts) > 1 else None
+            first = invitations[indexes[0]]
+            if splice is None or splice(first) != self.render(first):
+                splice = self.render
+            for index in indexes:
+                rendered[index] = (invitations[index], subject, splice(invitations[index]))
+        return rendered
+
+    def messages(self, invitations):
+        messages = []
+        for invitation, subject, html in self.render_batch(invitations):
+            message = EmailMultiAlternatives(subject=subject, body=PLAIN_TEXT_BODY,
+                                             from_email=settings.DEFAULT_FROM_EMAIL, to=[invitation.email])
+            message.attach_alternative(html, 'text/html')
+            messages.append(message)
+        return messages
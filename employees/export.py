@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+# Rows encoded per chunk handed to the response; keeps writes large and memory flat.
+ROWS_PER_CHUNK = 500
+
+
+def csv_columns(serializer, prefix=''):
+    """Dotted column names for a serializer's readable fields, with nested serializers flattened."""
+    columns = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.BaseSerializer) and not getattr(field, 'many', False):
+            columns.extend(csv_columns(field, f'{prefix}{field.field_name}.'))
+        else:
+            columns.append(prefix + field.field_name)
+    return columns
+
+
+def _lookup(row, path):
+    for key in path:
+        if not isinstance(row, dict):
+            return ''
+        row = row.get(key)
+    return '' if row is None else row
+
+
+def iter_csv(columns, rows):
+    """Encode representation dicts as CSV text chunks, header first."""
+    paths = [column.split('.') for column in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_lookup(row, path) for path in paths])
+        if n % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """Encode representation dicts as newline-delimited JSON text chunks."""
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(row))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
@@ -0,0 +1,101 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from . import GENDER_CHOICES, STATUS_CHOICES
+
+BOOLEANS = {'1': True, 'true': True, '0': False, 'false': False}
+
+
+def integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not an integer.")
+
+
+def integer_list(value):
+    return [integer(item) for item in value.split(',')]
+
+
+def boolean(value):
+    # A one-item list for an `__in` lookup: `field=True` compiles to a bare `WHERE field`,
+    # which SQLite cannot look up in an index.
+    try:
+        return [BOOLEANS[value.lower()]]
+    except KeyError:
+        raise ValueError(f"Expected one of: {', '.join(BOOLEANS)}.")
+
+
+def date(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"'{value}' is not a YYYY-MM-DD date.")
+    return parsed
+
+
+def text_list(value):
+    return [item.strip() for item in value.split(',')]
+
+
+def choice_list(choices):
+    allowed = [key for key, _ in choices]
+
+    def parse(value):
+        values = value.split(',')
+        unknown = [item for item in values if item not in allowed]
+        if unknown:
+            raise ValueError(f"Expected one of: {', '.join(allowed)}.")
+        return values
+    return parse
+
+
+# query parameter -> (queryset lookup, parser). Lists are comma separated. Each column lookup is
+# served by one of the indexes on Employee.Meta, alone or combined with `status`; the age and
+# tenure bounds compare EmployeeQuerySet.with_age_and_tenure() annotations.
+EMPLOYEE_FILTERS = {
+    'user_id': ('user_id', integer),
+    'status': ('status__in', choice_list(STATUS_CHOICES)),
+    'is_active': ('is_active__in', boolean),
+    'is_on_leave': ('is_on_leave__in', boolean),
+    'position': ('position_id__in', integer_list),
+    'department': ('position__department_id__in', integer_list),
+    'organization': ('members_of_organization', integer),
+    'gender': ('gender__in', choice_list(GENDER_CHOICES)),
+    'country': ('country__in', text_list),
+    'joined_after': ('joining_date__gte', date),
+    'joined_before': ('joining_date__lte', date),
+    'left_after': ('leaving_date__gte', date),
+    'left_before': ('leaving_date__lte', date),
+    'min_age': ('age_years__gte', integer),
+    'max_age': ('age_years__lte', integer),
+    'min_tenure': ('tenure_years__gte', integer),
+    'max_tenure': ('tenure_years__lte', integer),
+}
+
+
+def filter_queryset(queryset, params, filters):
+    """Apply every filter present in `params`; all invalid values are reported together as a 400."""
+    lookups, errors = {}, {}
+    for param, (lookup, parse) in filters.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            lookups[lookup] = parse(value)
+        except ValueError as e:
+            errors[param] = [str(e)]
+    if errors:
+        raise ValidationError(errors)
+    return queryset.filter(**lookups)
+
+
+def order_queryset(queryset, ordering, allowed):
+    """Order by a whitelisted field, `-` for descending, with `id` breaking ties."""
+    field = ordering.lstrip('-')
+    if field not in allowed:
+        raise ValidationError({'ordering': f"Expected one of: {', '.join(allowed)}, optionally prefixed with '-'."})
+    if field == 'id':
+        return queryset.order_by(ordering)
+    return queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.fields import empty
+from accounts.models import User
+from .models import Position, Employee
+from .search import get_search_backend
+from .serializers import EmployeeImportRowSerializer
+
+INPUT_FORMATS = ('csv', 'json')
+
+
+def read_rows(stream, input_format):
+    """Parse an uploaded CSV or JSON file (bytes or text) into a list of row dicts."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    try:
+        if input_format == 'csv':
+            # Empty cells mean "not given", so defaults and null apply instead of a parse error.
+            return [{key: value for key, value in row.items() if key and value != ''} for row in csv.DictReader(stream)]
+        rows = json.load(stream)
+    except UnicodeDecodeError:
+        raise serializers.ValidationError({'file': ['The file is not UTF-8 encoded.']})
+    except ValueError as e:
+        raise serializers.ValidationError({'file': [f'Invalid JSON: {e}']})
+    if isinstance(rows, dict):
+        rows = rows.get('rows')
+    if not isinstance(rows, list):
+        raise serializers.ValidationError({'file': ['Expected a JSON list of rows.']})
+    return rows
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmployeeImporter:
+    """
+    Validate and insert employee rows in bulk.
+
+    Rows name their user by `user_id` or `email` and may carry a `position` id plus any column of
+    EmployeeImportRowSerializer. References are resolved with a few `in_bulk` queries for the whole
+    file, scalar columns are validated field by field without touching the database, and valid rows
+    are written with `bulk_create`, one transaction per batch. Invalid rows are reported, not inserted.
+    """
+
+    def __init__(self, added_by=None, batch_size=1000):
+        self.added_by = added_by
+        self.batch_size = batch_size
+        self.fields = EmployeeImportRowSerializer().fields
+
+    def run(self, rows, dry_run=False):
+        errors = {}
+        self.resolve_references(rows)
+        employees, seen = [], set()
+
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict):
+                errors[number] = {'non_field_errors': ['Expected an object.']}
+                continue
+            row_errors = {}
+            user_id = self.resolve_user(row, row_errors)
+            if user_id in self.existing:
+                row_errors['user_id'] = ['User already has an employee profile']
+            elif user_id in seen:
+                row_errors['user_id'] = ['User appears more than once in this import']
+            elif user_id is not None:
+                seen.add(user_id)
+
+            position_id = None
+            if row.get('position') not in (None, ''):
+                position_id = _as_int(row['position'])
+                if position_id not in self.positions:
+                    row_errors['position'] = [f'Invalid pk "{row["position"]}" - object does not exist.']
+
+            values = self.validate_columns(row, row_errors)
+            if row_errors:
+                errors[number] = row_errors
+                continue
+            employees.append((number, Employee(user_id=user_id, position_id=position_id,
+                                               added_by=self.added_by, **values)))
+
+        created = 0 if dry_run else self.insert(employees, errors)
+        return {
+            'total': len(rows),
+            'created': created,
+            'errors': [{'row': number, 'errors': errors[number]} for number in sorted(errors)],
+        }
+
+    def resolve_references(self, rows):
+        rows = [row for row in rows if isinstance(row, dict)]
+        user_ids = {_as_int(row.get('user_id')) for row in rows} - {None}
+        emails = {User.objects.normalize_email(row['email']) for row in rows
+                  if isinstance(row.get('email'), str) and row.get('user_id') in (None, '')}
+        position_ids = {_as_int(row.get('position')) for row in rows} - {None}
+
+        self.user_ids = set(User.objects.only('id').in_bulk(user_ids))
+        self.emails = {email: user.pk for email, user in
+                       User.objects.only('id', 'email').in_bulk(emails, field_name='email').items()}
+        self.positions = set(Position.objects.only('id').in_bulk(position_ids))
+        self.existing = set()
+        for chunk in _chunks(self.user_ids | set(self.emails.values()), self.batch_size):
+            self.existing.update(Employee.objects.filter(user_id__in=chunk).values_list('user_id', flat=True))
+
+    def resolve_user(self, row, row_errors):
+        if row.get('user_id') not in (None, ''):
+            user_id = _as_int(row['user_id'])
+            if user_id in self.user_ids:
+                return user_id
+            row_errors['user_id'] = [f'Invalid pk "{row["user_id"]}" - object does not exist.']
+        elif row.get('email'):
+            user_id = self.emails.get(User.objects.normalize_email(str(row['email'])))
+            if user_id is not None:
+                return user_id
+            row_errors['email'] = ['No user with this email.']
+        else:
+            row_errors['user_id'] = ['user_id or email is required']
+        return None
+
+    def validate_columns(self, row, row_errors):
+        values = {}
+        for name, field in self.fields.items():
+            try:
+                value = field.run_validation(row.get(name, empty))
+            except serializers.SkipField:
+                continue
+            except serializers.ValidationError as e:
+                row_errors[name] = e.detail
+                continue
+            values[name] = value
+        return values
+
+    def insert(self, employees, errors):
+        created = 0
+        for batch in _chunks(employees, self.batch_size):
+            try:
+                with transaction.atomic():
+                    Employee.objects.bulk_create([employee for _, employee in batch])
+                    # bulk_create sends no post_save, so the batch is indexed here.
+                    get_search_backend().index(Employee.objects.filter(user_id__in=[e.user_id for _, e in batch]))
+                created += len(batch)
+            except IntegrityError:
+                # Someone created one of these profiles since the lookup; find it row by row.
+                created += self.insert_rows(batch, errors)
+        return created
+
+    def insert_rows(self, batch, errors):
+        created = 0
+        for number, employee in batch:
+            employee.pk = None
+            try:
+                with transaction.atomic():
+                    employee.save(force_insert=True)
+                created += 1
+            except IntegrityError:
+                errors[number] = {'user_id': ['User already has an employee profile']}
+        return created
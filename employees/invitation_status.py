@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .models import EmployeeInvitation, InvitationStatusCounter
+
+STATUSES = [status for status, _ in EmployeeInvitation.STATUS_CHOICES]
+
+
+def counters_enabled():
+    return getattr(settings, 'INVITATION_STATUS_COUNTERS', False)
+
+
+def overdue_q(now):
+    """Pending invitations past their expiry; nothing rewrites their status, so they are counted as expired."""
+    return Q(status='pending', expires_at__lt=now)
+
+
+def invitation_status_counts(queryset, now=None):
+    """Total and per-status counts of `queryset` in a single conditional-aggregation query."""
+    now = now or timezone.now()
+    return queryset.order_by().aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending', expires_at__gte=now)),
+        accepted=Count('id', filter=Q(status='accepted')),
+        declined=Count('id', filter=Q(status='declined')),
+        expired=Count('id', filter=Q(status='expired') | overdue_q(now)),
+    )
+
+
+def counted_status_counts(organization_ids=None, now=None):
+    """
+    The same summary read from InvitationStatusCounter: one grouped query over at most
+    four rows per organization, plus an indexed count of the pending invitations that are overdue.
+    """
+    now = now or timezone.now()
+    counters = InvitationStatusCounter.objects.all()
+    overdue = EmployeeInvitation.objects.filter(overdue_q(now))
+    if organization_ids is not None:
+        counters = counters.filter(organization_id__in=organization_ids)
+        overdue = overdue.filter(organization_id__in=organization_ids)
+
+    counts = dict.fromkeys(STATUSES, 0)
+    for row in counters.values('status').annotate(count=Sum('count')).order_by():
+        counts[row['status']] = row['count']
+    overdue_count = overdue.count() if counts['pending'] else 0
+    counts['pending'] -= overdue_count
+    counts['expired'] += overdue_count
+    return {'total': sum(counts.values()), **counts}
+
+
+def adjust_invitation_counters(deltas):
+    """Apply {(organization_id, status): delta} to the counter table."""
+    with transaction.atomic():
+        for (organization_id, status), delta in deltas.items():
+            if not delta:
+                continue
+            counter = InvitationStatusCounter.objects.filter(organization_id=organization_id, status=status)
+            if not counter.update(count=F('count') + delta) and delta > 0:
+                InvitationStatusCounter.objects.get_or_create(organization_id=organization_id, status=status)
+                counter.update(count=F('count') + delta)
+
+
+def rebuild_invitation_counters():
+    """Recount every organization from EmployeeInvitation. Returns the number of counter rows written."""
+    rows = (EmployeeInvitation.objects.order_by().values('organization_id', 'status')
+            .annotate(count=Count('id')))
+    with transaction.atomic():
+        InvitationStatusCounter.objects.all().delete()
+        counters = InvitationStatusCounter.objects.bulk_create(
+            [InvitationStatusCounter(organization_id=row['organization_id'], status=row['status'], count=row['count'])
+             for row in rows]
+        )
+    return len(counters)
+
+
+def rebuild_organization_counters(organization_id):
+    """Recount a single organization, for saves whose previous status is unknown."""
+    rows = (EmployeeInvitation.objects.filter(organization_id=organization_id).order_by()
+            .values('status').annotate(count=Count('id')))
+    with transaction.atomic():
+        InvitationStatusCounter.objects.filter(organization_id=organization_id).delete()
+        InvitationStatusCounter.objects.bulk_create(
+            [InvitationStatusCounter(organization_id=organization_id, status=row['status'], count=row['count'])
+             for row in rows]
+        )
+
+
+def sweep_batch_size():
+    return getattr(settings, 'INVITATION_SWEEP_BATCH_SIZE', 500)
+
+
+def expire_overdue_invitations(now=None, batch_size=None):
+    """
+    Move one batch of overdue pending invitations to `expired`; returns how many moved.
+
+    The batch is read through the (status, expires_at) index and updated per organization, so
+    the counters are adjusted by the rows each UPDATE actually changed. Re-applying the overdue
+    filter in the UPDATE skips invitations accepted or resent since they were read.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = defaultdict(list)
+        rows = (EmployeeInvitation.objects.filter(overdue_q(now)).order_by('expires_at')
+                .values_list('id', 'organization_id')[:batch_size or sweep_batch_size()])
+        for pk, organization_id in rows:
+            batch[organization_id].append(pk)
+
+        deltas, total = {}, 0
+        for organization_id, ids in batch.items():
+            moved = EmployeeInvitation.objects.filter(overdue_q(now), id__in=ids).update(status='expired')
+            deltas[(organization_id, 'pending')] = -moved
+            deltas[(organization_id, 'expired')] = moved
+            total += moved
+        if counters_enabled():
+            adjust_invitation_counters(deltas)
+    return total
+
+
+def purge_invitations(now=None, batch_size=None):
+    """
+    Delete one batch of declined or expired invitations whose expiry is more than
+    INVITATION_RETENTION_DAYS old; returns how many were deleted. A retention of 0 keeps them.
+    """
+    retention_days = getattr(settings, 'INVITATION_RETENTION_DAYS', 0)
+    if not retention_days:
+        return 0
+    stale = Q(status__in=('declined', 'expired'), expires_at__lt=(now or timezone.now()) - timedelta(days=retention_days))
+
+    with transaction.atomic():
+        batch = defaultdict(list)
+        rows = (EmployeeInvitation.objects.filter(stale).order_by('expires_at')
+                .values_list('id', 'organization_id', 'status')[:batch_size or sweep_batch_size()])
+        for pk, organization_id, status in rows:
+            batch[(organization_id, status)].append(pk)
+
+        deltas, total = {}, 0
+        for key, ids in batch.items():
+            purge = EmployeeInvitation.objects.filter(stale, id__in=ids, status=key[1])
+            # The counter post_delete receiver skips deletes started by a flagged queryset;
+            # the counters are adjusted once per group below.
+            purge.counters_adjusted_by_caller = True
+            deleted = purge.delete()[1].get(EmployeeInvitation._meta.label, 0)
+            deltas[key] = -deleted
+            total += deleted
+        if counters_enabled():
+            adjust_invitation_counters(deltas)
+    return total
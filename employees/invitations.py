@@ -0,0 +1,82 @@
+import secrets
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+from .invitation_status import counters_enabled, adjust_invitation_counters
+from .models import EmployeeInvitation
+
+INVITATION_LIFETIME = timedelta(days=7)
+
+# Same wording as the single-invitation endpoint.
+SKIP_REASONS = {
+    'invalid': 'Enter a valid email address.',
+    'duplicate': 'This email appears more than once in the request.',
+    'member': 'User with this email is already a member of the organization.',
+    'pending': 'A pending invitation already exists for this email in the organization.',
+    'declined': 'This email previously declined an invitation to this organization.',
+    'accepted': 'This email previously accepted an invitation to this organization.',
+}
+
+
+def _skip_reason(email, seen, members, latest, pending):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return 'invalid'
+    if email in seen:
+        return 'duplicate'
+    if email in members:
+        return 'member'
+    if email in pending:
+        return 'pending'
+    if latest.get(email) in ('declined', 'accepted'):
+        return latest[email]
+    return None
+
+
+def bulk_invite(emails, organization, position, invited_by):
+    """
+    Invite many emails to one organization and position.
+
+    Applies the same checks as SendInvitationView, using one query for the memberships and one
+    for the earlier invitations, and creates the new invitations with a single bulk_create.
+    Returns (report, created invitations); the report has one entry per email, in order.
+    """
+    now = timezone.now()
+    candidates = set(emails)
+    members = set(organization.employees.filter(user__email__in=candidates).values_list('user__email', flat=True))
+    latest, pending = {}, set()
+    previous = (EmployeeInvitation.objects.filter(organization=organization, email__in=candidates)
+                .order_by('email', 'created_at', 'id').values_list('email', 'status', 'expires_at'))
+    for email, invitation_status, expires_at in previous:
+        latest[email] = invitation_status
+        if invitation_status == 'pending' and expires_at > now:
+            pending.add(email)
+
+    report, invitations, seen = [], [], set()
+    for email in emails:
+        reason = _skip_reason(email, seen, members, latest, pending)
+        if reason is not None:
+            report.append({'email': email, 'status': 'skipped', 'reason': reason, 'error': SKIP_REASONS[reason]})
+            continue
+        seen.add(email)
+        # bulk_create skips EmployeeInvitation.save(), so fill in what it would.
+        invitations.append(EmployeeInvitation(
+            email=email, organization=organization, position=position, invited_by=invited_by, status='pending',
+            token=secrets.token_urlsafe(50), expires_at=now + INVITATION_LIFETIME, last_sent_at=now,
+        ))
+        report.append({'email': email, 'status': 'invited'})
+
+    with transaction.atomic():
+        invitations = EmployeeInvitation.objects.bulk_create(invitations)
+        if invitations and counters_enabled():
+            adjust_invitation_counters({(organization.pk, 'pending'): len(invitations)})
+
+    created = iter(invitations)
+    for entry in report:
+        if entry['status'] == 'invited':
+            invitation = next(created)
+            entry.update(invitation_id=invitation.id, token=invitation.token)
+    return report, invitations
@@ -0,0 +1,70 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.models import User
+from employees.models import Department, Position, Employee
+from employees.serializers import EmployeeSerializer, FastEmployeeListSerializer
+from employees.views import EmployeeView
+
+
+class Command(BaseCommand):
+    help = ("Measure rows/sec of EmployeeSerializer against the fast list path. "
+            "Seeds synthetic employees inside a transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seeded = 0
+            for rows in sorted(options['rows']):
+                self.seed(seeded, rows, options['batch_size'])
+                seeded = rows
+                self.run(rows)
+            transaction.set_rollback(True)
+
+    def seed(self, start, stop, batch_size):
+        department, _ = Department.objects.get_or_create(name='Benchmark department')
+        position, _ = Position.objects.get_or_create(
+            title='Benchmark position', department=department,
+            defaults={'salary_range_min': 1000, 'salary_range_max': 2000},
+        )
+        users = User.objects.bulk_create(
+            [User(email=f"bench-list-{i}@example.invalid", first_name="Bench", last_name=str(i), password="!")
+             for i in range(start, stop)],
+            batch_size=batch_size,
+        )
+        Employee.objects.bulk_create(
+            [Employee(user=user, position=position, added_by=users[0], status='ACTIVE', city='Lahore',
+                      date_of_birth=date(1980, 1, 1) + timedelta(days=i % 9000),
+                      joining_date=date(2010, 1, 1) + timedelta(days=i % 4000))
+             for i, user in enumerate(users)],
+            batch_size=batch_size,
+        )
+
+    def run(self, rows):
+        request = Request(APIRequestFactory().get('/employees/employees/'))
+        view = EmployeeView(request=request, format_kwarg=None, kwargs={})
+        queryset = view.get_queryset().filter(user__email__startswith='bench-list-')
+        renderer = JSONRenderer()
+
+        started = time.perf_counter()
+        regular = renderer.render(EmployeeSerializer(queryset, many=True, context={'request': request}).data)
+        regular_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast_serializer = FastEmployeeListSerializer(view.get_serializer(), queryset.query.annotations)
+        fast = renderer.render([fast_serializer.to_representation(row)
+                                for row in fast_serializer.get_queryset(queryset).iterator(chunk_size=2000)])
+        fast_elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{rows:>8} rows  serializer {rows / regular_elapsed:>10,.0f} rows/s  "
+            f"fast {rows / fast_elapsed:>10,.0f} rows/s  ({regular_elapsed / fast_elapsed:.1f}x)"
+            f"{'' if regular == fast else '  OUTPUT MISMATCH'}"
+        )
@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.models import User
+from employees.models import Department, Position, Employee
+from employees.search import DatabaseSearchBackend, get_search_backend
+
+FIRST_NAMES = ['Ali', 'Sara', 'Omar', 'Ayesha', 'Bilal', 'Fatima', 'Hamza', 'Zainab', 'Usman', 'Maryam',
+               'John', 'Jane', 'Carlos', 'Lucia', 'Wei', 'Mei', 'Ivan', 'Olga', 'Kofi', 'Amara']
+CITIES = [('Lahore', 'Pakistan'), ('Karachi', 'Pakistan'), ('Berlin', 'Germany'), ('Madrid', 'Spain'),
+          ('Toronto', 'Canada'), ('Nairobi', 'Kenya'), ('Shanghai', 'China'), ('Austin', 'United States')]
+
+
+class Command(BaseCommand):
+    help = ("Measure employee search latency through the configured search backend against the LIKE "
+            "fallback. Seeds synthetic employees inside a transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--queries', nargs='+', default=['omar', 'sara lahore', 'engineer berlin', 'bench-search-4242'])
+        parser.add_argument('--skip-fallback', action='store_true', help="Do not time the LIKE fallback.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options['rows'], options['batch_size'])
+            self.stdout.write(f"seeded {options['rows']:,} employees in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            backend.install()
+            backend.rebuild()
+            self.stdout.write(f"{type(backend).__name__} rebuilt in {time.perf_counter() - started:.1f}s")
+
+            backends = [backend]
+            if type(backend) is not DatabaseSearchBackend and not options['skip_fallback']:
+                backends.append(DatabaseSearchBackend())
+            for query in options['queries']:
+                for candidate in backends:
+                    self.run(candidate, query)
+            transaction.set_rollback(True)
+
+    def seed(self, rows, batch_size):
+        rng = random.Random(0)
+        departments = [Department.objects.get_or_create(name=f'Benchmark {name}')[0]
+                       for name in ('Engineering', 'Finance', 'Sales', 'Support')]
+        positions = [Position.objects.get_or_create(title=f'{title} {department.name.split()[-1]}', department=department,
+                                                    defaults={'salary_range_min': 1000, 'salary_range_max': 2000})[0]
+                     for department in departments for title in ('Engineer', 'Manager', 'Analyst')]
+        for start in range(0, rows, batch_size):
+            users = User.objects.bulk_create(
+                [User(email=f"bench-search-{i}@example.invalid", first_name=rng.choice(FIRST_NAMES),
+                      last_name=f"Surname{rng.randrange(5000)}", password="!")
+                 for i in range(start, min(start + batch_size, rows))],
+            )
+            employees = []
+            for user in users:
+                city, country = rng.choice(CITIES)
+                joined = date(2010, 1, 1) + timedelta(days=rng.randrange(5000))
+                employees.append(Employee(user=user, position=rng.choice(positions), status='ACTIVE',
+                                          city=city, country=country, nationality=country, joining_date=joined))
+            Employee.objects.bulk_create(employees)
+
+    def run(self, backend, query):
+        queryset = Employee.objects.select_related('user', 'position', 'position__department').order_by('-id')
+        found = backend.search(queryset, query)
+
+        started = time.perf_counter()
+        page = list(found[:50])
+        page_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        total = found.count()
+        count_elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{type(backend).__name__:>22}  {query!r:<22} {total:>9,} matches  "
+            f"first page {page_elapsed * 1000:>9.1f} ms  count {count_elapsed * 1000:>9.1f} ms  ({len(page)} rows)"
+        )
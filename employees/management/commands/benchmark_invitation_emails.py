@@ -0,0 +1,46 @@
+import secrets
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from accounts.models import User
+from employees.emails import INVITATION_TEMPLATES, InvitationEmailRenderer, invitation_context
+from employees.models import Department, Position, Organization, EmployeeInvitation
+
+
+class Command(BaseCommand):
+    help = ("Measure invitation emails rendered per second: render_to_string per recipient against "
+            "InvitationEmailRenderer for one organization's batch. Nothing is written to the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000)
+        parser.add_argument('--resend', action='store_true')
+
+    def handle(self, *args, **options):
+        inviter = User(first_name='Bench', last_name='Admin', email='bench-admin@example.invalid')
+        organization = Organization(name='Benchmark & Co')
+        position = Position(title='Engineer', department=Department(name='Engineering'))
+        expires_at = timezone.now() + timedelta(days=7)
+        invitations = [
+            EmployeeInvitation(email=f'bench{n}@example.invalid', token=secrets.token_urlsafe(50),
+                               organization=organization, position=position, invited_by=inviter,
+                               expires_at=expires_at)
+            for n in range(options['recipients'])
+        ]
+        template_name = INVITATION_TEMPLATES[options['resend']][1]
+
+        started = time.perf_counter()
+        baseline = [render_to_string(template_name, invitation_context(invitation)) for invitation in invitations]
+        baseline_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batched = [html for _, _, html in InvitationEmailRenderer(options['resend']).render_batch(invitations)]
+        batched_elapsed = time.perf_counter() - started
+
+        count = len(invitations)
+        self.stdout.write(
+            f"{count} recipients  render_to_string {count / baseline_elapsed:>10,.0f} msg/s  "
+            f"batched {count / batched_elapsed:>10,.0f} msg/s  ({baseline_elapsed / batched_elapsed:.1f}x)"
+            f"{'' if baseline == batched else '  OUTPUT MISMATCH'}"
+        )
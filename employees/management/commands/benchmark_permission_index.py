@@ -0,0 +1,71 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.models import User
+from employees.models import UserPermissionIndex, setup_permissions
+from employees.permission_cache import ROLE_MODELS, compute_user_permission_codes, rebuild_permission_index
+
+
+class Command(BaseCommand):
+    help = ("Compare the four-way role lookup used by permission_required against the UserPermissionIndex. "
+            "Seeds synthetic users and roles inside a transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--roles', type=int, default=50, help="Roles per user, spread over the four role types.")
+        parser.add_argument('--samples', type=int, default=1000, help="Permission checks timed per path.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            user_ids = self.seed(options['users'], options['roles'], options['batch_size'])
+            started = time.perf_counter()
+            rows = rebuild_permission_index(batch_size=options['batch_size'])
+            self.stdout.write(f"Index rebuilt: {rows} rows in {time.perf_counter() - started:.2f}s")
+
+            samples = [random.choice(user_ids) for _ in range(options['samples'])]
+            codes = ['delete_organization']
+            self.report("role fan-out (4 EXISTS)", samples, lambda user_id: any(
+                model.objects.filter(user_id=user_id, permission__code__in=codes).exists() for model in ROLE_MODELS))
+            self.report("role UNION resolve", samples, compute_user_permission_codes)
+            self.report("index lookup", samples, lambda user_id: frozenset(
+                UserPermissionIndex.objects.filter(user_id=user_id).values_list('code', flat=True)))
+            transaction.set_rollback(True)
+
+    def seed(self, user_count, roles_per_user, batch_size):
+        setup_permissions()
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            [User(email=f"bench-{i}@example.invalid", first_name="Bench", last_name=str(i), password="!")
+             for i in range(user_count)],
+            batch_size=batch_size,
+        )
+        user_ids = [user.pk for user in users]
+
+        for index, role_model in enumerate(ROLE_MODELS):
+            permission_field = role_model.permission.field
+            permission_ids = list(permission_field.related_model.objects.values_list('id', flat=True))
+            per_user = roles_per_user // len(ROLE_MODELS) + (index < roles_per_user % len(ROLE_MODELS))
+            roles = role_model.objects.bulk_create(
+                [role_model(user_id=user_id, name=f"role-{n}") for user_id in user_ids for n in range(per_user)],
+                batch_size=batch_size,
+            )
+            through = permission_field.remote_field.through
+            role_column, permission_column = f"{permission_field.m2m_field_name()}_id", f"{permission_field.m2m_reverse_field_name()}_id"
+            through.objects.bulk_create(
+                [through(**{role_column: role.pk, permission_column: permission_id})
+                 for role in roles for permission_id in random.sample(permission_ids, random.randint(1, 2))],
+                batch_size=batch_size,
+            )
+        self.stdout.write(f"Seeded {user_count} users x {roles_per_user} roles in {time.perf_counter() - started:.2f}s")
+        return user_ids
+
+    def report(self, label, samples, check):
+        started = time.perf_counter()
+        for user_id in samples:
+            check(user_id)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<26} {elapsed / len(samples) * 1000:8.3f} ms/check  ({len(samples) / elapsed:,.0f} checks/s)")
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from accounts.models import User
+from employees.importer import INPUT_FORMATS, EmployeeImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create employees in bulk from a CSV or JSON file; invalid rows are reported and skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input', choices=INPUT_FORMATS,
+                            help="File format; defaults to the file's extension.")
+        parser.add_argument('--added-by', help="Email of the user recorded as added_by.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, insert nothing.")
+
+    def handle(self, *args, **options):
+        input_format = options['input'] or options['path'].rsplit('.', 1)[-1].lower()
+        if input_format not in INPUT_FORMATS:
+            raise CommandError(f"Cannot tell the format of {options['path']}; pass --input.")
+
+        added_by = None
+        if options['added_by']:
+            added_by = User.objects.filter(email=options['added_by']).first()
+            if added_by is None:
+                raise CommandError(f"No user with email {options['added_by']}.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                rows = read_rows(stream, input_format)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+        report = EmployeeImporter(added_by=added_by, batch_size=options['batch_size']).run(
+            rows, dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} of {report['total']} rows imported, {len(report['errors'])} rejected "
+            f"in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from employees.invitation_status import rebuild_invitation_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the per-organization InvitationStatusCounter rows from the EmployeeInvitation table."
+
+    def handle(self, *args, **options):
+        total = rebuild_invitation_counters()
+        self.stdout.write(self.style.SUCCESS(f"Invitation counters rebuilt with {total} rows."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from employees.permission_cache import rebuild_permission_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the UserPermissionIndex table from the department, position, employee and organization roles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = rebuild_permission_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Permission index rebuilt with {total} rows."))
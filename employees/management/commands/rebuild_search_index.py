@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from employees.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recreate the employee search index from the Employee, User, Position and Department tables."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.install()
+            total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{type(backend).__name__} rebuilt with {total} employees."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from employees.models import setup_permissions
+
+
+class Command(BaseCommand):
+    help = "Create any missing department, position, employee and organization permission rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        created = setup_permissions(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f"{created} permission(s) created."))
@@ -0,0 +1,188 @@
+import hashlib
+from datetime import date
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils.http import parse_etags
+from rest_framework import permissions, serializers
+
+FIELDS_QUERY_PARAM = 'fields'
+EXCLUDE_QUERY_PARAM = 'exclude'
+
+
+def get_sparse_fieldset(request):
+    """Return the (fields, exclude) sets named by ?fields= / ?exclude= on read requests."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, None
+
+    def parse(param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return parse(FIELDS_QUERY_PARAM), parse(EXCLUDE_QUERY_PARAM)
+
+
+def _concrete_columns(model, prefix):
+    return {prefix + field.name for field in model._meta.concrete_fields}
+
+
+def serializer_columns(serializer, model, prefix=''):
+    """
+    Work out which columns and forward relations a serializer reads from `model`.
+
+    Returns (only, select_related) path sets, or None when some field needs the whole row
+    (a `source='*'` field or a model property without `Meta.column_dependencies`).
+    """
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'column_dependencies', {})
+    only, related = set(), set()
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if field.field_name in dependencies:
+            paths = [path.split('__') for path in dependencies[field.field_name]]
+        elif field.source == '*':
+            return None
+        else:
+            paths = [field.source_attrs]
+
+        for attrs in paths:
+            current, walked = model, []
+            for attr in attrs:
+                try:
+                    model_field = current._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    # A property: without declared dependencies it may read anything on this model.
+                    if not walked:
+                        return None
+                    only.update(_concrete_columns(current, prefix + '__'.join(walked) + '__'))
+                    break
+                if model_field.many_to_many or not model_field.concrete:
+                    break
+
+                walked.append(attr)
+                path = prefix + '__'.join(walked)
+                only.add(path)
+                if not model_field.is_relation:
+                    break
+                if len(walked) < len(attrs):
+                    related.add(path)
+                    current = model_field.related_model
+                elif isinstance(field, serializers.BaseSerializer):
+                    related.add(path)
+                    nested = serializer_columns(field, model_field.related_model, path + '__')
+                    if nested is None:
+                        only.update(_concrete_columns(model_field.related_model, path + '__'))
+                    else:
+                        only.update(nested[0])
+                        related.update(nested[1])
+    return only, related
+
+
+class SparseFieldsetQuerysetMixin:
+    """
+    Push the serializer's ?fields= / ?exclude= selection down into the queryset with
+    `.only()` and a matching `select_related()`, so unrequested columns are never fetched.
+    """
+
+    def get_queryset(self):
+        return self.restrict_queryset_columns(super().get_queryset())
+
+    def restrict_queryset_columns(self, queryset):
+        fields, exclude = get_sparse_fieldset(self.request)
+        if not fields and not exclude:
+            return queryset
+
+        columns = serializer_columns(self.get_serializer(), queryset.model)
+        if columns is None:
+            return queryset
+        only, related = columns
+
+        # Sort keys are read back from each row by cursor pagination.
+        ordering = [name for name in queryset.query.order_by if isinstance(name, str)]
+        ordering.append(self.request.query_params.get('ordering', ''))
+        for name in ordering:
+            try:
+                only.add(queryset.model._meta.get_field(name.lstrip('-')).name)
+            except FieldDoesNotExist:
+                pass
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only)
+
+
+class ConditionalRequestMixin:
+    """
+    ETag / Last-Modified validators for list and detail views, used by the `conditional` decorator.
+
+    A detail validator is built from the object's `updated_at` and those of the relations listed
+    in `conditional_related`, which are already loaded by select_related. A list validator is one
+    aggregate query: row count plus the newest `updated_at` of the rows and of each relation, plus
+    a count of each relation, so a relation cleared by SET_NULL also changes it.
+    GET/HEAD tags are "<version>-<representation>": the representation part hashes the path, query
+    string and Accept header, since they change the body. Writes compare only the version, so a
+    tag taken from any representation of the object satisfies If-Match. Views whose bodies
+    depend on the current date (ages, tenures) set `conditional_date_dependent`: today's date is
+    hashed into the representation and no Last-Modified is sent, since the body can change
+    without any row being edited.
+    """
+    conditional_related = ()
+    conditional_date_dependent = False
+
+    def get_object(self):
+        # Evaluated once per request: the validator and the handler share the instance.
+        if not hasattr(self, '_conditional_object'):
+            self._conditional_object = super().get_object()
+        return self._conditional_object
+
+    def is_detail_request(self):
+        return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+
+    def get_validators(self):
+        """Return (etag, last_modified timestamp or None) for the current request."""
+        if self.is_detail_request():
+            parts, stamps = self.object_validator_parts(self.get_object())
+        else:
+            parts, stamps = self.list_validator_parts()
+        version = hashlib.sha1(repr(parts).encode()).hexdigest()
+        if self.request.method in ('GET', 'HEAD'):
+            representation = [self.request.get_full_path(), self.request.META.get('HTTP_ACCEPT', '')]
+            if self.conditional_date_dependent:
+                representation.append(date.today())
+            etag = '"%s-%s"' % (version, hashlib.sha1(repr(representation).encode()).hexdigest()[:16])
+        else:
+            etag = self.write_etag(version)
+        if self.conditional_date_dependent:
+            stamps = []
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        return etag, int(max(stamps).timestamp()) if stamps else None
+
+    def write_etag(self, version):
+        """The If-Match tag whose version part is current, so the strong comparison passes; else the bare version."""
+        for etag in parse_etags(self.request.META.get('HTTP_IF_MATCH', '')):
+            if etag.strip('"').split('-')[0] == version:
+                return etag
+        return '"%s"' % version
+
+    def object_validator_parts(self, instance):
+        stamps = [instance.updated_at]
+        parts = [type(self).__name__, instance.pk]
+        for path in self.conditional_related:
+            related = instance
+            for attr in path.split('__'):
+                related = getattr(related, attr) if related is not None else None
+            stamps.append(related.updated_at if related is not None else None)
+            parts.append(related.pk if related is not None else None)
+        return parts + stamps, stamps
+
+    def list_validator_parts(self):
+        aggregates = {'count': models.Count('pk'), 'updated_at': models.Max('updated_at')}
+        for path in self.conditional_related:
+            aggregates[f'{path}__count'] = models.Count(path)
+            aggregates[f'{path}__updated_at'] = models.Max(f'{path}__updated_at')
+        values = self.filter_queryset(self.get_queryset()).order_by().aggregate(**aggregates)
+        stamps = [value for name, value in values.items() if name.endswith('updated_at')]
+        return [type(self).__name__, *values.values()], stamps
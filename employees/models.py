@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import NotSupportedError, models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
@@ -7,6 +8,7 @@ from .utils import (department_perm_choices, position_perm_choices,
                     employee_perm_choices, organization_perm_choices)
 from .import GENDER_CHOICES, STATUS_CHOICES, MARITAL_STATUS
 from accounts.models import User
+import re
 import secrets
 
 # Create your models here.
@@ -105,6 +107,50 @@ class PositionRole(models.Model):
         super(PositionRole, self).save(*args, **kwargs)
 
 
+class CalendarYearsBetween(models.Func):
+    """Whole years from `start` to `end`, a year counting once its anniversary is reached (calculate_age)."""
+    arity = 2
+    output_field = models.IntegerField()
+    sqlite_template = ("(CAST(strftime('%%Y', {end}) AS INTEGER) - CAST(strftime('%%Y', {start}) AS INTEGER)"
+                       " - (strftime('%%m-%%d', {end}) < strftime('%%m-%%d', {start})))")
+    postgresql_template = "EXTRACT(YEAR FROM AGE({end}, {start}))::integer"
+
+    def render(self, compiler, template):
+        # Each argument may appear several times; its params are repeated in order of appearance.
+        (start, start_params), (end, end_params) = (compiler.compile(e) for e in self.get_source_expressions())
+        params = []
+        for name in re.findall(r'\{(start|end)\}', template):
+            params.extend(start_params if name == 'start' else end_params)
+        return template.format(start=start, end=end), params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"{type(self).__name__} is not implemented for {connection.vendor}.")
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.render(compiler, self.sqlite_template)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.render(compiler, self.postgresql_template)
+
+
+class YearsOf365Days(CalendarYearsBetween):
+    """Days from `start` to `end` floor-divided by 365 (calculate_tenure)."""
+    # SQLite's integer division truncates towards zero; the comparison turns it into floor.
+    sqlite_template = ("(CAST(julianday({end}) - julianday({start}) AS INTEGER) / 365"
+                       " - (CAST(julianday({end}) - julianday({start}) AS INTEGER) %% 365 < 0))")
+    postgresql_template = "FLOOR(({end} - {start}) / 365.0)::integer"
+
+
+class EmployeeQuerySet(models.QuerySet):
+    def with_age_and_tenure(self, today=None):
+        """Annotate `age_years` and `tenure_years`, computed in SQL the way Employee.age and Employee.tenure are."""
+        today = models.Value(today or date.today(), output_field=models.DateField())
+        return self.annotate(
+            age_years=CalendarYearsBetween('date_of_birth', today),
+            tenure_years=YearsOf365Days('joining_date', Coalesce('leaving_date', today)),
+        )
+
+
 class Employee(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='employee_profile')
     position = models.ForeignKey(Position, on_delete=models.SET_NULL, null=True, related_name='employees')
@@ -133,21 +179,44 @@ class Employee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EmployeeQuerySet.as_manager()
+
+    class Meta:
+        # Composite indexes behind the EmployeeView filters (employees.filters.EMPLOYEE_FILTERS).
+        # SQLite appends the rowid to every index entry, so ORDER BY id is served from them too.
+        indexes = [
+            models.Index(fields=['status', 'joining_date'], name='employee_status_joined_idx'),
+            models.Index(fields=['position', 'status'], name='employee_position_status_idx'),
+            models.Index(fields=['is_active', 'is_on_leave', 'status'], name='employee_activity_idx'),
+            models.Index(fields=['country', 'status'], name='employee_country_status_idx'),
+            models.Index(fields=['gender', 'status'], name='employee_gender_status_idx'),
+            models.Index(fields=['joining_date'], name='employee_joined_idx'),
+            models.Index(fields=['leaving_date'], name='employee_left_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}"
 
     @property
     def age(self):
-        if self.date_of_birth:
-            today = date.today()
-            return today.year - self.date_of_birth.year - (
-                (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
-        return None
+        return calculate_age(self.date_of_birth)
 
     @property
     def tenure(self):
-        end_date = self.leaving_date if self.leaving_date else date.today()
-        return (end_date - self.joining_date).days // 365
+        return calculate_tenure(self.joining_date, self.leaving_date)
+
+
+def calculate_age(date_of_birth):
+    if date_of_birth:
+        today = date.today()
+        return today.year - date_of_birth.year - (
+            (today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+    return None
+
+
+def calculate_tenure(joining_date, leaving_date):
+    end_date = leaving_date if leaving_date else date.today()
+    return (end_date - joining_date).days // 365
 
 
 class EmployeePermission(models.Model):
@@ -244,9 +313,22 @@ class EmployeeInvitation(models.Model):
     expires_at = models.DateTimeField()
     last_sent_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='invitation_status_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"Invitation for {self.email} to {self.organization}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so a status transition can be counted on save.
+        if 'status' in field_names and 'organization_id' in field_names:
+            instance._loaded_counter_key = (instance.organization_id, instance.status)
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.token:
             self.token = secrets.token_urlsafe(50)
@@ -267,27 +349,76 @@ class EmployeeInvitation(models.Model):
         return timezone.now() > self.expires_at
 
 
-def setup_permissions():
-    try:
-        for i in department_perm_choices:
-            try:
-                obj, created = DepartmentPermission.objects.get_or_create(code=i[0], name=i[1])
-            except Exception as e:
-                print("Exception as", e)
-        for i in position_perm_choices:
-            try:
-                obj, created = PositionPermission.objects.get_or_create(code=i[0], name=i[1])
-            except Exception as e:
-                print("Exception as", e)
-        for i in employee_perm_choices:
-            try:
-                obj, created = EmployeePermission.objects.get_or_create(code=i[0], name=i[1])
-            except Exception as e:
-                print("Exception as", e)
-        for i in organization_perm_choices:
-            try:
-                obj, created = OrganizationPermission.objects.get_or_create(code=i[0], name=i[1])
-            except Exception as e:
-                print("Exception as", e)
-    except Exception as e:
-        print("exception in permission creation", e)
+class InvitationStatusCounter(models.Model):
+    """Number of invitations per organization and stored status, kept up to date from status transitions."""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='invitation_counters')
+    status = models.CharField(max_length=10, choices=EmployeeInvitation.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'status'], name='unique_organization_invitation_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id} {self.status}: {self.count}"
+
+
+class UserPermissionIndex(models.Model):
+    """Flattened (user, code) rows derived from the Department/Position/Employee/Organization roles."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='permission_index')
+    code = models.CharField(max_length=120)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'code'], name='unique_user_permission_code'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.code}"
+
+
+class Match(models.Lookup):
+    """`column MATCH query`, the full-text operator of SQLite FTS5 tables."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+class EmployeeSearchDocument(models.Model):
+    """
+    Read side of the FTS5 table kept by employees.search.SQLiteFTSBackend; the table is
+    created by the backend, not by migrations. `document` is FTS5's hidden column named
+    after the table, which matches across every indexed column.
+    """
+    employee = models.OneToOneField(Employee, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                    db_constraint=False, related_name='search_document')
+    document = models.TextField(db_column='employees_employee_search')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'employees_employee_search'
+
+
+EmployeeSearchDocument._meta.get_field('document').register_lookup(Match)
+
+
+def setup_permissions(using='default'):
+    """Create the permission rows listed in employees.utils that are missing. Returns how many were created."""
+    created = 0
+    for model, choices in (
+        (DepartmentPermission, department_perm_choices),
+        (PositionPermission, position_perm_choices),
+        (EmployeePermission, employee_perm_choices),
+        (OrganizationPermission, organization_perm_choices),
+    ):
+        existing = set(model.objects.using(using).values_list('code', flat=True))
+        missing = [model(code=code, name=name) for code, name in choices if code not in existing]
+        if missing:
+            model.objects.using(using).bulk_create(missing)
+            created += len(missing)
+    return created
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from accounts.models import User
+from .models import DepartmentRole, PositionRole, EmployeeRole, OrganizationRole, UserPermissionIndex
+
+ROLE_MODELS = (DepartmentRole, PositionRole, EmployeeRole, OrganizationRole)
+
+# user_id -> (perm_version, monotonic expiry), shared by the threads of this process.
+_version_map = OrderedDict()
+_version_lock = threading.Lock()
+
+
+def get_permission_cache():
+    return caches[getattr(settings, 'PERMISSION_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(user_id):
+    return f"employees:perms:{user_id}"
+
+
+def _role_permission_pairs(user_ids=None):
+    """Distinct (user_id, code) pairs granted by all four role types, as one UNION query."""
+    querysets = []
+    for model in ROLE_MODELS:
+        queryset = model.objects.filter(permission__isnull=False)
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        querysets.append(queryset.values_list('user_id', 'permission__code'))
+    return querysets[0].union(*querysets[1:])
+
+
+def compute_user_permission_codes(user_id):
+    """Resolve a user's permission codes straight from the role tables, bypassing the index."""
+    return frozenset(code for _, code in _role_permission_pairs([user_id]))
+
+
+def get_user_permission_codes(user):
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    cache = get_permission_cache()
+    key = _cache_key(user.pk)
+    codes = cache.get(key)
+    if codes is None:
+        codes = frozenset(UserPermissionIndex.objects.filter(user_id=user.pk).values_list('code', flat=True))
+        cache.set(key, codes, getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 300))
+    return codes
+
+
+def invalidate_user_permissions(*user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        get_permission_cache().delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def refresh_user_permissions(*user_ids):
+    """Bring the index rows of the given users in line with their roles and drop their cache entries."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    wanted = set(_role_permission_pairs(user_ids))
+    existing = defaultdict(set)
+    for pk, user_id, code in UserPermissionIndex.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'code'):
+        existing[(user_id, code)].add(pk)
+
+    stale = [pk for pair, pks in existing.items() if pair not in wanted for pk in pks]
+    missing = [UserPermissionIndex(user_id=user_id, code=code) for user_id, code in wanted if (user_id, code) not in existing]
+
+    with transaction.atomic():
+        if stale:
+            UserPermissionIndex.objects.filter(id__in=stale).delete()
+        if missing:
+            UserPermissionIndex.objects.bulk_create(missing, ignore_conflicts=True)
+        changed = {user_id for user_id, code in existing if (user_id, code) not in wanted}
+        changed.update(row.user_id for row in missing)
+        bump_permission_version(*changed)
+    invalidate_user_permissions(*user_ids)
+
+
+def rebuild_permission_index(batch_size=5000):
+    """
+    Recreate the whole index from the role tables and bump perm_version for every user whose
+    codes changed, so permission claims in their tokens are re-validated. Returns the number of
+    rows written.
+    """
+    total = 0
+    with transaction.atomic():
+        previous = set(UserPermissionIndex.objects.values_list('user_id', 'code').iterator(chunk_size=batch_size))
+        UserPermissionIndex.objects.all().delete()
+        current = set()
+        batch = []
+        for user_id, code in _role_permission_pairs().iterator(chunk_size=batch_size):
+            current.add((user_id, code))
+            batch.append(UserPermissionIndex(user_id=user_id, code=code))
+            if len(batch) >= batch_size:
+                UserPermissionIndex.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            UserPermissionIndex.objects.bulk_create(batch)
+            total += len(batch)
+        changed = list({user_id for user_id, _ in previous ^ current})
+        for start in range(0, len(changed), batch_size):
+            bump_permission_version(*changed[start:start + batch_size])
+    get_permission_cache().clear()
+    return total
+
+
+def backfill_permission_index():
+    """Build the index when it is empty, e.g. on the first migrate of an existing deployment."""
+    if UserPermissionIndex.objects.exists():
+        return 0
+    return rebuild_permission_index()
+
+
+def bump_permission_version(*user_ids):
+    """Invalidate permission claims already issued in access tokens for these users."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(perm_version=F('perm_version') + 1)
+    with _version_lock:
+        for user_id in user_ids:
+            _version_map.pop(user_id, None)
+
+
+def get_permission_version(user_id):
+    """The user's perm_version, re-read from the database at most every PERMISSION_VERSION_TTL seconds."""
+    now = time.monotonic()
+    with _version_lock:
+        entry = _version_map.get(user_id)
+        if entry and entry[1] > now:
+            _version_map.move_to_end(user_id)
+            return entry[0]
+
+    # A primary key lookup; a shared cache tier would outlive bumps made by other processes.
+    version = User.objects.filter(pk=user_id).values_list('perm_version', flat=True).first()
+    if version is None:
+        return None
+
+    with _version_lock:
+        _version_map[user_id] = (version, now + getattr(settings, 'PERMISSION_VERSION_TTL', 5))
+        _version_map.move_to_end(user_id)
+        while len(_version_map) > getattr(settings, 'PERMISSION_VERSION_MAP_SIZE', 10000):
+            _version_map.popitem(last=False)
+    return version
+
+
+def add_permission_claims(token, user):
+    """
+    Embed the user's permission codes and their perm_version into an access token. `user` must be
+    freshly loaded: the codes are read from the index after it, never from the permission cache,
+    so a change made since is caught by the version and stale codes are never sealed in.
+    """
+    token['perm_version'] = user.perm_version
+    token['perms'] = sorted(UserPermissionIndex.objects.filter(user_id=user.pk).values_list('code', flat=True))
+    return token
+
+
+def get_token_permission_codes(request):
+    """Permission codes carried by the request's access token, or None when they cannot be trusted."""
+    if not getattr(settings, 'PERMISSION_CLAIMS_IN_TOKEN', False):
+        return None
+    token = getattr(request, 'auth', None)
+    if token is None or not hasattr(token, 'get') or 'perms' not in token:
+        return None
+    if token.get('perm_version') != get_permission_version(request.user.pk):
+        return None
+    return frozenset(token['perms'])
@@ -0,0 +1,154 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from .permission_cache import get_user_permission_codes, get_token_permission_codes
+
+# Scopes whose cached lists embed a model's rows, keyed by what changed.
+DEPARTMENT_SCOPES = ('departments', 'positions')
+POSITION_SCOPES = ('positions',)
+LEAD_SCOPES = ('departments',)
+
+STORED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(scope):
+    return f"employees:response:generation:{scope}"
+
+
+def _stats_key(scope, outcome):
+    return f"employees:response:{outcome}:{scope}"
+
+
+def _seed_generation(cache, scope):
+    # A counter lost to eviction restarts from the clock, never from a value it already had,
+    # so entries stored under an earlier generation cannot be read again.
+    cache.add(_generation_key(scope), time.time_ns(), timeout=None)
+
+
+def get_generation(scope):
+    cache = get_response_cache()
+    generation = cache.get(_generation_key(scope))
+    if generation is None:
+        _seed_generation(cache, scope)
+        generation = cache.get(_generation_key(scope))
+    return generation
+
+
+def invalidate(*scopes):
+    """Move the scopes to a new generation; entries stored under the old one are never read again."""
+    cache = get_response_cache()
+    for scope in scopes:
+        try:
+            cache.incr(_generation_key(scope))
+        except ValueError:
+            _seed_generation(cache, scope)
+
+
+def _lead_ids_key():
+    return "employees:response:lead_ids"
+
+
+def cached_lead_ids():
+    """Ids of the users shown as a department lead, or None when not cached."""
+    return get_response_cache().get(_lead_ids_key())
+
+
+def prime_lead_ids():
+    """Cache the lead ids, so saving a user can tell whether cached department lists show them."""
+    from .models import Department
+
+    if cached_lead_ids() is None:
+        lead_ids = frozenset(Department.objects.filter(lead__isnull=False).values_list('lead_id', flat=True))
+        get_response_cache().set(_lead_ids_key(), lead_ids, timeout=None)
+
+
+def forget_lead_ids():
+    get_response_cache().delete(_lead_ids_key())
+
+
+def _count(scope, outcome):
+    cache = get_response_cache()
+    try:
+        cache.incr(_stats_key(scope, outcome))
+    except ValueError:
+        if not cache.add(_stats_key(scope, outcome), 1, timeout=None):
+            cache.incr(_stats_key(scope, outcome))
+
+
+def get_stats(scopes):
+    """Hit/miss counts per scope; approximate on backends whose incr is not atomic, such as the file cache."""
+    cache = get_response_cache()
+    stats = {}
+    for scope in scopes:
+        hits = cache.get(_stats_key(scope, 'hits'), 0)
+        misses = cache.get(_stats_key(scope, 'misses'), 0)
+        stats[scope] = {'hits': hits, 'misses': misses,
+                        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+    return stats
+
+
+def _entry_key(scope, request):
+    granted = get_token_permission_codes(request)
+    if granted is None:
+        granted = get_user_permission_codes(request.user)
+    parts = [
+        request.path,
+        sorted(request.query_params.lists()),
+        request.META.get('HTTP_ACCEPT', ''),
+        sorted(granted),
+    ]
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f"employees:response:{scope}:{get_generation(scope)}:{digest}"
+
+
+def cached_response(func):
+    """
+    Serve list GETs from the response cache, keyed by path, query parameters, Accept header and
+    the caller's permission codes. Detail requests pass through. The view names its
+    `response_cache_scope`; signals invalidate a scope when the rows it shows change.
+    Place it between `permission_required` and `conditional`.
+    """
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        if self.is_detail_request():
+            return func(self, request, *args, **kwargs)
+
+        scope = self.response_cache_scope
+        cache = get_response_cache()
+        key = _entry_key(scope, request)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(scope, 'hits')
+            headers = entry['headers']
+            last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+            response = get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified)
+            if response is None:
+                response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(scope, 'misses')
+        response = func(self, request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            def store(rendered):
+                cache.set(key, {
+                    'status': rendered.status_code,
+                    'content': rendered.content,
+                    'content_type': rendered['Content-Type'],
+                    'headers': {name: rendered[name] for name in STORED_HEADERS if rendered.has_header(name)},
+                }, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            response.add_post_render_callback(store)
+        return response
+    return wrapper
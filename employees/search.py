@@ -0,0 +1,141 @@
+import operator
+import re
+from functools import lru_cache, reduce
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from accounts.models import User
+from .models import Employee, EmployeeSearchDocument
+
+# Indexed column -> Employee lookup it is filled from
+SEARCH_COLUMNS = {
+    'first_name': 'user__first_name',
+    'last_name': 'user__last_name',
+    'email': 'user__email',
+    'city': 'city',
+    'country': 'country',
+    'nationality': 'nationality',
+    'position_title': 'position__title',
+    'department_name': 'position__department__name',
+}
+# bm25 weight per column, in SEARCH_COLUMNS order: names first, then email, then position/department.
+COLUMN_WEIGHTS = (10.0, 10.0, 5.0, 1.0, 1.0, 1.0, 3.0, 3.0)
+
+# Fields whose change must reach the index, per model.
+EMPLOYEE_FIELDS = frozenset({'user', 'user_id', 'position', 'position_id', 'city', 'country', 'nationality'})
+USER_FIELDS = frozenset(User.IDENTITY_FIELDS)
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+class DatabaseSearchBackend:
+    """
+    Fallback that keeps no index: every term must occur in one of SEARCH_COLUMNS. This is a
+    LIKE scan per term, acceptable for small tables or databases without a full-text backend.
+    Results keep the queryset's ordering.
+    """
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def install(self):
+        pass
+
+    def index(self, queryset):
+        pass
+
+    def remove(self, employee_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def backfill(self):
+        """Fill an index that is empty while employees exist; returns how many employees were indexed."""
+        return 0
+
+    def search(self, queryset, query):
+        """Filter by `query`; one without any word characters filters nothing."""
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(reduce(operator.or_, (Q(**{f"{lookup}__icontains": term})
+                                                             for lookup in SEARCH_COLUMNS.values())))
+        return queryset
+
+
+class SQLiteFTSBackend(DatabaseSearchBackend):
+    """
+    SQLite FTS5 index with one row per employee (rowid = employee id).
+
+    Rows are written with INSERT OR REPLACE ... SELECT straight from the employee tables, so
+    reindexing any set of employees is a single statement. Each search term becomes a prefix
+    query and terms are ANDed; results are ordered by bm25 rank with COLUMN_WEIGHTS.
+    """
+    table = EmployeeSearchDocument._meta.db_table
+
+    @classmethod
+    def is_available(cls):
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            return bool(cursor.fetchone()[0])
+
+    def install(self):
+        columns = ', '.join(SEARCH_COLUMNS)
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                           f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+            cursor.execute(f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', 'bm25({weights})')")
+
+    def index(self, queryset):
+        rows = queryset.order_by().values_list('id', *SEARCH_COLUMNS.values())
+        sql, params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT OR REPLACE INTO {self.table}(rowid, {', '.join(SEARCH_COLUMNS)}) {sql}", params)
+
+    def remove(self, employee_ids):
+        employee_ids = list(employee_ids)
+        if employee_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(employee_ids))})",
+                               employee_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        self.index(Employee.objects.all())
+        return EmployeeSearchDocument.objects.count()
+
+    def backfill(self):
+        if EmployeeSearchDocument.objects.exists() or not Employee.objects.exists():
+            return 0
+        return self.rebuild()
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(search_document__document__match=expression) \
+            .order_by('search_document__rank', '-id')
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    backend_class = import_string(path)
+    if not backend_class.is_available():
+        backend_class = DatabaseSearchBackend
+    return backend_class()
+
+
+def get_search_backend():
+    """The EMPLOYEE_SEARCH_BACKEND instance, or the LIKE fallback when it cannot run on this database."""
+    return _load_backend(getattr(settings, 'EMPLOYEE_SEARCH_BACKEND', 'employees.search.SQLiteFTSBackend'))
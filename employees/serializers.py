@@ -1,10 +1,53 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Department, Position, Employee, Organization, EmployeeInvitation
+from rest_framework.fields import ISO_8601
+from rest_framework.settings import api_settings
+from .models import (Department, Position, Employee, Organization, EmployeeInvitation,
+                     calculate_age, calculate_tenure)
 from accounts.serializers import UserSerializer, UserProfileSerializer
 from accounts.models import User
+from .mixins import FIELDS_QUERY_PARAM, EXCLUDE_QUERY_PARAM, get_sparse_fieldset
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Keep only the fields picked by the request's ?fields= / ?exclude= parameters; unknown names are a 400."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if root is not None:
+            return fields
+
+        requested, excluded = get_sparse_fieldset(self.context.get('request'))
+        errors = {
+            param: f"Unknown field(s): {', '.join(sorted(names - fields.keys()))}."
+            for param, names in ((FIELDS_QUERY_PARAM, requested), (EXCLUDE_QUERY_PARAM, excluded))
+            if names and names - fields.keys()
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        if excluded:
+            fields = {name: field for name, field in fields.items() if name not in excluded}
+        return fields
+
+
+class AnnotatedIntegerField(serializers.IntegerField):
+    """Read-only integer taken from a queryset annotation when the instance carries it, else from `source`."""
+
+    def __init__(self, annotation, **kwargs):
+        self.annotation = annotation
+        super().__init__(read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        try:
+            return instance.__dict__[self.annotation]
+        except KeyError:
+            return super().get_attribute(instance)
+
+
+class DepartmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     lead = UserSerializer(read_only=True)
     lead_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -20,7 +63,7 @@ class DepartmentSerializer(serializers.ModelSerializer):
         read_only_fields = ['lead', 'created_at', 'updated_at']
 
 
-class PositionSerializer(serializers.ModelSerializer):
+class PositionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     department_name = serializers.CharField(source='department.name', read_only=True)
 
     class Meta:
@@ -29,12 +72,12 @@ class PositionSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(required=False)
     position_title = serializers.CharField(source='position.title', read_only=True)
     department_name = serializers.CharField(source='position.department.name', read_only=True)
-    age = serializers.IntegerField(read_only=True)
-    tenure = serializers.IntegerField(read_only=True)
+    age = AnnotatedIntegerField('age_years')
+    tenure = AnnotatedIntegerField('tenure_years')
     added_by = serializers.CharField(source='added_by.full_name', read_only=True)
 
     class Meta:
@@ -45,6 +88,11 @@ class EmployeeSerializer(serializers.ModelSerializer):
                 'emergency_contact_number', 'emergency_contact_relation', 'bank_name','age','tenure',
                 'bank_account_number', 'is_active', 'is_on_leave', 'created_at', 'updated_at']
         read_only_fields = ['added_by', 'created_at', 'updated_at']
+        column_dependencies = {
+            'age': ['date_of_birth'],
+            'tenure': ['joining_date', 'leaving_date'],
+            'added_by': ['added_by__first_name', 'added_by__last_name'],
+        }
 
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', None)
@@ -57,10 +105,140 @@ class EmployeeSerializer(serializers.ModelSerializer):
             )
             user_serializer.is_valid(raise_exception=True)
             user_serializer.save()
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        # Age and tenure annotations were computed before the update.
+        for field in self.fields.values():
+            if isinstance(field, AnnotatedIntegerField):
+                instance.__dict__.pop(field.annotation, None)
+        return instance
+
+
+class EmployeeImportRowSerializer(serializers.ModelSerializer):
+    """Scalar employee columns accepted by the bulk import; user and position are resolved in bulk."""
+
+    class Meta:
+        model = Employee
+        fields = ['status', 'date_of_birth', 'gender', 'marital_status', 'nationality', 'address', 'city', 'state',
+                  'country', 'postal_code', 'joining_date', 'leaving_date', 'personal_email', 'personal_phone',
+                  'emergency_contact_name', 'emergency_contact_number', 'emergency_contact_relation',
+                  'bank_name', 'bank_account_number', 'is_active', 'is_on_leave']
+
+
+def _full_name(first_name, last_name):
+    return first_name + " " + last_name
+
+
+class FastEmployeeListSerializer:
+    """
+    Read-only fast path for large employee lists.
+
+    Builds the same representation as EmployeeSerializer from `.values()` rows. The field
+    getters are compiled once from the serializer's (possibly sparse) fields, so listing skips
+    model instantiation and DRF's per-field dispatch. Pass the queryset's `annotations` to read
+    AnnotatedIntegerField values from the row instead of recomputing them.
+    """
+    # (serializer class, field name) -> (columns relative to the serializer's model, function)
+    computed_fields = {
+        (UserSerializer, 'full_name'): (('first_name', 'last_name'), _full_name),
+        (EmployeeSerializer, 'age'): (('date_of_birth',), calculate_age),
+        (EmployeeSerializer, 'tenure'): (('joining_date', 'leaving_date'), calculate_tenure),
+        (EmployeeSerializer, 'added_by'): (('added_by__first_name', 'added_by__last_name'), _full_name),
+    }
 
+    def __init__(self, serializer, annotations=()):
+        self.request = serializer.context.get('request')
+        self.annotations = annotations
+        self.columns = {'id'}
+        self.getters = self.compile(serializer, serializer.Meta.model, '')
 
-class OrganizationSerializer(serializers.ModelSerializer):
+    def get_queryset(self, queryset):
+        ordering = self.request.query_params.get('ordering', '').lstrip('-') if self.request else ''
+        if ordering and '__' not in ordering:
+            self.columns.add(ordering)
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        return self.build(self.getters, row)
+
+    @staticmethod
+    def build(getters, row):
+        ret = {}
+        for name, getter, guards in getters:
+            if guards and any(row[column] is None for column in guards):
+                continue
+            ret[name] = getter(row)
+        return ret
+
+    def compile(self, serializer, model, prefix):
+        getters = []
+        for field in serializer._readable_fields:
+            column = prefix + '__'.join(field.source_attrs)
+            # A dotted source on a null relation makes DRF skip the field entirely.
+            guards = tuple(prefix + '__'.join(field.source_attrs[:n]) for n in range(1, len(field.source_attrs)))
+            self.columns.update(guards)
+
+            computed = self.computed_fields.get((type(serializer), field.field_name))
+            if isinstance(field, AnnotatedIntegerField) and not prefix and field.annotation in self.annotations:
+                self.columns.add(field.annotation)
+                getters.append((field.field_name, self.compile_value(field, model, field.annotation), guards))
+            elif computed is not None:
+                getters.append((field.field_name, self.compile_computed(prefix, *computed), guards))
+            elif isinstance(field, serializers.BaseSerializer):
+                related_model = model._meta.get_field(field.source).related_model
+                nested = self.compile(field, related_model, column + '__')
+                self.columns.add(column)
+                getters.append((field.field_name, self.compile_nested(column, nested), guards))
+            else:
+                self.columns.add(column)
+                getters.append((field.field_name, self.compile_value(field, model, column), guards))
+        return getters
+
+    def compile_computed(self, prefix, columns, function):
+        columns = tuple(prefix + column for column in columns)
+        self.columns.update(columns)
+        return lambda row: function(*[row[column] for column in columns])
+
+    def compile_nested(self, column, nested):
+        build = self.build
+        return lambda row: None if row[column] is None else build(nested, row)
+
+    def compile_value(self, field, model, column):
+        if isinstance(field, serializers.DateTimeField) and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601:
+            field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+            def datetime_value(row):
+                value = row[column]
+                if not value:
+                    return None
+                if field_timezone is None or not timezone.is_aware(value):
+                    return field.to_representation(value)
+                value = value.astimezone(field_timezone).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return datetime_value
+
+        if isinstance(field, serializers.DateField) and getattr(field, 'format', api_settings.DATE_FORMAT).lower() == ISO_8601:
+            return lambda row: row[column].isoformat() if row[column] else None
+
+        if isinstance(field, serializers.FileField) and getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            storage = model._meta.get_field(field.source).storage
+            request = self.request
+
+            def file_value(row):
+                if not row[column]:
+                    return None
+                url = storage.url(row[column])
+                return request.build_absolute_uri(url) if request is not None else url
+            return file_value
+
+        if isinstance(field, (serializers.CharField, serializers.BooleanField, serializers.IntegerField,
+                              serializers.ChoiceField, serializers.PrimaryKeyRelatedField)):
+            return lambda row: row[column]
+
+        to_representation = field.to_representation
+        return lambda row: None if row[column] is None else to_representation(row[column])
+
+
+class OrganizationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     admin_detail = serializers.SerializerMethodField(read_only=True)
     employees_detail = serializers.SerializerMethodField(read_only=True)
     admin_id = serializers.PrimaryKeyRelatedField(
@@ -87,6 +265,17 @@ class OrganizationSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'admin', 'employees']
+        column_dependencies = {
+            'admin_detail': ['admin__first_name', 'admin__last_name', 'admin__email'],
+            'employees_detail': [],
+        }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('include_employees', True):
+            fields.pop('employees', None)
+            fields.pop('employees_detail', None)
+        return fields
 
     def get_admin_detail(self, obj):
         if obj.admin:
@@ -108,7 +297,7 @@ class OrganizationSerializer(serializers.ModelSerializer):
         } for emp in obj.employees.all()]
 
 
-class EmployeeInvitationSerializer(serializers.ModelSerializer):
+class EmployeeInvitationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     position_title = serializers.CharField(source='position.title', read_only=True)
     department_name = serializers.CharField(source='position.department.name', read_only=True)
@@ -119,6 +308,13 @@ class EmployeeInvitationSerializer(serializers.ModelSerializer):
         read_only_fields = ['token', 'invited_by', 'is_accepted', 'created_at', 'expires_at', 'last_sent_at']
 
 
+class BulkInvitationSerializer(serializers.Serializer):
+    # Emails are checked one by one so a bad address is reported instead of failing the request.
+    emails = serializers.ListField(child=serializers.CharField(trim_whitespace=True), allow_empty=False, max_length=1000)
+    organization = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all())
+    position = serializers.PrimaryKeyRelatedField(queryset=Position.objects.all(), required=False, allow_null=True)
+
+
 class EmployeeInvitationAcceptSerializer(serializers.Serializer):
     token = serializers.CharField()
     first_name = serializers.CharField(required=False)
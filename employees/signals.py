@@ -0,0 +1,197 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from accounts.models import User
+from .invitation_status import counters_enabled, adjust_invitation_counters, rebuild_organization_counters
+from .models import Department, Position, Employee, Organization, EmployeeInvitation
+from .response_cache import (DEPARTMENT_SCOPES, POSITION_SCOPES, LEAD_SCOPES, invalidate,
+                             cached_lead_ids, forget_lead_ids)
+from accounts.serializers import UserSerializer
+from .permission_cache import ROLE_MODELS, refresh_user_permissions, invalidate_user_permissions
+from .search import EMPLOYEE_FIELDS, USER_FIELDS, get_search_backend
+
+
+PERMISSION_ROLE_MODELS = {
+    role_model.permission.field.related_model: role_model for role_model in ROLE_MODELS
+}
+
+
+def role_permission_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_user_permissions(instance.user_id)
+        return
+    # Reverse side: `instance` is a permission and `model` is the role class. The
+    # roles losing it are only known before a clear, so they are collected early.
+    if action == 'pre_clear':
+        instance._affected_user_ids = list(model.objects.filter(permission=instance).values_list('user_id', flat=True))
+    elif action == 'post_clear':
+        refresh_user_permissions(*getattr(instance, '_affected_user_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        refresh_user_permissions(*model.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+
+
+def role_pre_save(sender, instance, **kwargs):
+    # A role moved to another user must also refresh the previous owner.
+    instance._previous_user_id = None
+    if instance.pk:
+        instance._previous_user_id = sender.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+
+
+def role_changed(sender, instance, **kwargs):
+    refresh_user_permissions(instance.user_id, getattr(instance, '_previous_user_id', None))
+
+
+def role_deleted(sender, instance, origin=None, **kwargs):
+    # Roles removed by deleting their user go away together with the user's index rows.
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        invalidate_user_permissions(instance.user_id)
+        return
+    refresh_user_permissions(instance.user_id)
+
+
+def permission_pre_delete(sender, instance, **kwargs):
+    role_model = PERMISSION_ROLE_MODELS[sender]
+    instance._affected_user_ids = list(role_model.objects.filter(permission=instance).values_list('user_id', flat=True))
+
+
+def permission_changed(sender, instance, **kwargs):
+    if hasattr(instance, '_affected_user_ids'):
+        user_ids = instance._affected_user_ids
+    else:
+        user_ids = PERMISSION_ROLE_MODELS[sender].objects.filter(permission=instance).values_list('user_id', flat=True)
+    refresh_user_permissions(*user_ids)
+
+
+for permission_model, role_model in PERMISSION_ROLE_MODELS.items():
+    uid = role_model.__name__
+
+    m2m_changed.connect(role_permission_changed, sender=role_model.permission.through,
+                        dispatch_uid=f'{uid}_permission_changed')
+    pre_save.connect(role_pre_save, sender=role_model, dispatch_uid=f'{uid}_pre_save')
+    post_save.connect(role_changed, sender=role_model, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(role_deleted, sender=role_model, dispatch_uid=f'{uid}_post_delete')
+    post_save.connect(permission_changed, sender=permission_model, dispatch_uid=f'{uid}_permission_post_save')
+    pre_delete.connect(permission_pre_delete, sender=permission_model, dispatch_uid=f'{uid}_permission_pre_delete')
+    post_delete.connect(permission_changed, sender=permission_model, dispatch_uid=f'{uid}_permission_post_delete')
+
+
+def invitation_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not counters_enabled():
+        return
+    # EmployeeInvitation.from_db records the (organization, status) an instance was loaded with.
+    previous = getattr(instance, '_loaded_counter_key', None)
+    current = (instance.organization_id, instance.status)
+    if created:
+        adjust_invitation_counters({current: 1})
+    elif previous is None:
+        rebuild_organization_counters(instance.organization_id)
+    elif previous != current:
+        adjust_invitation_counters({previous: -1, current: 1})
+    instance._loaded_counter_key = current
+
+
+def invitation_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the organization takes its counter rows with it.
+    if isinstance(origin, Organization) and origin.pk == instance.organization_id:
+        return
+    # purge_invitations adjusts the counters for its whole batch itself.
+    if getattr(origin, 'counters_adjusted_by_caller', False):
+        return
+    if counters_enabled():
+        adjust_invitation_counters({(instance.organization_id, instance.status): -1})
+
+
+post_save.connect(invitation_saved, sender=EmployeeInvitation, dispatch_uid='invitation_counter_post_save')
+post_delete.connect(invitation_deleted, sender=EmployeeInvitation, dispatch_uid='invitation_counter_post_delete')
+
+
+def department_changed(sender, **kwargs):
+    forget_lead_ids()
+    invalidate(*DEPARTMENT_SCOPES)
+
+
+def position_changed(sender, **kwargs):
+    invalidate(*POSITION_SCOPES)
+
+
+# Department lists embed the lead through UserSerializer; saves touching none of its fields,
+# such as the last_login update on every login, leave them valid.
+LEAD_FIELDS = frozenset(UserSerializer.Meta.fields)
+
+
+def is_lead(user_id):
+    # Without the cached ids (primed by the department list) assume the worst rather than query.
+    lead_ids = cached_lead_ids()
+    return lead_ids is None or user_id in lead_ids
+
+
+def lead_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and LEAD_FIELDS.isdisjoint(update_fields)):
+        return
+    if is_lead(instance.pk):
+        invalidate(*LEAD_SCOPES)
+
+
+def lead_deleted(sender, instance, **kwargs):
+    # SET_NULL has already cleared the lead column, without a Department signal.
+    if is_lead(instance.pk):
+        forget_lead_ids()
+        invalidate(*LEAD_SCOPES)
+
+
+post_save.connect(department_changed, sender=Department, dispatch_uid='department_response_cache_post_save')
+post_delete.connect(department_changed, sender=Department, dispatch_uid='department_response_cache_post_delete')
+post_save.connect(position_changed, sender=Position, dispatch_uid='position_response_cache_post_save')
+post_delete.connect(position_changed, sender=Position, dispatch_uid='position_response_cache_post_delete')
+post_save.connect(lead_saved, sender=User, dispatch_uid='lead_response_cache_post_save')
+post_delete.connect(lead_deleted, sender=User, dispatch_uid='lead_response_cache_post_delete')
+
+
+def employee_indexed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and EMPLOYEE_FIELDS.isdisjoint(update_fields)):
+        return
+    get_search_backend().index(Employee.objects.filter(pk=instance.pk))
+
+
+def employee_unindexed(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+def user_indexed(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and USER_FIELDS.isdisjoint(update_fields)):
+        return
+    # A new user has no employee profile yet; User.from_db records the name and email as loaded.
+    identity = instance.identity()
+    if not created and getattr(instance, '_loaded_identity', None) != identity:
+        get_search_backend().index(Employee.objects.filter(user_id=instance.pk))
+    instance._loaded_identity = identity
+
+
+def position_indexed(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        get_search_backend().index(Employee.objects.filter(position_id=instance.pk))
+
+
+def position_pre_delete(sender, instance, **kwargs):
+    # SET_NULL clears the employees' position without a signal; remember who to reindex.
+    instance._search_employee_ids = list(Employee.objects.filter(position_id=instance.pk).values_list('id', flat=True))
+
+
+def position_unindexed(sender, instance, **kwargs):
+    employee_ids = getattr(instance, '_search_employee_ids', None)
+    if employee_ids:
+        get_search_backend().index(Employee.objects.filter(pk__in=employee_ids))
+
+
+def department_indexed(sender, instance, created=False, raw=False, **kwargs):
+    # Deleting a department cascades to its positions, which reindex their employees.
+    if not (raw or created):
+        get_search_backend().index(Employee.objects.filter(position__department_id=instance.pk))
+
+
+post_save.connect(employee_indexed, sender=Employee, dispatch_uid='employee_search_post_save')
+post_delete.connect(employee_unindexed, sender=Employee, dispatch_uid='employee_search_post_delete')
+post_save.connect(user_indexed, sender=User, dispatch_uid='user_search_post_save')
+post_save.connect(position_indexed, sender=Position, dispatch_uid='position_search_post_save')
+pre_delete.connect(position_pre_delete, sender=Position, dispatch_uid='position_search_pre_delete')
+post_delete.connect(position_unindexed, sender=Position, dispatch_uid='position_search_post_delete')
+post_save.connect(department_indexed, sender=Department, dispatch_uid='department_search_post_save')
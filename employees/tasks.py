@@ -1,42 +1,67 @@
 from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+from accounts.outbox import enqueue_messages
+from .emails import InvitationEmailRenderer
+from .invitation_status import expire_overdue_invitations, purge_invitations, sweep_batch_size
 
+SWEEPER_TASK_NAME = 'Expire and purge employee invitations'
 
+
+def _invitations(invitation_ids):
+    from .models import EmployeeInvitation
+
+    return EmployeeInvitation.objects.select_related(
+        'organization', 'position', 'invited_by'
+    ).filter(id__in=invitation_ids).order_by('id')
+
+
+def queue_invitation_emails(invitations, is_resend=False):
+    """Write the invitation emails to the outbox, in the caller's transaction."""
+    return enqueue_messages(InvitationEmailRenderer(is_resend).messages(invitations))
+
+
+# The views queue invitation emails directly now; these tasks stay for messages already on the broker.
 @shared_task
 def send_invitation_email_task(invitation_id, is_resend=False):
-    from .models import EmployeeInvitation
+    queue_invitation_emails(_invitations([invitation_id]), is_resend)
 
-    try:
-        invitation = EmployeeInvitation.objects.select_related(
-            'organization', 'position', 'invited_by'
-        ).get(id=invitation_id)
-    except EmployeeInvitation.DoesNotExist:
-        return
-
-    context = {
-        'organization': invitation.organization.name,
-        'position': invitation.position.title if invitation.position else 'N/A',
-        'invited_by': invitation.invited_by.full_name,
-        'acceptance_url': f"{settings.FRONTEND_URL}/accept-invitation?token={invitation.token}",
-        'expires_at': invitation.expires_at.strftime("%B %d, %Y"),
-    }
-
-    if is_resend:
-        subject = f"Join {context['organization']} - Invitation Reminder"
-        template = 'emails/resendinvite.html'
-    else:
-        subject = f"Invitation to join {context['organization']}"
-        template = 'emails/invitation.html'
-
-    html_message = render_to_string(template, context)
-
-    send_mail(
-        subject=subject,
-        message='This is an HTML email. Please use an HTML-compatible mail client.',
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[invitation.email],
-        html_message=html_message,
-        fail_silently=False
+
+@shared_task
+def send_invitation_emails_task(invitation_ids, is_resend=False):
+    return len(queue_invitation_emails(_invitations(invitation_ids), is_resend))
+
+
+@shared_task(bind=True)
+def expire_invitations_task(self, max_batches=50):
+    """
+    Expire overdue pending invitations, then purge old declined and expired ones, batch by batch.
+    A run that hits `max_batches` for either step queues another run straight away.
+    """
+    now = timezone.now()
+    batch_size = sweep_batch_size()
+    done = {}
+    for name, step in (('expired', expire_overdue_invitations), ('purged', purge_invitations)):
+        done[name] = 0
+        for _ in range(max_batches):
+            changed = step(now, batch_size)
+            done[name] += changed
+            if changed < batch_size:
+                break
+        else:
+            self.apply_async((max_batches,))
+            break
+    return done
+
+
+def schedule_periodic_tasks():
+    """Create or update the entries read by django_celery_beat's DatabaseScheduler."""
+    from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+    interval, _ = IntervalSchedule.objects.get_or_create(
+        every=getattr(settings, 'INVITATION_SWEEP_INTERVAL', 15), period=IntervalSchedule.MINUTES,
+    )
+    # `enabled` is left alone so the task can be switched off from the admin.
+    PeriodicTask.objects.update_or_create(
+        name=SWEEPER_TASK_NAME, defaults={'task': expire_invitations_task.name, 'interval': interval},
     )
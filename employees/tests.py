@@ -1,3 +1,1321 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import tempfile
+import time
+from datetime import date, timedelta
+from itertools import count
+from celery import current_app
+from unittest.mock import patch
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User, EmailOutbox
+from conf.pagination import LegacyOffsetPagination
+from conf.testing import QueryBudgetMixin, sql_shape
+from .apps import install_search_index, sync_permissions
+from .checks import check_permission_cache
+from .emails import InvitationEmailRenderer, invitation_context
+from .invitation_status import (invitation_status_counts, counted_status_counts, rebuild_invitation_counters,
+                                expire_overdue_invitations, overdue_q, purge_invitations)
+from .permission_cache import (_version_map, backfill_permission_index, rebuild_permission_index,
+                               get_permission_cache, get_user_permission_codes, refresh_user_permissions)
+from .response_cache import get_response_cache, invalidate
+from .search import get_search_backend
+from .tasks import SWEEPER_TASK_NAME, expire_invitations_task
+from .serializers import FastEmployeeListSerializer
+from .models import (Department, Position, Employee, Organization, EmployeeInvitation, InvitationStatusCounter,
+                     DepartmentRole, PositionRole, EmployeeRole, OrganizationRole, UserPermissionIndex,
+                     EmployeePermission, setup_permissions)
+from .utils import (department_perm_choices, position_perm_choices,
+                    employee_perm_choices, organization_perm_choices)
 
-# Create your tests here.
+
+def grant(user, role_model, *codes):
+    permission_model = role_model.permission.field.related_model
+    role = role_model.objects.create(user=user, name='test role')
+    role.permission.add(*permission_model.objects.filter(code__in=codes))
+    return role
+
+
+def make_user(email, first_name='Test', last_name='User'):
+    user = User.objects.create_user(email, 'password')
+    user.first_name, user.last_name = first_name, last_name
+    user.save()
+    return user
+
+
+def seed_company(scale, prefix, added_by):
+    """Departments with leads, positions, employees, organizations and invitations; grows linearly with scale."""
+    for d in range(scale):
+        lead = make_user(f'{prefix}-lead{d}@example.com', 'Lead', str(d))
+        department = Department.objects.create(name=f'{prefix} department {d}', lead=lead)
+        organization = Organization.objects.create(name=f'{prefix} organization {d}', admin=lead)
+        for p in range(scale):
+            position = Position.objects.create(title=f'{prefix} position {p}', department=department,
+                                               salary_range_min=1000, salary_range_max=2000)
+            for e in range(scale):
+                user = make_user(f'{prefix}-{d}-{p}-{e}@example.com', 'Seed', str(e))
+                employee = Employee.objects.create(user=user, position=position, added_by=added_by,
+                                                   joining_date=date(2020, 1, 1), date_of_birth=date(1990, 1, 1))
+                organization.employees.add(employee)
+            EmployeeInvitation.objects.create(email=f'{prefix}-invite{d}-{p}@example.com', organization=organization,
+                                              invited_by=added_by, position=position)
+
+
+def streamed(response):
+    """Drain a streaming response so the queries it runs while iterating are counted."""
+    response.body = b''.join(response.streaming_content)
+    return response
+
+
+class EmployeeDirectoryTestCase(TestCase):
+    """A handful of employees covering null positions, adders, birth dates and leaving dates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'password')
+        User.objects.filter(pk=cls.admin.pk).update(first_name='Ada', last_name='Admin')
+        grant(cls.admin, EmployeeRole, 'view_employee')
+
+        department = Department.objects.create(name='Engineering')
+        position = Position.objects.create(title='Engineer', department=department,
+                                           salary_range_min=1000, salary_range_max=2000)
+        for n, (has_position, has_adder, dob, leaving) in enumerate([
+            (True, True, date(1990, 2, 28), None),
+            (False, False, None, None),
+            (True, False, date(2000, 12, 31), date(2024, 6, 1)),
+            (False, True, date(1985, 7, 4), date(2010, 1, 1)),
+        ]):
+            user = User.objects.create_user(f'employee{n}@example.com', 'password')
+            user.first_name, user.last_name, user.phone = f'First{n}', f'Last{n}', f'555{n}'
+            user.profile_pic = f'profile_pics/{n}.png' if n % 2 else ''
+            user.save()
+            Employee.objects.create(
+                user=user, position=position if has_position else None,
+                added_by=cls.admin if has_adder else None, date_of_birth=dob,
+                joining_date=date(2015, 3, n + 1), leaving_date=leaving,
+                city='Lahore', nationality='PK', marital_status='S', status='ACTIVE',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+class FastEmployeeListTests(EmployeeDirectoryTestCase):
+    def assertSameBytes(self, query=''):
+        separator = '&' if query else ''
+        regular = self.client.get(f'/employees/employees/?{query}')
+        fast = self.client.get(f'/employees/employees/?{query}{separator}fast=1')
+        self.assertEqual(regular.status_code, 200)
+        # Pagination links echo the query string, fast=1 included.
+        self.assertEqual(regular.content, fast.content.replace(b'fast=1&', b''))
+
+    def test_full_list_is_byte_identical(self):
+        self.assertSameBytes()
+
+    def test_sparse_fieldsets_are_byte_identical(self):
+        self.assertSameBytes('fields=id,added_by,position_title,department_name,age')
+        self.assertSameBytes('exclude=user,tenure')
+
+    def test_paginated_pages_are_byte_identical(self):
+        self.assertSameBytes('pagination=cursor&page_size=3')
+        self.assertSameBytes('pagination=offset&limit=2&offset=1&count=exact')
+
+    @override_settings(TIME_ZONE='Asia/Karachi')
+    def test_local_timezone_is_byte_identical(self):
+        self.assertSameBytes()
+
+
+class SparseFieldsetTests(EmployeeDirectoryTestCase):
+    def list_statement(self, query):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(f'/employees/employees/?{query}').status_code, 200)
+        # The conditional request validators aggregate over the same tables; the rows come from the other one.
+        shapes = [sql_shape(query['sql']) for query in context.captured_queries if 'COUNT(' not in query['sql']]
+        [statement] = [shape for shape in shapes if 'FROM "employees_employee"' in shape]
+        return statement
+
+    def test_fields_narrow_the_select(self):
+        self.assertIn('"employees_employee"."bank_account_number"', self.list_statement(''))
+        statement = self.list_statement('fields=id,user,department_name')
+        self.assertNotIn('"employees_employee"."bank_account_number"', statement)
+        self.assertNotIn('"employees_employee"."city"', statement)
+        self.assertIn('"accounts_user"."email"', statement)
+        self.assertIn('"employees_department"."name"', statement)
+
+    def test_unknown_fields_are_rejected(self):
+        employee = Employee.objects.first()
+        for url, param in (('/employees/employees/?fields=id,bogus', 'fields'),
+                           ('/employees/employees/?fields=id,bogus&fast=1', 'fields'),
+                           ('/employees/employees/?exclude=bogus', 'exclude'),
+                           (f'/employees/employees/{employee.id}/?fields=bogus', 'fields')):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual((response.status_code, response.json()), (400, {param: 'Unknown field(s): bogus.'}))
+
+
+class EmployeeExportTests(EmployeeDirectoryTestCase):
+    def export(self, query):
+        response = self.client.get(f'/employees/employees/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return streamed(response).body.decode()
+
+    def test_ndjson_rows_match_the_list(self):
+        for query in ('', 'fields=id,user,age', 'user_id=%d' % Employee.objects.first().user_id):
+            listed = self.client.get(f'/employees/employees/?{query}').json()
+            lines = self.export(f'output=ndjson&{query}').splitlines()
+            self.assertEqual([json.loads(line) for line in lines], listed)
+
+    def test_csv_flattens_nested_fields(self):
+        listed = self.client.get('/employees/employees/').json()
+        rows = list(csv.DictReader(io.StringIO(self.export('output=csv'))))
+        self.assertEqual(len(rows), len(listed))
+        self.assertIn('user.email', rows[0])
+        for row, employee in zip(rows, listed):
+            self.assertEqual(row['user.email'], employee['user']['email'])
+            self.assertEqual(row['position_title'], employee.get('position_title') or '')
+            self.assertEqual(row['age'], '' if employee['age'] is None else str(employee['age']))
+
+    def test_requires_view_employee_and_a_known_output(self):
+        self.assertEqual(self.client.get('/employees/employees/export/?output=xml').status_code, 400)
+        self.client.force_authenticate(make_user('nobody@example.com'))
+        self.assertEqual(self.client.get('/employees/employees/export/').status_code, 403)
+
+
+class EmployeeFilterTests(EmployeeDirectoryTestCase):
+    # Query strings the HR screens send most, each expected to be answered from an index.
+    COMMON_FILTERS = [
+        'status=ACTIVE',
+        'status=ACTIVE&joined_after=2015-03-02',
+        'status=PENDING,ACTIVE&ordering=-joining_date',
+        'position={position}',
+        'position={position}&status=ACTIVE',
+        'department={department}',
+        'department={department}&status=ACTIVE',
+        'organization={organization}',
+        'is_active=true&is_on_leave=false',
+        'is_active=true&is_on_leave=true&status=ACTIVE',
+        'country=PK',
+        'country=PK&status=ACTIVE',
+        'gender=F&status=ACTIVE',
+        'joined_after=2015-03-02&joined_before=2015-03-03',
+        'left_after=2020-01-01&left_before=2024-12-31',
+        'left_before=2020-01-01&ordering=leaving_date',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.position = Position.objects.get(title='Engineer')
+        cls.organization = Organization.objects.create(name='Filtered')
+        cls.organization.employees.add(*Employee.objects.filter(user__email__in=['employee1@example.com',
+                                                                               'employee3@example.com']))
+        Employee.objects.filter(user__email='employee2@example.com').update(status='PENDING', gender='F', country='PK',
+                                                                           is_on_leave=True)
+
+    def emails(self, query):
+        response = self.client.get(f'/employees/employees/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [employee['user']['email'] for employee in response.json()]
+
+    def view_queryset(self, query):
+        return self.client.get(f'/employees/employees/?{query}').renderer_context['view'].get_queryset()
+
+    def test_filters_narrow_the_list(self):
+        department = self.position.department_id
+        cases = {
+            'status=PENDING': ['employee2@example.com'],
+            'status=ACTIVE,PENDING&gender=F': ['employee2@example.com'],
+            f'position={self.position.id}&status=ACTIVE': ['employee0@example.com'],
+            f'department={department}': ['employee2@example.com', 'employee0@example.com'],
+            f'organization={self.organization.id}': ['employee3@example.com', 'employee1@example.com'],
+            'is_on_leave=1': ['employee2@example.com'],
+            'is_active=false': [],
+            'country=PK,DE': ['employee2@example.com'],
+            'joined_after=2015-03-02&joined_before=2015-03-03': ['employee2@example.com', 'employee1@example.com'],
+            'left_before=2020-01-01': ['employee3@example.com'],
+            'left_after=2020-01-01&q=first2': ['employee2@example.com'],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query):
+                self.assertEqual(self.emails(query), expected)
+
+    def test_ordering_is_whitelisted(self):
+        self.assertEqual(self.emails('ordering=joining_date'), [f'employee{n}@example.com' for n in range(4)])
+        self.assertEqual(self.emails('ordering=-id&status=ACTIVE')[0], 'employee3@example.com')
+        self.assertEqual(self.client.get('/employees/employees/?ordering=bank_account_number').status_code, 400)
+        response = self.client.get('/employees/employees/?pagination=cursor&ordering=leaving_date')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/employees/employees/?pagination=cursor&ordering=joining_date&page_size=2')
+        self.assertEqual([row['user']['email'] for row in response.json()['results']],
+                         ['employee0@example.com', 'employee1@example.com'])
+
+    def test_invalid_values_are_reported_together(self):
+        response = self.client.get('/employees/employees/?status=GONE&position=x&joined_after=2015-13-01&is_active=maybe')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'status', 'position', 'joined_after', 'is_active'})
+
+    def test_common_combinations_use_an_index(self):
+        values = {'position': self.position.id, 'department': self.position.department_id,
+                  'organization': self.organization.id}
+        for query in self.COMMON_FILTERS:
+            query = query.format(**values)
+            for name, queryset in (('list', self.view_queryset(query)), ('count', self.view_queryset(query).order_by())):
+                with self.subTest(query, query_kind=name):
+                    plan = queryset.explain() if name == 'list' else queryset.values('id').annotate().explain()
+                    employee_steps = [line for line in plan.splitlines() if ' employees_employee ' in line + ' ']
+                    self.assertTrue(employee_steps, plan)
+                    for step in employee_steps:
+                        self.assertRegex(step, r'SEARCH employees_employee USING (COVERING )?(INDEX|INTEGER PRIMARY KEY)', plan)
+
+
+class PaginationTests(EmployeeDirectoryTestCase):
+    # The conditional request validators aggregate with COUNT(column); only COUNT(*) is a row count.
+    url = '/employees/employees/'
+
+    def test_cursor_pages_cover_the_list_without_counting(self):
+        everyone = [row['id'] for row in self.client.get(self.url).json()]
+        seen, url = [], f'{self.url}?pagination=cursor&page_size=3'
+        with CaptureQueriesContext(connection) as context:
+            while url:
+                page = self.client.get(url).json()
+                seen += [row['id'] for row in page['results']]
+                url = page['next']
+        self.assertEqual(seen, everyone)
+        self.assertNotIn('count', page)
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(*)' in query['sql']])
+
+    def test_offset_counts_only_on_request(self):
+        total = len(self.client.get(self.url).json())
+        with CaptureQueriesContext(connection) as context:
+            page = self.client.get(f'{self.url}?pagination=offset&limit=2').json()
+        self.assertNotIn('count', page)
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(*)' in query['sql']])
+
+        page = self.client.get(f'{self.url}?pagination=offset&limit=2&count=approx').json()
+        self.assertEqual((page['count'], page['count_is_exact']), (total, True))
+        with patch.object(LegacyOffsetPagination, 'approximate_count_cap', 2):
+            page = self.client.get(f'{self.url}?pagination=offset&limit=1&count=approx').json()
+        self.assertEqual((page['count'], page['count_is_exact']), (2, False))
+
+    def test_invalid_modes_and_orderings_are_rejected(self):
+        for query, key in (('pagination=pages', 'pagination'), ('pagination=cursor&ordering=age_years', 'ordering'),
+                           ('pagination=offset&ordering=salary', 'ordering')):
+            with self.subTest(query):
+                response = self.client.get(f'{self.url}?{query}')
+                self.assertEqual((response.status_code, list(response.json())), (400, [key]))
+
+
+class AgeTenureAnnotationTests(EmployeeDirectoryTestCase):
+    def test_annotations_match_the_python_properties(self):
+        today = date.today()
+        user = make_user('edges@example.com')
+        employee = Employee.objects.create(user=user, joining_date=today)
+        for years in (0, 1, 4, 30):
+            for days in (-366, -2, -1, 0, 1, 2, 365):
+                anniversary = date(today.year - years, 3, 1) if (today.month, today.day) == (2, 29) and years % 4 \
+                    else today.replace(year=today.year - years)
+                moment = anniversary + timedelta(days=days)
+                Employee.objects.filter(pk=employee.pk).update(date_of_birth=moment, joining_date=moment,
+                                                               leaving_date=None if days % 2 else today)
+                with self.subTest(years=years, days=days):
+                    for row in Employee.objects.with_age_and_tenure():
+                        self.assertEqual((row.age_years, row.tenure_years), (row.age, row.tenure))
+
+    def test_list_filters_and_orders_on_age_and_tenure(self):
+        listed = self.client.get('/employees/employees/?ordering=-age_years').json()
+        ages = [employee['age'] for employee in listed]
+        self.assertEqual(ages, sorted((age for age in ages if age is not None), reverse=True) + [None])
+
+        by_tenure = self.client.get('/employees/employees/?ordering=tenure_years&min_tenure=-10').json()
+        self.assertEqual(by_tenure[0]['user']['email'], 'employee3@example.com')
+        self.assertLess(by_tenure[0]['tenure'], 0)
+
+        oldest = max(age for age in ages if age is not None)
+        self.assertEqual([employee['age'] for employee in self.client.get(f'/employees/employees/?min_age={oldest}').json()],
+                         [oldest])
+        self.assertEqual(self.client.get('/employees/employees/?max_age=abc').status_code, 400)
+
+    def test_serializers_read_the_annotations(self):
+        with patch('employees.models.calculate_age', side_effect=AssertionError), \
+                patch('employees.models.calculate_tenure', side_effect=AssertionError):
+            self.assertEqual(self.client.get('/employees/employees/').status_code, 200)
+        response = self.client.get('/employees/employees/?fast=1')
+        view = response.renderer_context['view']
+        fast = FastEmployeeListSerializer(view.get_serializer(), view.get_queryset().query.annotations)
+        self.assertTrue({'age_years', 'tenure_years'} <= fast.columns)
+
+    def test_update_returns_fresh_values(self):
+        grant(self.admin, EmployeeRole, 'change_employee')
+        employee = Employee.objects.get(user__email='employee1@example.com')
+        response = self.client.patch(f'/employees/employees/{employee.id}/', {'date_of_birth': '1970-01-01'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['age'], Employee.objects.get(pk=employee.pk).age)
+
+    def test_histogram_is_one_group_by(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/employees/employees/histogram/?by=age&width=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in context.captured_queries if 'GROUP BY' in q['sql']]), 1)
+        expected = {}
+        for employee in Employee.objects.all():
+            band = None if employee.age is None else employee.age // 10 * 10
+            expected[band] = expected.get(band, 0) + 1
+        self.assertEqual({band['from']: band['count'] for band in response.data['bands']}, expected)
+        self.assertTrue(all(band['to'] == band['from'] + 9 for band in response.data['bands'] if band['from'] is not None))
+
+        tenure = self.client.get('/employees/employees/histogram/?by=tenure&width=5&status=ACTIVE').data
+        self.assertEqual(sum(band['count'] for band in tenure['bands']), 4)
+        self.assertEqual(self.client.get('/employees/employees/histogram/?by=salary').status_code, 400)
+        self.assertEqual(self.client.get('/employees/employees/histogram/?width=0').status_code, 400)
+
+
+class EmployeeSearchTests(EmployeeDirectoryTestCase):
+    def search(self, query, extra=''):
+        response = self.client.get(f'/employees/employees/?q={query}{extra}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def emails(self, query):
+        return [employee['user']['email'] for employee in self.search(query)]
+
+    def test_terms_are_prefixes_matched_across_columns(self):
+        self.assertEqual(self.emails('first2'), ['employee2@example.com'])
+        self.assertEqual(len(self.emails('lahore')), 4)
+        self.assertEqual(self.emails('engin LAH'), ['employee2@example.com', 'employee0@example.com'])
+        self.assertEqual(self.emails('employee3@example.com'), ['employee3@example.com'])
+        self.assertEqual(self.emails('nobody'), [])
+
+    def test_a_query_without_terms_filters_nothing(self):
+        everyone = [employee['user']['email'] for employee in self.client.get('/employees/employees/').json()]
+        self.assertEqual(self.emails(''), everyone)
+        self.assertEqual(self.emails('%20-*'), everyone)
+
+    def test_name_matches_rank_above_position_matches(self):
+        user = make_user('ranked@example.com', 'Engineer', 'Smith')
+        Employee.objects.create(user=user, joining_date=date(2020, 1, 1))
+        self.assertEqual(self.emails('engineer'), ['ranked@example.com', 'employee2@example.com', 'employee0@example.com'])
+
+    def test_index_follows_users_positions_and_departments(self):
+        user = User.objects.get(email='employee0@example.com')
+        user.first_name = 'Renamed'
+        user.save()
+        self.assertEqual(self.emails('renamed'), ['employee0@example.com'])
+        self.assertEqual(self.emails('first0'), [])
+        with CaptureQueriesContext(connection) as context:
+            user.save(update_fields=['last_login'])
+        self.assertEqual(len(context.captured_queries), 1)
+
+        department = Department.objects.get(name='Engineering')
+        department.name = 'Research'
+        department.save()
+        self.assertEqual(len(self.emails('research')), 2)
+
+        position = Position.objects.get(title='Engineer')
+        position.title = 'Scientist'
+        position.save()
+        self.assertEqual(len(self.emails('scientist')), 2)
+        position.delete()
+        self.assertEqual(self.emails('scientist'), [])
+        self.assertEqual(self.emails('research'), [])
+
+        Employee.objects.get(user=user).delete()
+        self.assertEqual(self.emails('renamed'), [])
+
+    def test_fast_path_and_offset_pagination_keep_the_ranking(self):
+        regular = self.client.get('/employees/employees/?q=lahore&pagination=offset&limit=3&count=exact')
+        fast = self.client.get('/employees/employees/?q=lahore&pagination=offset&limit=3&count=exact&fast=1')
+        self.assertEqual(regular.json()['count'], 4)
+        self.assertEqual(regular.json()['results'], fast.json()['results'])
+
+    def test_plan_starts_from_the_full_text_index(self):
+        queryset = self.client.get('/employees/employees/?q=lahore').renderer_context['view'].get_queryset()
+        plan = queryset.explain()
+        self.assertIn('VIRTUAL TABLE INDEX', plan.splitlines()[0])
+        self.assertNotIn('SCAN employees_employee\n', plan + '\n')
+
+    @override_settings(EMPLOYEE_SEARCH_BACKEND='employees.search.DatabaseSearchBackend')
+    def test_fallback_backend_finds_the_same_rows(self):
+        self.assertEqual(sorted(self.emails('engin LAH')), ['employee0@example.com', 'employee2@example.com'])
+        self.assertEqual(self.emails('first2'), ['employee2@example.com'])
+
+    def test_rebuild_restores_a_cleared_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM employees_employee_search")
+        self.assertEqual(self.emails('lahore'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(self.emails('lahore')), 4)
+
+    def test_migrate_backfills_an_empty_index(self):
+        backend = get_search_backend()
+        self.assertEqual(backend.backfill(), 0)
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM employees_employee_search")
+        install_search_index(sender=None)
+        self.assertEqual(len(self.emails('lahore')), 4)
+        self.assertEqual(backend.backfill(), 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EmployeeImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('import-admin@example.com')
+        grant(cls.admin, EmployeeRole, 'add_employee')
+        department = Department.objects.create(name='Imported')
+        cls.position = Position.objects.create(title='Importer', department=department,
+                                               salary_range_min=1000, salary_range_max=2000)
+        cls.users = [make_user(f'import{n}@example.com') for n in range(60)]
+        Employee.objects.create(user=cls.users[-1], joining_date=date(2020, 1, 1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_valid_rows_are_created_and_invalid_rows_reported(self):
+        response = self.client.post('/employees/employees/import/', [
+            {'user_id': self.users[0].id, 'position': self.position.id, 'joining_date': '2024-01-02', 'city': 'Lahore'},
+            {'email': 'import1@EXAMPLE.com', 'joining_date': '2024-01-03', 'date_of_birth': '1990-04-05'},
+            {'user_id': self.users[0].id, 'joining_date': '2024-01-02'},
+            {'user_id': self.users[-1].id, 'joining_date': '2024-01-02'},
+            {'user_id': 999999, 'position': 999999, 'joining_date': 'not a date', 'gender': 'X'},
+            {'joining_date': '2024-01-02'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        errors = {error['row']: set(error['errors']) for error in response.data['errors']}
+        self.assertEqual(errors, {3: {'user_id'}, 4: {'user_id'}, 5: {'user_id', 'position', 'joining_date', 'gender'},
+                                  6: {'user_id'}})
+
+        first = Employee.objects.get(user=self.users[0])
+        self.assertEqual((first.position, first.added_by, first.city, first.status),
+                         (self.position, self.admin, 'Lahore', 'PENDING'))
+        self.assertEqual(Employee.objects.get(user=self.users[1]).date_of_birth, date(1990, 4, 5))
+        # Rows written by bulk_create are indexed too.
+        self.assertEqual([employee.user for employee in get_search_backend().search(Employee.objects.all(), 'import1')],
+                         [self.users[1]])
+
+    def test_csv_upload_and_dry_run(self):
+        upload = io.BytesIO(b'email,position,joining_date,leaving_date\n'
+                            b'import2@example.com,%d,2024-01-02,\nimport3@example.com,,2024-01-02,2024-05-01\n'
+                            % self.position.id)
+        upload.name = 'employees.csv'
+        response = self.client.post('/employees/employees/import/?dry_run=1', {'file': upload})
+        self.assertEqual((response.status_code, response.data['created'], response.data['errors']), (200, 0, []))
+        self.assertFalse(Employee.objects.filter(user__in=self.users[2:4]).exists())
+
+        upload.seek(0)
+        response = self.client.post('/employees/employees/import/', {'file': upload})
+        self.assertEqual((response.status_code, response.data['created']), (201, 2))
+        self.assertEqual(Employee.objects.get(user=self.users[3]).leaving_date, date(2024, 5, 1))
+
+    def test_csv_with_user_id_and_email_columns(self):
+        upload = io.BytesIO(b'user_id,email,joining_date\n%d,,2024-01-02\n,import5@example.com,2024-01-02\n'
+                            % self.users[4].id)
+        upload.name = 'employees.csv'
+        response = self.client.post('/employees/employees/import/', {'file': upload})
+        self.assertEqual((response.status_code, response.data['created'], response.data['errors']), (201, 2, []))
+        self.assertEqual(Employee.objects.filter(user__in=self.users[4:6]).count(), 2)
+
+    def test_files_that_are_not_utf8_are_rejected(self):
+        for name, content in (('employees.csv', 'email,joining_date,city\nimport6@example.com,2024-01-02,Zürich\n'),
+                              ('employees.json', '[{"email": "import6@example.com", "city": "Zürich"}]')):
+            with self.subTest(name):
+                upload = io.BytesIO(content.encode('latin-1'))
+                upload.name = name
+                response = self.client.post('/employees/employees/import/', {'file': upload})
+                self.assertEqual((response.status_code, response.data),
+                                 (400, {'file': ['The file is not UTF-8 encoded.']}))
+        self.assertFalse(Employee.objects.filter(user=self.users[6]).exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = []
+        for users in (self.users[:5], self.users[5:55]):
+            rows = [{'user_id': user.id, 'position': self.position.id, 'joining_date': '2024-01-02'} for user in users]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/employees/employees/import/', rows, format='json')
+            self.assertEqual(response.data['created'], len(rows))
+            # bulk_create splits a batch into as many INSERTs as SQLite's parameter limit needs.
+            inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "employees_employee"')]
+            self.assertLess(len(inserts), 3)
+            counts.append(len(context.captured_queries) - len(inserts))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_requires_add_employee(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/employees/employees/import/', [], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkInvitationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._task_always_eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+
+    @classmethod
+    def tearDownClass(cls):
+        current_app.conf.task_always_eager = cls._task_always_eager
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('bulk-admin@example.com')
+        User.objects.filter(pk=cls.admin.pk).update(is_staff=True)
+        cls.admin.refresh_from_db()
+        cls.organization = Organization.objects.create(name='Bulk', admin=cls.admin)
+        cls.position = Position.objects.create(title='Invitee', department=Department.objects.create(name='Bulk'),
+                                               salary_range_min=1000, salary_range_max=2000)
+        member = make_user('member@example.com')
+        cls.organization.employees.add(Employee.objects.create(user=member, joining_date=date(2020, 1, 1)))
+        for email, invitation_status, expires_in in (('pending@example.com', 'pending', timedelta(days=1)),
+                                                     ('lapsed@example.com', 'pending', -timedelta(days=1)),
+                                                     ('declined@example.com', 'declined', timedelta(days=1)),
+                                                     ('accepted@example.com', 'accepted', timedelta(days=1))):
+            EmployeeInvitation.objects.create(email=email, organization=cls.organization, invited_by=cls.admin,
+                                              status=invitation_status, expires_at=timezone.now() + expires_in)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_reports_an_outcome_per_email(self):
+        emails = ['new@example.com', 'member@example.com', 'pending@example.com', 'lapsed@example.com',
+                  'declined@example.com', 'accepted@example.com', 'not-an-email', 'new@example.com']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/employees/invitations/send/bulk/', {
+                'emails': emails, 'organization': self.organization.id, 'position': self.position.id,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(entry['email'], entry['status'], entry.get('reason')) for entry in response.data['results']], [
+            ('new@example.com', 'invited', None),
+            ('member@example.com', 'skipped', 'member'),
+            ('pending@example.com', 'skipped', 'pending'),
+            ('lapsed@example.com', 'invited', None),
+            ('declined@example.com', 'skipped', 'declined'),
+            ('accepted@example.com', 'skipped', 'accepted'),
+            ('not-an-email', 'skipped', 'invalid'),
+            ('new@example.com', 'skipped', 'duplicate'),
+        ])
+        self.assertEqual((response.data['invited'], response.data['skipped']), (2, 6))
+
+        invitation = EmployeeInvitation.objects.get(id=response.data['results'][0]['invitation_id'])
+        self.assertEqual((invitation.status, invitation.position, invitation.invited_by, invitation.token),
+                         ('pending', self.position, self.admin, response.data['results'][0]['token']))
+        self.assertGreater(invitation.expires_at, timezone.now() + timedelta(days=6))
+        self.assertIsNotNone(invitation.last_sent_at)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['lapsed@example.com', 'new@example.com'])
+
+    def test_emails_are_queued_in_the_request_transaction(self):
+        emails = [f'queued{n}@example.com' for n in range(5)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/employees/invitations/send/bulk/', {
+                'emails': emails, 'organization': self.organization.id,
+            }, format='json')
+        self.assertEqual(response.data['invited'], 5)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(row.to[0] for row in EmailOutbox.objects.all()), emails)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Invitation to join Bulk')
+
+    @override_settings(INVITATION_STATUS_COUNTERS=True)
+    def test_counters_include_bulk_created_invitations(self):
+        rebuild_invitation_counters()
+        self.client.post('/employees/invitations/send/bulk/', {
+            'emails': ['counted-a@example.com', 'counted-b@example.com'], 'organization': self.organization.id,
+        }, format='json')
+        self.assertEqual(counted_status_counts(), invitation_status_counts(EmployeeInvitation.objects.all()))
+
+
+@override_settings(PERMISSION_CLAIMS_IN_TOKEN=True)
+class PermissionClaimTests(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _version_map.clear()
+        self.user = make_user('claims@example.com')
+        token = AccessToken.for_user(self.user)
+        token['perm_version'], token['perms'] = self.user.perm_version, ['view_employee']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_claims_stop_being_trusted_after_a_bump_in_another_process(self):
+        self.assertEqual(self.client.get('/employees/employees/').status_code, 200)
+        # Another worker bumps the version; nothing in this process is invalidated.
+        User.objects.filter(pk=self.user.pk).update(perm_version=F('perm_version') + 1)
+        self.assertEqual(self.client.get('/employees/employees/').status_code, 200)
+
+        later = time.monotonic() + settings.PERMISSION_VERSION_TTL + 1
+        with patch('employees.permission_cache.time.monotonic', return_value=later):
+            self.assertEqual(self.client.get('/employees/employees/').status_code, 403)
+
+    def test_login_embeds_codes_from_the_index(self):
+        role = grant(self.user, EmployeeRole, 'view_employee', 'add_employee')
+        cached = get_user_permission_codes(self.user)
+        # Another worker revokes a grant; this worker's permission cache still has the old codes.
+        role.permission.remove(role.permission.get(code='add_employee'))
+        get_permission_cache().set(f'employees:perms:{self.user.pk}', cached)
+
+        response = APIClient().post('/accounts/login/', {'email': self.user.email, 'password': 'password'},
+                                    format='json')
+        token = AccessToken(response.data['access_token'])
+        self.user.refresh_from_db()
+        self.assertEqual((token['perms'], token['perm_version']), (['view_employee'], self.user.perm_version))
+
+
+class PermissionIndexTests(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_backfill_and_rebuild_bump_users_whose_codes_changed(self):
+        kept, restored = make_user('kept@example.com'), make_user('restored@example.com')
+        grant(kept, EmployeeRole, 'view_employee')
+        grant(restored, EmployeeRole, 'view_employee', 'add_employee')
+        self.assertEqual(backfill_permission_index(), 0)
+
+        # An index left empty, or partly stale, by a deployment that predates it.
+        UserPermissionIndex.objects.filter(user=restored).delete()
+        versions = dict(User.objects.values_list('pk', 'perm_version'))
+        self.assertEqual(rebuild_permission_index(), 3)
+        self.assertEqual(set(UserPermissionIndex.objects.filter(user=restored).values_list('code', flat=True)),
+                         {'view_employee', 'add_employee'})
+        bumped = {pk for pk, version in User.objects.values_list('pk', 'perm_version') if version != versions[pk]}
+        self.assertEqual(bumped, {restored.pk})
+
+        UserPermissionIndex.objects.all().delete()
+        self.assertEqual(backfill_permission_index(), 3)
+
+    def test_refresh_diffs_the_index_and_bumps_only_changed_users(self):
+        unchanged, stale, missing = (make_user(f'{name}@example.com') for name in ('unchanged', 'stale', 'missing'))
+        for user in (unchanged, stale, missing):
+            grant(user, EmployeeRole, 'view_employee')
+        # Drift that signals would normally have prevented.
+        UserPermissionIndex.objects.create(user=stale, code='add_employee')
+        UserPermissionIndex.objects.filter(user=missing).delete()
+        self.assertEqual(get_user_permission_codes(stale), {'view_employee', 'add_employee'})
+        kept = set(UserPermissionIndex.objects.filter(user=unchanged).values_list('pk', flat=True))
+        versions = dict(User.objects.values_list('pk', 'perm_version'))
+
+        refresh_user_permissions(unchanged.pk, stale.pk, missing.pk)
+        codes = {user: set(UserPermissionIndex.objects.filter(user=user).values_list('code', flat=True))
+                 for user in (unchanged, stale, missing)}
+        self.assertEqual(codes, {unchanged: {'view_employee'}, stale: {'view_employee'}, missing: {'view_employee'}})
+        self.assertEqual(set(UserPermissionIndex.objects.filter(user=unchanged).values_list('pk', flat=True)), kept)
+        bumped = {pk for pk, version in User.objects.values_list('pk', 'perm_version') if version != versions[pk]}
+        self.assertEqual(bumped, {stale.pk, missing.pk})
+        self.assertEqual(get_user_permission_codes(stale), {'view_employee'})
+
+
+class PermissionSyncTests(TestCase):
+
+    def test_loading_the_urlconf_issues_no_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            for module in ('employees.urls', 'conf.urls'):
+                importlib.reload(importlib.import_module(module))
+        self.assertEqual(context.captured_queries, [])
+
+    def test_sync_creates_missing_rows_in_bulk_once(self):
+        EmployeePermission.objects.filter(code__in=['view_employee', 'add_employee']).delete()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(setup_permissions(), 2)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual((len(inserts), len(context.captured_queries) - len(inserts)), (1, 4))
+        with self.assertNumQueries(4):
+            self.assertEqual(setup_permissions(), 0)
+        self.assertEqual(EmployeePermission.objects.filter(code='view_employee').count(), 1)
+
+    def test_post_migrate_syncs_the_migrated_database(self):
+        with patch('employees.models.setup_permissions') as setup:
+            sync_permissions(sender=None, using='replica')
+        setup.assert_called_once_with(using='replica')
+
+
+class PermissionInvalidationTests(TestCase):
+    """Each change is made after the previous outcome was cached, and must be seen by the next check."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = make_user('invalidation@example.com')
+        self.view = EmployeePermission.objects.get(code='view_employee')
+        self.role = grant(self.user, EmployeeRole, 'view_employee')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertAllowed(self, allowed):
+        self.assertEqual(self.client.get('/employees/employees/').status_code, 200 if allowed else 403)
+
+    def test_role_side_add_remove_and_clear(self):
+        self.assertAllowed(True)
+        self.role.permission.remove(self.view)
+        self.assertAllowed(False)
+        self.role.permission.add(self.view)
+        self.assertAllowed(True)
+        self.role.permission.clear()
+        self.assertAllowed(False)
+
+    def test_permission_side_add_remove_and_clear(self):
+        self.assertAllowed(True)
+        self.view.employeerole_set.remove(self.role)
+        self.assertAllowed(False)
+        self.view.employeerole_set.add(self.role)
+        self.assertAllowed(True)
+        self.view.employeerole_set.clear()
+        self.assertAllowed(False)
+
+    def test_role_reassigned_to_another_user(self):
+        other = make_user('other@example.com')
+        self.assertAllowed(True)
+        self.role.user = other
+        self.role.save()
+        self.assertAllowed(False)
+
+        self.client.force_authenticate(other)
+        self.assertAllowed(True)
+        self.role.user = self.user
+        self.role.save()
+        self.assertAllowed(False)
+
+    def test_role_deleted(self):
+        self.assertAllowed(True)
+        self.role.delete()
+        self.assertAllowed(False)
+
+    def test_permission_deleted(self):
+        self.assertAllowed(True)
+        self.view.delete()
+        self.assertAllowed(False)
+
+    def test_process_local_cache_is_flagged(self):
+        self.assertEqual(check_permission_cache(None), [])
+        local = {**settings.CACHES, 'permissions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local):
+            self.assertEqual([warning.id for warning in check_permission_cache(None)], ['employees.W001'])
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('etag-admin@example.com')
+        grant(cls.admin, DepartmentRole, 'view_department', 'change_department')
+        grant(cls.admin, EmployeeRole, 'view_employee')
+        cls.lead = make_user('etag-lead@example.com', 'Lee', 'Dean')
+        cls.department = Department.objects.create(name='Conditional', lead=cls.lead)
+        Department.objects.create(name='Other')
+        position = Position.objects.create(title='Conditional', department=cls.department,
+                                           salary_range_min=1000, salary_range_max=2000)
+        cls.employee = Employee.objects.create(user=make_user('etag-employee@example.com'), position=position,
+                                               joining_date=date(2020, 1, 1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assertNotModified(self, url, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # Permission lookup plus the validator; the rows themselves are never read.
+        self.assertLessEqual(len(context.captured_queries), 2)
+        return response
+
+    def test_list_revalidates_until_a_related_row_changes(self):
+        url = '/employees/departments/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.lead.first_name = 'Renamed'
+        self.lead.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.lead.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/employees/departments/{self.department.id}/'
+        response = self.client.get(url)
+        self.assertNotModified(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_employee_validators_change_with_the_date(self):
+        for url in (f'/employees/employees/{self.employee.id}/', '/employees/employees/'):
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('Last-Modified'))
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            with patch('employees.mixins.date') as mocked:
+                mocked.today.return_value = date.today() + timedelta(days=1)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_writes_check_if_match(self):
+        url = f'/employees/departments/{self.department.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(url, {'description': 'first'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(url, {'description': 'lost update'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.department.refresh_from_db()
+        self.assertEqual(self.department.description, 'first')
+        self.assertEqual(self.client.patch(url, {'description': 'unconditional'}, format='json').status_code, 200)
+
+    def test_if_match_accepts_a_tag_from_any_representation(self):
+        url = f'/employees/departments/{self.department.id}/'
+        etag = self.client.get(url + '?fields=id', HTTP_ACCEPT='application/json')['ETag']
+        response = self.client.patch(url, {'description': 'sparse'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(url, {'description': 'stale'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('cache-admin@example.com')
+        User.objects.filter(pk=cls.admin.pk).update(is_staff=True)
+        cls.admin.refresh_from_db()
+        grant(cls.admin, DepartmentRole, 'view_department')
+        grant(cls.admin, PositionRole, 'view_position')
+        cls.lead = make_user('cache-lead@example.com', 'Lee', 'Dean')
+        cls.bystander = make_user('cache-bystander@example.com')
+        cls.department = Department.objects.create(name='Cached', lead=cls.lead)
+        cls.position = Position.objects.create(title='Cached', department=cls.department,
+                                               salary_range_min=1000, salary_range_max=2000)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache'], response.json()
+
+    def test_hits_skip_the_database(self):
+        self.assertEqual(self.get('/employees/departments/')[0], 'MISS')
+        with CaptureQueriesContext(connection) as context:
+            state, body = self.get('/employees/departments/')
+        self.assertEqual((state, len(context.captured_queries)), ('HIT', 0))
+        self.assertEqual(body[0]['lead']['first_name'], 'Lee')
+
+        etag = self.client.get('/employees/departments/')['ETag']
+        self.assertEqual(self.client.get('/employees/departments/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_keys_cover_query_parameters_and_permissions(self):
+        self.get(f'/employees/positions/?department_id={self.department.id}')
+        self.assertEqual(self.get('/employees/positions/')[0], 'MISS')
+        self.assertEqual(self.get(f'/employees/positions/?department_id={self.department.id}')[0], 'HIT')
+
+        grant(self.admin, PositionRole, 'add_position')
+        self.assertEqual(self.get('/employees/positions/')[0], 'MISS')
+
+    def test_signals_invalidate_exactly_the_affected_lists(self):
+        self.get('/employees/departments/')
+        self.get('/employees/positions/')
+
+        self.bystander.first_name = 'Irrelevant'
+        self.bystander.save()
+        self.lead.save(update_fields=['last_login'])
+        self.assertEqual(self.get('/employees/departments/')[0], 'HIT')
+
+        self.lead.first_name = 'Renamed'
+        self.lead.save()
+        self.assertEqual(self.get('/employees/departments/'), ('MISS', self.get('/employees/departments/')[1]))
+        self.assertEqual(self.get('/employees/departments/')[1][0]['lead']['first_name'], 'Renamed')
+        self.assertEqual(self.get('/employees/positions/')[0], 'HIT')
+
+        self.position.title = 'Retitled'
+        self.position.save()
+        self.assertEqual(self.get('/employees/departments/')[0], 'HIT')
+        self.assertEqual(self.get('/employees/positions/')[0], 'MISS')
+
+        self.department.name = 'Renamed department'
+        self.department.save()
+        self.assertEqual(self.get('/employees/departments/')[0], 'MISS')
+        state, body = self.get('/employees/positions/')
+        self.assertEqual((state, body[0]['department_name']), ('MISS', 'Renamed department'))
+
+        self.lead.delete()
+        state, body = self.get('/employees/departments/')
+        self.assertEqual((state, body[0]['lead']), ('MISS', None))
+
+    def test_a_lost_generation_never_comes_back(self):
+        self.get('/employees/departments/')
+        invalidate('departments')
+        self.assertEqual(self.get('/employees/departments/')[0], 'MISS')
+
+        # The counter is culled while the entry stored under it survives.
+        get_response_cache().delete('employees:response:generation:departments')
+        Department.objects.filter(pk=self.department.pk).update(name='Changed behind the cache')
+        invalidate('departments')
+        state, body = self.get('/employees/departments/')
+        self.assertEqual((state, body[0]['name']), ('MISS', 'Changed behind the cache'))
+
+    def test_stats(self):
+        self.get('/employees/departments/')
+        self.get('/employees/departments/')
+        self.get('/employees/departments/')
+        response = self.client.get('/employees/response-cache/stats/')
+        self.assertEqual(response.data['departments'], {'hits': 2, 'misses': 1, 'hit_rate': 0.6667})
+        self.assertEqual(response.data['positions']['hits'], 0)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+                CACHES={**settings.CACHES, 'responses': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            self.assertEqual(self.get('/employees/positions/')[0], 'MISS')
+            self.assertEqual(self.get('/employees/positions/')[0], 'HIT')
+            self.position.save()
+            self.assertEqual(self.get('/employees/positions/')[0], 'MISS')
+
+
+class InvitationEmailRendererTests(TestCase):
+    def invitations(self, organization_names, position=None):
+        inviter = User(first_name='Ina', last_name='Viter')
+        expires_at = timezone.now() + timedelta(days=7)
+        return [EmployeeInvitation(email=f'render{n}@example.com', token=f'token-{n}-&<>', invited_by=inviter,
+                                   organization=Organization(name=name), position=position, expires_at=expires_at)
+                for n, name in enumerate(organization_names)]
+
+    def test_batch_matches_render_to_string(self):
+        position = Position(title='Engineer <senior>')
+        for is_resend in (False, True):
+            renderer = InvitationEmailRenderer(is_resend)
+            invitations = self.invitations(['A & B', 'Other', 'A & B', 'A & B'], position)
+            template_name = 'emails/resendinvite.html' if is_resend else 'emails/invitation.html'
+            rendered = renderer.render_batch(invitations)
+            self.assertEqual([invitation for invitation, _, _ in rendered], invitations)
+            self.assertEqual([html for _, _, html in rendered],
+                             [render_to_string(template_name, invitation_context(invitation))
+                              for invitation in invitations])
+
+    def test_shared_part_is_rendered_once_per_group(self):
+        renderer = InvitationEmailRenderer()
+        with patch.object(renderer.template, 'render', wraps=renderer.template.render) as render:
+            renderer.render_batch(self.invitations(['Same'] * 50 + ['Different']))
+        # One shared render and one verification render per group.
+        self.assertEqual(render.call_count, 4)
+
+    def test_messages(self):
+        message, = InvitationEmailRenderer(is_resend=True).messages(self.invitations(['Acme']))
+        self.assertEqual((message.subject, message.to), ('Join Acme - Invitation Reminder', ['render0@example.com']))
+        self.assertIn('token-0-&amp;&lt;&gt;', message.alternatives[0][0])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EmployeeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every employees route keeps a fixed number of queries as the data grows."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._task_always_eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+
+    @classmethod
+    def tearDownClass(cls):
+        current_app.conf.task_always_eager = cls._task_always_eager
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('budget-admin@example.com', 'Budget', 'Admin')
+        User.objects.filter(pk=cls.admin.pk).update(is_staff=True)
+        cls.admin.refresh_from_db()
+        for role_model, choices in ((DepartmentRole, department_perm_choices), (PositionRole, position_perm_choices),
+                                    (EmployeeRole, employee_perm_choices), (OrganizationRole, organization_perm_choices)):
+            grant(cls.admin, role_model, *[code for code, _ in choices])
+        seed_company(2, 'base', cls.admin)
+
+        cls.department = Department.objects.first()
+        cls.position = Position.objects.first()
+        cls.employee = Employee.objects.first()
+        cls.organization = Organization.objects.first()
+        cls.invitation = EmployeeInvitation.objects.first()
+        Employee.objects.create(user=cls.admin, position=cls.position, joining_date=date(2019, 1, 1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.sequence = count()
+        self.grown = count()
+
+    def grow(self):
+        seed_company(3, f'grown{next(self.grown)}', self.admin)
+
+    def test_department_routes(self):
+        # A cold cache also loads the lead ids used to invalidate on user saves.
+        self.assertQueryBudget(4, lambda: self.client.get('/employees/departments/'))
+        self.assertQueryBudget(2, lambda: self.client.get(f'/employees/departments/{self.department.id}/'))
+
+    def test_position_routes(self):
+        self.assertQueryBudget(3, lambda: self.client.get('/employees/positions/'))
+        self.assertQueryBudget(3, lambda: self.client.get(f'/employees/positions/?department_id={self.department.id}'))
+        self.assertQueryBudget(2, lambda: self.client.get(f'/employees/positions/{self.position.id}/'))
+
+    def test_employee_routes(self):
+        self.assertQueryBudget(3, lambda: self.client.get('/employees/employees/'))
+        self.assertQueryBudget(3, lambda: self.client.get('/employees/employees/?fast=1'))
+        self.assertQueryBudget(3, lambda: self.client.get('/employees/employees/?fields=id,user,department_name'))
+        self.assertQueryBudget(2, lambda: self.client.get(f'/employees/employees/{self.employee.id}/'))
+
+    def test_department_writes(self):
+        url = f'/employees/departments/{self.department.id}/'
+        self.assertQueryBudget(6, lambda: self.client.put(url, {
+            'name': f'Renamed {next(self.sequence)}', 'description': 'Put', 'lead_id': self.admin.id,
+        }, format='json'))
+        self.assertQueryBudget(4, lambda: self.client.patch(url, {'description': 'Patched'}, format='json'))
+        departments = iter([Department.objects.create(name=f'Doomed {n}') for n in range(2)])
+        self.assertQueryBudget(4, lambda: self.client.delete(f'/employees/departments/{next(departments).id}/'),
+                               expected_status=204)
+
+    def test_position_writes(self):
+        url = f'/employees/positions/{self.position.id}/'
+        self.assertQueryBudget(5, lambda: self.client.put(url, {
+            'title': 'Put', 'department': self.department.id, 'salary_range_min': 1000, 'salary_range_max': 3000,
+        }, format='json'))
+        self.assertQueryBudget(4, lambda: self.client.patch(url, {'title': 'Patched'}, format='json'))
+        positions = iter([Position.objects.create(title=f'Doomed {n}', department=self.department,
+                                                  salary_range_min=1000, salary_range_max=2000) for n in range(2)])
+        self.assertQueryBudget(6, lambda: self.client.delete(f'/employees/positions/{next(positions).id}/'),
+                               expected_status=204)
+
+    def test_employee_writes(self):
+        url = f'/employees/employees/{self.employee.id}/'
+        self.assertQueryBudget(6, lambda: self.client.put(url, {
+            'position': self.position.id, 'joining_date': '2020-01-01', 'city': 'Put',
+        }, format='json'))
+        self.assertQueryBudget(4, lambda: self.client.patch(url, {'city': 'Patched'}, format='json'))
+        employees = iter([Employee.objects.create(user=make_user(f'doomed{n}@example.com'), position=self.position,
+                                                  joining_date=date(2020, 1, 1)) for n in range(2)])
+        self.assertQueryBudget(5, lambda: self.client.delete(f'/employees/employees/{next(employees).id}/'),
+                               expected_status=204)
+
+    def test_organization_writes(self):
+        # Both runs then leave the membership unchanged.
+        self.organization.employees.set([self.employee])
+        url = f'/employees/organizations/{self.organization.id}/'
+        self.assertQueryBudget(11, lambda: self.client.put(url, {
+            'name': 'Put', 'admin_id': self.admin.id, 'employee_ids': [self.employee.id],
+        }, format='json'))
+        self.assertQueryBudget(8, lambda: self.client.patch(url, {'name': 'Patched'}, format='json'))
+        organizations = iter([Organization.objects.create(name=f'Doomed {n}') for n in range(2)])
+        self.assertQueryBudget(7, lambda: self.client.delete(f'/employees/organizations/{next(organizations).id}/'),
+                               expected_status=204)
+
+    def test_employee_import_and_histogram(self):
+        batches = iter([[make_user(f'imported{n}-{m}@example.com') for m in range(size)]
+                        for n, size in enumerate((2, 20))])
+        self.assertQueryBudget(8, lambda: self.client.post('/employees/employees/import/', [
+            {'user_id': user.id, 'position': self.position.id, 'joining_date': '2024-01-02'} for user in next(batches)
+        ], format='json'), expected_status=201)
+        self.assertQueryBudget(2, lambda: self.client.get('/employees/employees/histogram/?by=age&width=10'))
+
+    def test_response_cache_stats(self):
+        self.assertQueryBudget(0, lambda: self.client.get('/employees/response-cache/stats/'))
+
+    def test_employee_export(self):
+        self.assertQueryBudget(2, lambda: streamed(self.client.get('/employees/employees/export/')))
+        self.assertQueryBudget(2, lambda: streamed(self.client.get('/employees/employees/export/?output=ndjson')))
+
+    def test_employee_create(self):
+        users = iter([make_user(f'new-hire{n}@example.com') for n in range(2)])
+        # Includes indexing the new employee for search.
+        self.assertQueryBudget(7, lambda: self.client.post('/employees/employees/', {
+            'user_id': next(users).id, 'position': self.position.id, 'joining_date': '2024-01-01',
+        }, format='json'), expected_status=201)
+
+    def test_organization_routes(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/employees/organizations/'))
+        self.assertQueryBudget(3, lambda: self.client.get('/employees/organizations/?include=employees'))
+        self.assertQueryBudget(3, lambda: self.client.get(f'/employees/organizations/{self.organization.id}/'))
+
+    def test_invitation_routes(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/employees/employee-invitations/list/'))
+        with override_settings(INVITATION_STATUS_COUNTERS=True):
+            rebuild_invitation_counters()
+            self.assertQueryBudget(3, lambda: self.client.get('/employees/employee-invitations/list/'))
+        self.assertQueryBudget(1, lambda: self.client.get(f'/employees/employee-invitations/list/{self.invitation.id}/'))
+        self.assertQueryBudget(9, lambda: self.client.post('/employees/invitations/send/', {
+            'email': f'invitee{next(self.sequence)}@example.com', 'organization': self.organization.id,
+            'position': self.position.id,
+        }, format='json'), expected_status=201)
+        self.assertQueryBudget(5, lambda: self.client.post('/employees/invitations/resend/', {
+            'invitation_id': self.invitation.id,
+        }, format='json'))
+
+    def test_bulk_invitation(self):
+        batches = iter([[f'bulk{n}-{m}@example.com' for m in range(size)] for n, size in enumerate((3, 30))])
+        self.assertQueryBudget(10, lambda: self.client.post('/employees/invitations/send/bulk/', {
+            'emails': next(batches), 'organization': self.organization.id, 'position': self.position.id,
+        }, format='json'), expected_status=201)
+
+    def test_accept_invitation(self):
+        tokens = iter([
+            EmployeeInvitation.objects.create(email=f'accepted{n}@example.com', organization=self.organization,
+                                              invited_by=self.admin, position=self.position).token
+            for n in range(2)
+        ])
+        self.assertQueryBudget(16, lambda: APIClient().post('/employees/invitations/accept/', {
+            'token': next(tokens), 'password': 'password', 'accept': True, 'first_name': 'New', 'last_name': 'Hire',
+        }, format='json'))
+
+    def test_employee_profile(self):
+        self.assertQueryBudget(1, lambda: self.client.get('/employees/employee/profile/'))
+
+
+@override_settings(INVITATION_STATUS_COUNTERS=True)
+class InvitationStatusCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('counts-admin@example.com')
+        cls.organizations = [Organization.objects.create(name=f'Counted {n}', admin=cls.admin) for n in range(2)]
+
+    def invite(self, organization, status='pending', expires_in=timedelta(days=7)):
+        return EmployeeInvitation.objects.create(
+            email=f'counted{EmployeeInvitation.objects.count()}@example.com', organization=organization,
+            invited_by=self.admin, status=status, expires_at=timezone.now() + expires_in,
+        )
+
+    def assertCountsAgree(self, **expected):
+        counts = invitation_status_counts(EmployeeInvitation.objects.all())
+        self.assertEqual(counts, {'total': sum(expected.values()), **expected})
+        self.assertEqual(counted_status_counts(), counts)
+
+    def test_overdue_pending_invitations_count_as_expired(self):
+        first, second = self.organizations
+        self.invite(first)
+        self.invite(first, expires_in=-timedelta(minutes=1))
+        self.invite(second, status='expired', expires_in=-timedelta(days=1))
+        self.invite(second, status='accepted')
+        self.assertCountsAgree(pending=1, accepted=1, declined=0, expired=2)
+
+    def test_counters_follow_status_transitions(self):
+        first, second = self.organizations
+        invitation = self.invite(first)
+        declined = self.invite(second)
+        self.invite(second)
+
+        declined = EmployeeInvitation.objects.get(pk=declined.pk)
+        declined.status = 'declined'
+        declined.save()
+        accepted = EmployeeInvitation.objects.get(pk=invitation.pk)
+        accepted.status = 'accepted'
+        accepted.save()
+        self.assertCountsAgree(pending=1, accepted=1, declined=1, expired=0)
+
+        declined.status = 'pending'
+        declined.resend()
+        accepted.delete()
+        self.assertCountsAgree(pending=2, accepted=0, declined=0, expired=0)
+
+        second.delete()
+        self.assertCountsAgree(pending=0, accepted=0, declined=0, expired=0)
+        self.assertFalse(InvitationStatusCounter.objects.filter(organization_id=second.pk).exists())
+
+    def test_rebuild_matches_maintained_counters(self):
+        for status in ('pending', 'accepted', 'declined', 'accepted'):
+            self.invite(self.organizations[0], status=status)
+        maintained = set(InvitationStatusCounter.objects.values_list('organization_id', 'status', 'count'))
+        rebuild_invitation_counters()
+        self.assertEqual(set(InvitationStatusCounter.objects.values_list('organization_id', 'status', 'count')),
+                         maintained)
+
+
+@override_settings(INVITATION_STATUS_COUNTERS=True, INVITATION_SWEEP_BATCH_SIZE=2, INVITATION_RETENTION_DAYS=30)
+class InvitationSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('sweep-admin@example.com')
+        cls.admin.is_staff = True
+        cls.admin.save()
+        cls.organizations = [Organization.objects.create(name=f'Swept {n}', admin=cls.admin) for n in range(2)]
+
+    def invite(self, organization, status='pending', expires_in=timedelta(days=7)):
+        return EmployeeInvitation.objects.create(
+            email=f'swept{EmployeeInvitation.objects.count()}@example.com', organization=organization,
+            invited_by=self.admin, status=status, expires_at=timezone.now() + expires_in,
+        )
+
+    def assertCountersMatchRows(self):
+        maintained = set(InvitationStatusCounter.objects.filter(count__gt=0).values_list('organization_id', 'status', 'count'))
+        rebuild_invitation_counters()
+        self.assertEqual(set(InvitationStatusCounter.objects.values_list('organization_id', 'status', 'count')), maintained)
+
+    def test_overdue_pending_invitations_expire_in_batches(self):
+        first, second = self.organizations
+        overdue = [self.invite(organization, expires_in=-timedelta(hours=n + 1))
+                   for n, organization in enumerate([first, second, first, second, first])]
+        live = self.invite(first)
+        accepted = self.invite(second, status='accepted', expires_in=-timedelta(days=1))
+
+        self.assertEqual(expire_invitations_task.apply().get(), {'expired': 5, 'purged': 0})
+        statuses = dict(EmployeeInvitation.objects.values_list('id', 'status'))
+        self.assertEqual({statuses[invitation.pk] for invitation in overdue}, {'expired'})
+        self.assertEqual((statuses[live.pk], statuses[accepted.pk]), ('pending', 'accepted'))
+        self.assertEqual(counted_status_counts(), invitation_status_counts(EmployeeInvitation.objects.all()))
+        self.assertCountersMatchRows()
+
+    def test_batches_are_read_through_the_status_expiry_index(self):
+        batch = EmployeeInvitation.objects.filter(overdue_q(timezone.now())).order_by('expires_at')[:2]
+        self.assertIn('USING INDEX invitation_status_expiry_idx (status=? AND expires_at<?)', batch.explain())
+        self.assertNotIn('TEMP B-TREE', batch.explain())
+
+    def test_old_declined_and_expired_invitations_are_purged(self):
+        first, second = self.organizations
+        purged = [self.invite(first, 'declined', -timedelta(days=31)), self.invite(second, 'expired', -timedelta(days=40)),
+                  self.invite(first, 'expired', -timedelta(days=90))]
+        kept = [self.invite(first, 'declined', -timedelta(days=29)), self.invite(second, 'accepted', -timedelta(days=90)),
+                self.invite(second, 'pending', -timedelta(days=10))]
+
+        with override_settings(INVITATION_RETENTION_DAYS=0):
+            self.assertEqual(purge_invitations(), 0)
+        self.assertEqual(expire_invitations_task.apply().get(), {'expired': 1, 'purged': 3})
+        remaining = set(EmployeeInvitation.objects.values_list('id', flat=True))
+        self.assertFalse(remaining & {invitation.pk for invitation in purged})
+        self.assertEqual(remaining, {invitation.pk for invitation in kept})
+        self.assertCountersMatchRows()
+
+    def test_resend_revives_an_expired_invitation(self):
+        invitation = self.invite(self.organizations[0], expires_in=-timedelta(days=1))
+        expire_overdue_invitations()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks():
+            response = client.post('/employees/invitations/resend/', {'invitation_id': invitation.pk})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertCountersMatchRows()
+
+    def test_sweeper_is_scheduled_with_the_database_scheduler(self):
+        task = PeriodicTask.objects.get(name=SWEEPER_TASK_NAME)
+        self.assertEqual(task.task, 'employees.tasks.expire_invitations_task')
+        self.assertEqual((task.interval.every, task.interval.period), (settings.INVITATION_SWEEP_INTERVAL, 'minutes'))
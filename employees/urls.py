@@ -1,6 +1,5 @@
 from django.urls import path
 from . import views
-from .models import setup_permissions
 
 urlpatterns = [
     # Department URLs
@@ -11,9 +10,14 @@ urlpatterns = [
     path('positions/', views.PositionView.as_view(), name='position-list'),
     path('positions/<int:id>/', views.PositionView.as_view(), name='position-detail'),
 
+    path('response-cache/stats/', views.ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+
     # Employee URLs
     path('employees/', views.EmployeeView.as_view(), name='employee-list'),
     path('employees/<int:id>/', views.EmployeeView.as_view(), name='employee-detail'),
+    path('employees/export/', views.EmployeeExportView.as_view(), name='employee-export'),
+    path('employees/import/', views.EmployeeImportView.as_view(), name='employee-import'),
+    path('employees/histogram/', views.EmployeeHistogramView.as_view(), name='employee-histogram'),
 
     # Organization URLs
     path('organizations/', views.OrganizationView.as_view(), name='organization-list'),
@@ -21,6 +25,7 @@ urlpatterns = [
 
     # Invitation URLs
     path('invitations/send/', views.SendInvitationView.as_view(), name='send-invitation'),
+    path('invitations/send/bulk/', views.BulkSendInvitationView.as_view(), name='send-invitation-bulk'),
     path('invitations/accept/', views.AcceptInvitationView.as_view(), name='accept-invitation'),
     path('invitations/resend/', views.ResendInvitationView.as_view(), name='resend-invitation'),
 
@@ -32,5 +37,3 @@ urlpatterns = [
     path('employee/profile/', views.EmployeeProfileView.as_view(), name='employee-profile'),
     
 ]
-
-setup_permissions()
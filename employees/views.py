@@ -1,23 +1,38 @@
 from rest_framework import generics, permissions, status
-from .decorator import permission_required
+from .decorator import permission_required, conditional
+from .mixins import ConditionalRequestMixin, SparseFieldsetQuerysetMixin
+from .export import csv_columns, iter_csv, iter_ndjson
+from .filters import EMPLOYEE_FILTERS, filter_queryset, order_queryset
+from .importer import INPUT_FORMATS, EmployeeImporter, read_rows
+from .invitation_status import counters_enabled, counted_status_counts, invitation_status_counts
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from .models import Department, Position, Employee, Organization, EmployeeInvitation
 from .serializers import *
-from .tasks import send_invitation_email_task
+from .invitations import bulk_invite
+from .response_cache import cached_response, get_stats, prime_lead_ids
+from .search import get_search_backend
+from .tasks import queue_invitation_emails
 from accounts.models import User
 from datetime import timedelta
 
 
-class DepartmentView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
+class DepartmentView(ConditionalRequestMixin, SparseFieldsetQuerysetMixin, generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = DepartmentSerializer
-    queryset = Department.objects.all().order_by('-id')
+    queryset = Department.objects.select_related('lead').order_by('-id')
     lookup_field = 'id'
+    conditional_related = ('lead',)
+    response_cache_scope = 'departments'
 
     @permission_required(['view_department'])
+    @cached_response
+    @conditional
     def get(self, request, *args, **kwargs):
         id = self.kwargs.get('id', None)
         if id:
@@ -25,15 +40,21 @@ class DepartmentView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyA
         else:
             return self.list(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        prime_lead_ids()
+        return super().list(request, *args, **kwargs)
+
     @permission_required(['add_department'])
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
     @permission_required(['change_department'])
+    @conditional
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
 
     @permission_required(['change_department'])
+    @conditional
     def patch(self, request, *args, **kwargs):
         return super().patch(request, *args, **kwargs)
 
@@ -42,13 +63,17 @@ class DepartmentView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyA
         return super().delete(request, *args, **kwargs)
 
 
-class PositionView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
+class PositionView(ConditionalRequestMixin, SparseFieldsetQuerysetMixin, generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = PositionSerializer
-    queryset = Position.objects.all().order_by('-id')
+    queryset = Position.objects.select_related('department').order_by('-id')
     lookup_field = 'id'
+    conditional_related = ('department',)
+    response_cache_scope = 'positions'
 
     @permission_required(['view_position'])
+    @cached_response
+    @conditional
     def get(self, request, *args, **kwargs):
         id = self.kwargs.get('id',None)
         if id:
@@ -68,10 +93,12 @@ class PositionView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPI
         return super().post(request, *args, **kwargs)
 
     @permission_required(['change_position'])
+    @conditional
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
 
     @permission_required(['change_position'])
+    @conditional
     def patch(self, request, *args, **kwargs):        
         return super().patch(request, *args, **kwargs)
 
@@ -80,13 +107,48 @@ class PositionView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPI
         return super().delete(request, *args, **kwargs)
 
 
-class EmployeeView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
+class ResponseCacheStatsView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_stats((DepartmentView.response_cache_scope, PositionView.response_cache_scope)))
+
+
+class EmployeeQuerysetMixin:
+    """
+    Queryset and query-string filters shared by the employee list and its export.
+
+    Filters are listed in employees.filters.EMPLOYEE_FILTERS. ?q= searches names, email,
+    location, position and department through the search backend and orders by relevance;
+    ?ordering= picks one of `ordering_fields` instead. Cursor pagination keeps its own key order.
+    """
+    queryset = Employee.objects.select_related('user', 'position', 'position__department', 'added_by').order_by('-id')
+    search_query_param = 'q'
+    ordering_fields = ('id', 'joining_date', 'leaving_date', 'created_at', 'updated_at', 'age_years', 'tenure_years')
+    # Keyset pages need a non-null column.
+    cursor_ordering_fields = ('id', 'joining_date', 'created_at', 'updated_at')
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = filter_queryset(super().get_queryset().with_age_and_tenure(), params, EMPLOYEE_FILTERS)
+        query = params.get(self.search_query_param)
+        if query is not None:
+            queryset = get_search_backend().search(queryset, query)
+        if params.get('ordering'):
+            queryset = order_queryset(queryset, params['ordering'], self.ordering_fields)
+        return queryset
+
+
+class EmployeeView(ConditionalRequestMixin, SparseFieldsetQuerysetMixin, EmployeeQuerysetMixin, generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = EmployeeSerializer
-    queryset = Employee.objects.select_related('user', 'position', 'position__department').order_by('-id')
     lookup_field = 'id'
+    conditional_related = ('user', 'position', 'position__department', 'added_by')
+    conditional_date_dependent = True
+    fast_query_param = 'fast'
 
     @permission_required(['view_employee'])
+    @conditional
     def get(self, request, *args, **kwargs):
         id = self.kwargs.get('id',None)
         if id:
@@ -94,6 +156,19 @@ class EmployeeView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPI
         else:
             return self.list(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get(self.fast_query_param) not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        # Same payload as EmployeeSerializer, built straight from .values() rows
+        queryset = self.filter_queryset(self.get_queryset())
+        fast_serializer = FastEmployeeListSerializer(self.get_serializer(), queryset.query.annotations)
+        queryset = fast_serializer.get_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([fast_serializer.to_representation(row) for row in page])
+        return Response([fast_serializer.to_representation(row) for row in queryset.iterator(chunk_size=2000)])
+
     @permission_required(['add_employee'])
     def create(self, request, *args, **kwargs):
         user_id = request.data.get('user_id')
@@ -119,18 +194,13 @@ class EmployeeView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPI
             status=status.HTTP_201_CREATED
         )
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            queryset = queryset.filter(user_id=user_id)
-        return queryset
-
     @permission_required(['change_employee'])
+    @conditional
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
 
     @permission_required(['change_employee'])
+    @conditional
     def patch(self, request, *args, **kwargs):
         return super().patch(request, *args, **kwargs)
 
@@ -139,12 +209,146 @@ class EmployeeView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPI
         return super().delete(request, *args, **kwargs)
 
 
-class OrganizationView(generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
+class EmployeeExportView(EmployeeQuerysetMixin, generics.GenericAPIView):
+    """
+    Stream the employee directory as CSV or NDJSON (?output=csv|ndjson).
+
+    Rows come from `.values()` through an iterator and are encoded in chunks, so memory does
+    not grow with the number of employees. Accepts the same filters and ?fields= / ?exclude=
+    selection as the employee list.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = EmployeeSerializer
+    output_query_param = 'output'
+    chunk_size = 2000
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    @permission_required(['view_employee'])
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get(self.output_query_param, 'csv')
+        if output not in self.content_types:
+            return Response(
+                {'error': f"output must be one of: {', '.join(self.content_types)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        fast_serializer = FastEmployeeListSerializer(serializer, queryset.query.annotations)
+        queryset = fast_serializer.get_queryset(queryset)
+        rows = (fast_serializer.to_representation(row) for row in queryset.iterator(chunk_size=self.chunk_size))
+        if output == 'csv':
+            content = iter_csv(csv_columns(serializer), rows)
+        else:
+            content = iter_ndjson(rows)
+
+        response = StreamingHttpResponse(content, content_type=self.content_types[output])
+        response['Content-Disposition'] = f'attachment; filename="employees.{output}"'
+        return response
+
+
+class EmployeeHistogramView(EmployeeQuerysetMixin, generics.GenericAPIView):
+    """
+    Employee counts per age or tenure band (?by=age|tenure&width=10), from one GROUP BY query
+    over the SQL age/tenure annotations. Accepts the same filters as the employee list.
+    Employees without a date of birth are counted in a band with null bounds.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    band_annotations = {'age': 'age_years', 'tenure': 'tenure_years'}
+    default_width = 10
+
+    @permission_required(['view_employee'])
+    def get(self, request, *args, **kwargs):
+        by = request.query_params.get('by', 'age')
+        if by not in self.band_annotations:
+            raise ValidationError({'by': f"Expected one of: {', '.join(self.band_annotations)}."})
+        try:
+            width = int(request.query_params.get('width', self.default_width))
+        except ValueError:
+            width = 0
+        if width < 1:
+            raise ValidationError({'width': "Expected a positive integer."})
+
+        # Integer division: `band` is the lower bound of the band each row falls in.
+        rows = (self.get_queryset().order_by()
+                .annotate(band=F(self.band_annotations[by]) / width * width)
+                .values('band').annotate(count=Count('id')).order_by('band'))
+        bands = [
+            {'from': row['band'], 'to': None if row['band'] is None else row['band'] + width - 1, 'count': row['count']}
+            for row in rows
+        ]
+        return Response({'by': by, 'width': width, 'bands': bands})
+
+
+class EmployeeImportView(generics.GenericAPIView):
+    """
+    Create employees in bulk from an uploaded CSV/JSON `file` or a JSON list of rows.
+
+    Every row is validated; valid rows are inserted and the rest come back as per-row errors.
+    Pass ?dry_run=1 to validate without writing.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    batch_size = 1000
+
+    @permission_required(['add_employee'])
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            input_format = request.query_params.get('input') or upload.name.rsplit('.', 1)[-1].lower()
+            if input_format not in INPUT_FORMATS:
+                return Response(
+                    {'error': f"input must be one of: {', '.join(INPUT_FORMATS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = read_rows(upload, input_format)
+        else:
+            rows = request.data.get('rows') if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list):
+                return Response(
+                    {'error': 'Upload a file or send a JSON list of rows'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        report = EmployeeImporter(added_by=request.user, batch_size=self.batch_size).run(rows, dry_run=dry_run)
+        if report['created']:
+            response_status = status.HTTP_201_CREATED
+        elif report['errors']:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(report, status=response_status)
+
+
+class OrganizationView(SparseFieldsetQuerysetMixin, generics.ListCreateAPIView, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrganizationSerializer
-    queryset = Organization.objects.all().order_by('-id')
+    queryset = Organization.objects.select_related('admin').order_by('-id')
     lookup_field = 'id'
 
+    def include_employees(self):
+        # Members are always part of a single organization or a write response;
+        # lists only materialize them on ?include=employees.
+        if self.kwargs.get('id') or self.request.method not in permissions.SAFE_METHODS:
+            return True
+        return 'employees' in self.request.query_params.get('include', '').split(',')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.include_employees():
+            queryset = queryset.prefetch_related(
+                Prefetch('employees', queryset=Employee.objects.select_related('user', 'position'))
+            )
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_employees'] = self.include_employees()
+        return context
+
     @permission_required(['view_organization'])
     def get(self, request, *args, **kwargs):
         id = self.kwargs.get('id', None)
@@ -222,16 +426,15 @@ class SendInvitationView(generics.GenericAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        # All checks passed - create and send invitation
-        invitation = serializer.save(
-            invited_by=request.user,
-            expires_at=timezone.now() + timedelta(days=7),
-            last_sent_at=timezone.now(),
-            status='pending'
-        )
-
-        # Send email
-        send_invitation_email_task.delay(invitation.id, is_resend=False)
+        # All checks passed - create the invitation and queue its email together
+        with transaction.atomic():
+            invitation = serializer.save(
+                invited_by=request.user,
+                expires_at=timezone.now() + timedelta(days=7),
+                last_sent_at=timezone.now(),
+                status='pending'
+            )
+            queue_invitation_emails([invitation], is_resend=False)
 
         return Response({
             'message': 'Invitation sent successfully.',
@@ -240,6 +443,30 @@ class SendInvitationView(generics.GenericAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class BulkSendInvitationView(generics.GenericAPIView):
+    serializer_class = BulkInvitationSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            report, invitations = bulk_invite(
+                serializer.validated_data['emails'],
+                serializer.validated_data['organization'],
+                serializer.validated_data.get('position'),
+                request.user,
+            )
+            queue_invitation_emails(invitations, is_resend=False)
+
+        return Response({
+            'invited': len(invitations),
+            'skipped': len(report) - len(invitations),
+            'results': report,
+        }, status=status.HTTP_201_CREATED if invitations else status.HTTP_200_OK)
+
+
 class AcceptInvitationView(generics.GenericAPIView):
     serializer_class = EmployeeInvitationAcceptSerializer
     permission_classes = []
@@ -341,7 +568,7 @@ class ResendInvitationView(generics.GenericAPIView):
             ).get(
                 id=serializer.validated_data['invitation_id'],
                 invited_by=request.user,
-                status__in=['pending', 'declined'],
+                status__in=['pending', 'declined', 'expired'],
                 is_accepted=False
             )
         except EmployeeInvitation.DoesNotExist:
@@ -350,16 +577,17 @@ class ResendInvitationView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Handle expired or declined invitations
-        if invitation.is_expired or invitation.status == 'declined':
-            invitation.status = 'pending'
-            invitation.save()
+        with transaction.atomic():
+            # Handle expired or declined invitations
+            if invitation.is_expired or invitation.status in ('declined', 'expired'):
+                invitation.status = 'pending'
+                invitation.save()
 
-        # Resend the invitation
-        invitation = invitation.resend()
+            # Resend the invitation
+            invitation = invitation.resend()
 
-        # Send invitation email
-        send_invitation_email_task.delay(invitation.id, is_resend=True)
+            # Queue invitation email
+            queue_invitation_emails([invitation], is_resend=True)
 
         return Response(
             {
@@ -372,8 +600,8 @@ class ResendInvitationView(generics.GenericAPIView):
         )
 
 
-class EmployeeInvitationListView(generics.ListAPIView, generics.RetrieveAPIView):
-    queryset = EmployeeInvitation.objects.all()
+class EmployeeInvitationListView(SparseFieldsetQuerysetMixin, generics.ListAPIView, generics.RetrieveAPIView):
+    queryset = EmployeeInvitation.objects.select_related('organization', 'position__department').order_by('-id')
     serializer_class = EmployeeInvitationSerializer
     permission_classes = [permissions.IsAdminUser]
     lookup_field = 'id'
@@ -386,14 +614,11 @@ class EmployeeInvitationListView(generics.ListAPIView, generics.RetrieveAPIView)
         queryset = self.filter_queryset(self.get_queryset())
         response = super().list(request, *args, **kwargs)
 
-        # Count invitations by status
-        status_counts = {
-            'total': queryset.count(),
-            'pending': queryset.filter(status='pending').count(),
-            'accepted': queryset.filter(status='accepted').count(),
-            'declined': queryset.filter(status='declined').count(),
-            'expired': queryset.filter(status='expired').count(),
-        }
+        # Count invitations by status; pending invitations past expires_at count as expired
+        if counters_enabled():
+            status_counts = counted_status_counts()
+        else:
+            status_counts = invitation_status_counts(queryset)
 
         response.data = {
             'invitations': response.data,
@@ -409,6 +634,6 @@ class EmployeeProfileView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         try:
-            return Employee.objects.select_related('user').get(user=self.request.user)
+            return Employee.objects.select_related('user', 'added_by').get(user=self.request.user)
         except Employee.DoesNotExist:
             raise NotFound("Employee not found.")